@@ -0,0 +1,377 @@
+"""
+Benchmarks for the certificate rendering and upload pipeline.
+
+    python benchmarks/bench.py run [--sizes 10 100 1000 10000] [--output results.json]
+    python benchmarks/bench.py compare baseline.json results.json [--threshold 0.1]
+
+`run` generates synthetic rosters shaped like uploads/course_data_csv.csv (long
+multi-line course names and descriptions) and measures, for each stage and
+roster size: throughput, p50/p99 latency per certificate, peak RSS and bytes
+written. Every measurement runs in a fresh interpreter so peak RSS isn't
+inflated by earlier ones. `compare` exits with status 1 if any metric got worse
+than the baseline by more than the threshold.
+"""
+import os
+import sys
+import csv
+import json
+import math
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+import subprocess
+from io import BytesIO
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+SAMPLE_CSV = os.path.join(ROOT, 'certificate_generator', 'uploads', 'course_data_csv.csv')
+HEADERS = ['Person Name', 'Course Name', 'Course Description', 'Course Date']
+
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+STAGES = ['generate_certificate_id', 'create_certificate', 'upload', 'parallel_upload']
+DEFAULT_THRESHOLD = 0.10
+
+# Uploads sent at the same time by the parallel_upload stage
+PARALLEL_UPLOADS = 8
+
+# Metric name -> True if a higher value is better
+METRICS = {
+    'throughput_per_s': True,
+    'p50_ms': False,
+    'p99_ms': False,
+    'peak_rss_kb': False,
+    'bytes_written': False,
+}
+
+FIRST_NAMES = ['Sarah', 'Michael', 'Emily', 'David', 'Jessica', 'Robert', 'Amanda', 'Christopher', 'Laura', 'Daniel']
+LAST_NAMES = ['Johnson', 'Chen', 'Rodriguez', 'Thompson', 'Williams', 'Anderson', 'Martinez', 'Taylor', 'Nguyen', 'Brown']
+
+
+def synthetic_rows(count):
+    """`count` roster rows cycling through the courses of the sample CSV, with distinct person names."""
+    with open(SAMPLE_CSV, newline='', encoding='utf-8-sig') as f:
+        courses = [row for row in csv.DictReader(f)]
+    rows = []
+    for i in range(count):
+        course = courses[i % len(courses)]
+        person_name = f"{FIRST_NAMES[i % len(FIRST_NAMES)]} {LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)]}"
+        cycle = i // (len(FIRST_NAMES) * len(LAST_NAMES))
+        if cycle:
+            # Duplicate rows are rejected by validation, so names repeat with a suffix
+            person_name += f" {cycle + 1}"
+        rows.append(dict(course, **{'Person Name': person_name}))
+    return rows
+
+
+def write_csv(rows, path):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=HEADERS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list."""
+    values = sorted(values)
+    index = max(0, math.ceil(fraction * len(values)) - 1)
+    return values[index]
+
+
+def folder_size(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            total += os.path.getsize(os.path.join(dirpath, filename))
+    return total
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process and its finished child processes (render workers)."""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    peak = max(own, children)
+    # ru_maxrss is in bytes on macOS, kilobytes elsewhere
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def summarize(stage, rows, latencies, elapsed, bytes_written):
+    return {
+        'stage': stage,
+        'rows': rows,
+        'elapsed_s': round(elapsed, 4),
+        'throughput_per_s': round(rows / elapsed, 2) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 4),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 4),
+        'peak_rss_kb': peak_rss_kb(),
+        'bytes_written': bytes_written,
+    }
+
+
+def measure_generate_certificate_id(rows, work_dir, workers):
+    from certificate_generator.certificates import generate_certificate_id
+
+    latencies = []
+    started = time.perf_counter()
+    for row in rows:
+        t = time.perf_counter()
+        generate_certificate_id(row['Person Name'], row['Course Name'], row['Course Date'])
+        latencies.append(time.perf_counter() - t)
+    return latencies, time.perf_counter() - started, 0
+
+
+def measure_create_certificate(rows, work_dir, workers):
+    from certificate_generator.certificates import generate_certificate_id, create_certificate
+
+    output_folder = os.path.join(work_dir, 'pdfs')
+    os.makedirs(output_folder)
+    latencies = []
+    started = time.perf_counter()
+    for row in rows:
+        t = time.perf_counter()
+        certificate_id = generate_certificate_id(row['Person Name'], row['Course Name'], row['Course Date'])
+        create_certificate(row['Person Name'], row['Course Name'], row['Course Description'], row['Course Date'],
+                           certificate_id, os.path.join(output_folder, f"{certificate_id}.pdf"), 'DTK_AA')
+        latencies.append(time.perf_counter() - t)
+    return latencies, time.perf_counter() - started, folder_size(output_folder)
+
+
+def configure_app(work_dir, workers):
+    """The Flask app, set up to run jobs inside the upload request with its files under `work_dir`."""
+    from certificate_generator.app import app
+
+    app.config.update(
+        TESTING=True,
+        SECRET_KEY='benchmark',
+        UPLOAD_FOLDER=os.path.join(work_dir, 'uploads'),
+        GENERATED_PDFS_FOLDER=os.path.join(work_dir, 'pdfs'),
+        DATABASE=os.path.join(work_dir, 'benchmark.sqlite3'),
+        JOBS_RUN_INLINE=True,
+        BATCH_WORKERS=workers,
+    )
+    os.makedirs(app.config['UPLOAD_FOLDER'])
+    return app
+
+
+def measure_upload(rows, work_dir, workers, repeat=3):
+    """
+    Full POST /upload requests through the Flask test client, with the job run inside the request.
+
+    There are no per-row timings for a request, so the latency samples are the
+    per-certificate time (request time / rows) of each of the `repeat` requests.
+    """
+    app = configure_app(work_dir, workers)
+    csv_path = os.path.join(work_dir, 'roster.csv')
+    write_csv(rows, csv_path)
+    with open(csv_path, 'rb') as f:
+        csv_bytes = f.read()
+
+    client = app.test_client()
+
+    latencies = []
+    elapsed = bytes_written = 0
+    for i in range(repeat):
+        output_folder = os.path.join(work_dir, f'pdfs-{i}')
+        os.makedirs(output_folder)
+        app.config['GENERATED_PDFS_FOLDER'] = output_folder
+
+        data = {'csv_file': (BytesIO(csv_bytes), 'roster.csv'), 'instructor_pair': 'DTK_AA', 'incremental': ''}
+        t = time.perf_counter()
+        response = client.post('/upload', data=data, content_type='multipart/form-data')
+        request_time = time.perf_counter() - t
+        if response.status_code >= 400:
+            raise RuntimeError(f"Upload failed with status {response.status_code}")
+
+        elapsed += request_time
+        latencies.append(request_time / len(rows))
+        bytes_written += folder_size(output_folder)
+    return latencies, elapsed / repeat, bytes_written // repeat
+
+
+def measure_parallel_upload(rows, work_dir, workers, uploads=PARALLEL_UPLOADS):
+    """
+    Load test: the rows split between `uploads` rosters, all named roster.csv,
+    uploaded at the same time from as many threads (like the threads of the
+    server's workers), with the jobs run inside the requests.
+
+    The per-pair limits are lifted so every upload is processed at once.
+    Afterwards each job must have issued exactly its own roster's
+    certificates, every one of them a complete PDF; RuntimeError otherwise.
+    Latency samples are the per-certificate time of each request.
+    """
+    from certificate_generator.jobs import JobStore
+    from certificate_generator.registry import CertificateRegistry
+    from certificate_generator.storage import CertificateStorage
+
+    app = configure_app(work_dir, workers)
+    app.config.update(JOBS_MAX_RUNNING_PER_PAIR=None, JOBS_MAX_QUEUED_PER_PAIR=None)
+    os.makedirs(app.config['GENERATED_PDFS_FOLDER'])
+    rosters = [rows[i::uploads] for i in range(min(uploads, len(rows)))]
+    responses = [None] * len(rosters)
+    latencies = [None] * len(rosters)
+
+    def upload(index):
+        csv_path = os.path.join(work_dir, f'roster-{index}.csv')
+        write_csv(rosters[index], csv_path)
+        with open(csv_path, 'rb') as f:
+            data = {'csv_file': (BytesIO(f.read()), 'roster.csv'), 'instructor_pair': 'DTK_AA', 'incremental': ''}
+        t = time.perf_counter()
+        responses[index] = app.test_client().post('/upload', data=data, content_type='multipart/form-data',
+                                                  headers={'Accept': 'application/json'})
+        latencies[index] = (time.perf_counter() - t) / len(rosters[index])
+
+    threads = [threading.Thread(target=upload, args=(index,)) for index in range(len(rosters))]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    store = JobStore(app.config['DATABASE'])
+    registry = CertificateRegistry(app.config['DATABASE'])
+    storage = CertificateStorage(app.config['GENERATED_PDFS_FOLDER'])
+    for roster, response in zip(rosters, responses):
+        if response is None or response.status_code != 202:
+            raise RuntimeError(f"Upload failed with status {response.status_code if response else None}")
+        results = store.get_results(response.get_json()['job_id'])
+        names = []
+        for result in results:
+            if result.error:
+                raise RuntimeError(f"Row failed: {result.error}")
+            with open(storage.path(result.filename), 'rb') as f:
+                data = f.read()
+            if not (data.startswith(b'%PDF-') and data.rstrip().endswith(b'%%EOF')):
+                raise RuntimeError(f"Incomplete PDF {result.filename}")
+            names.append(registry.get(os.path.splitext(os.path.basename(result.filename))[0])['person_name'])
+        if names != [row['Person Name'] for row in roster]:
+            raise RuntimeError(f"Job {response.get_json()['job_id']} issued certificates for the wrong rows")
+    if len(storage.files()) != len(rows):
+        raise RuntimeError(f"Expected {len(rows)} files, found {len(storage.files())}")
+    return latencies, elapsed, folder_size(storage.root)
+
+
+MEASUREMENTS = {
+    'generate_certificate_id': measure_generate_certificate_id,
+    'create_certificate': measure_create_certificate,
+    'upload': measure_upload,
+    'parallel_upload': measure_parallel_upload,
+}
+
+
+def measure(stage, size, workers):
+    """Runs one measurement in this process and returns its result dict."""
+    work_dir = tempfile.mkdtemp(prefix='certificate-benchmark-')
+    try:
+        rows = synthetic_rows(size)
+        latencies, elapsed, bytes_written = MEASUREMENTS[stage](rows, work_dir, workers)
+        return summarize(stage, size, latencies, elapsed, bytes_written)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def run(sizes, stages, workers):
+    results = []
+    for stage in stages:
+        for size in sizes:
+            command = [sys.executable, os.path.abspath(__file__), '_measure', stage, str(size)]
+            if workers:
+                command += ['--workers', str(workers)]
+            output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{stage:>24} {size:>6} rows: {result['throughput_per_s']:>10} /s  "
+                  f"p50 {result['p50_ms']:.2f} ms  p99 {result['p99_ms']:.2f} ms  "
+                  f"peak RSS {result['peak_rss_kb']} KB  {result['bytes_written']} bytes", file=sys.stderr)
+            results.append(result)
+
+    return {
+        'meta': {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'workers': workers,
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Returns a list of regression descriptions: metrics of `current` that are
+    worse than in `baseline` by more than `threshold` (a fraction).
+    Only (stage, rows) pairs present in both are compared.
+    """
+    baseline_results = {(r['stage'], r['rows']): r for r in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        before = baseline_results.get((result['stage'], result['rows']))
+        if before is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            old, new = before.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (change < -threshold) if higher_is_better else (change > threshold):
+                regressions.append(f"{result['stage']} ({result['rows']} rows): {metric} {old} -> {new} ({change:+.1%})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the certificate pipeline.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Run the benchmarks and write the results as JSON.')
+    run_parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    run_parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    run_parser.add_argument('--workers', type=int, help='Render worker processes for uploads (default: one per CPU).')
+    run_parser.add_argument('--output', default='benchmark_results.json')
+    run_parser.add_argument('--baseline', help='Compare the results against this file once the run is done.')
+    run_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+
+    compare_parser = commands.add_parser('compare', help='Flag regressions of a results file against a baseline.')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('results')
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+
+    measure_parser = commands.add_parser('_measure')
+    measure_parser.add_argument('stage', choices=STAGES)
+    measure_parser.add_argument('size', type=int)
+    measure_parser.add_argument('--workers', type=int)
+
+    args = parser.parse_args(argv)
+
+    if args.command == '_measure':
+        print(json.dumps(measure(args.stage, args.size, args.workers)))
+        return 0
+
+    if args.command == 'run':
+        current = run(args.sizes, args.stages, args.workers)
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+        print(f"Results written to {args.output}", file=sys.stderr)
+        if not args.baseline:
+            return 0
+        baseline_path = args.baseline
+    else:
+        with open(args.results) as f:
+            current = json.load(f)
+        baseline_path = args.baseline
+
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressions = compare(baseline, current, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print(f"No regressions beyond {args.threshold:.0%} against {baseline_path}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,4 @@
+import sys
+from certificate_generator.cli import main
+
+sys.exit(main())
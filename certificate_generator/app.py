@@ -1,12 +1,27 @@
 import os
 import csv
+import time
 import logging
-import random
-from datetime import datetime
-from flask import Flask, request, current_app, render_template, url_for, send_from_directory, flash, redirect
+import unicodedata
+from urllib.parse import quote
+from datetime import date, timedelta
+from itertools import chain
+import click
+from flask import Flask, Response, g, request, current_app, render_template, url_for, send_from_directory, flash, redirect, jsonify, abort, make_response
+from werkzeug.datastructures import ContentRange
 from werkzeug.utils import secure_filename
-from fpdf import FPDF
-import json
+from certificate_generator.certificates import generate_certificate_id, create_certificate, render_certificate
+from certificate_generator.batch import DEFAULT_CHUNK_SIZE, INDIVIDUAL, OUTPUT_MODES
+from certificate_generator.ingest import read_csv_rows, open_csv_rows, MissingHeadersError
+from certificate_generator.registry import CertificateRegistry
+from certificate_generator.manifest import Manifest
+from certificate_generator.jobs import JobStore, JobRunner, job_progress, run_job, new_job_id, DEFAULT_MAX_RUNNING_PER_PAIR, QUEUED, RUNNING, FINISHED, FAILED
+from certificate_generator.zipstream import ZipStream
+from certificate_generator.metrics import metrics, format_trace
+from certificate_generator.template_cache import template_cache
+from certificate_generator.validation import RowValidator
+from certificate_generator.pdf_cache import PDFCache, DEFAULT_MAX_BYTES
+from certificate_generator.storage import CertificateStorage
 
 app = Flask(__name__)
 app.secret_key = 'your secret key' # Needed for flashing messages
@@ -22,113 +37,120 @@ GENERATED_PDFS_FOLDER = os.path.join(app.root_path, 'generated_pdfs')
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['GENERATED_PDFS_FOLDER'] = GENERATED_PDFS_FOLDER
 
-# Ensure directories exist
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-os.makedirs(app.config['GENERATED_PDFS_FOLDER'], exist_ok=True)
-
-def generate_certificate_id(person_name, course_name, course_date):
-    """Generates a unique certificate ID."""
-    initials = "".join(part[0] for part in person_name.split()).upper()
+# Batch rendering: worker processes (None = one per CPU) and rows handed to a worker at a time
+app.config['BATCH_WORKERS'] = None
+app.config['BATCH_CHUNK_SIZE'] = DEFAULT_CHUNK_SIZE
 
-    # Sanitize course name: remove newlines, then other non-alphanumeric chars, and shorten
-    sanitized_course_name = course_name.replace("\n", " ").replace("\r", "")
-    sanitized_course_name = "".join(filter(str.isalnum, sanitized_course_name))
-    sanitized_course_name = sanitized_course_name[:8]
+# Uploads are processed as background jobs tracked in this SQLite database.
+# With JOBS_RUN_INLINE the job runs inside the /upload request instead (used by the tests).
+app.config['DATABASE'] = os.path.join(app.root_path, 'certificate_generator.sqlite3')
+app.config['JOBS_RUN_INLINE'] = False
 
-    # Use the first date from the date range for the ID
-    first_date_str = course_date.split(':')[0]
+# Per instructor pair, job runners (across all server processes) run at most
+# JOBS_MAX_RUNNING_PER_PAIR jobs at once, and uploads are turned away with a 429
+# while JOBS_MAX_QUEUED_PER_PAIR jobs are waiting. Uploads processed inside the
+# request are turned away while JOBS_MAX_RUNNING_PER_PAIR jobs are running. None disables a limit.
+app.config['JOBS_MAX_RUNNING_PER_PAIR'] = DEFAULT_MAX_RUNNING_PER_PAIR
+app.config['JOBS_MAX_QUEUED_PER_PAIR'] = 20
 
-    # Attempt to parse date from multiple formats
-    date_obj = None
-    for fmt in ('%Y-%m-%d', '%d-%m-%Y', '%m/%d/%Y'):
-        try:
-            date_obj = datetime.strptime(first_date_str, fmt)
-            break
-        except ValueError:
-            pass
-
-    if date_obj:
-        date_str = date_obj.strftime('%d%m%y')
-    else:
-        # Fallback if date format is not as expected
-        date_str = "000000"
+# Keep a copy of each upload in UPLOAD_FOLDER. Without it, uploads are rendered
+# while they are read, inside the request, and their jobs can't be resumed.
+app.config['SAVE_UPLOADS'] = True
 
-    random_digits = f"{random.randint(0, 999999):06d}"
+# Per-stage timings and counters, exposed at /metrics. With METRICS_LOG_REQUESTS,
+# each request also logs how its time was split between the stages.
+app.config['METRICS_ENABLED'] = True
+app.config['METRICS_LOG_REQUESTS'] = False
 
-    return f"{initials}-{sanitized_course_name}-{date_str}-{random_digits}"
+# `flask storage sweep` removes generated PDFs older than this many days by default
+app.config['PDF_RETENTION_DAYS'] = 365
 
-def create_certificate(person_name, course_name, course_description, course_date, certificate_id, output_path, instructor_pair):
-    with open(os.path.join(app.root_path, 'config.json')) as f:
-        config = json.load(f)
+# Certificates downloaded from /generated_pdfs are kept in memory, up to this many bytes in total
+app.config['PDF_CACHE_MAX_BYTES'] = DEFAULT_MAX_BYTES
 
-    pdf = FPDF()
-    pdf.add_page()
-    
-    # Set background color
-    pdf.set_fill_color(*config['background_color'])
-    pdf.rect(0, 0, 210, 297, 'F')
-
-    # Determine background image based on instructor pair
-    image_mapping = {
-        'DTK_RBB': 'static/DTK_RBB.jpg',
-        'DTK_AA': 'static/DTK_AA.jpg'
-    }
-    background_image_name = image_mapping.get(instructor_pair, config.get('background_image', 'static/template.jpg'))
-    background_image_path = os.path.join(app.root_path, background_image_name)
-
-    if os.path.exists(background_image_path):
-        pdf.image(background_image_path, x=0, y=0, w=210, h=297)
-
-    # Header
-    pdf.set_y(50)
-    pdf.set_font(config['font_name'], 'BI', 20)
-    pdf.set_text_color(*config['header_color'])
-    pdf.cell(0, 10, config['header_text'], ln=True, align='C')
-
-    # Certificate content
-    pdf.set_y(config['course_name_y'])
-    pdf.set_font(config['font_name'], "B", config['font_size_course_name'])
-    pdf.set_text_color(0,0,0)
-    pdf.multi_cell(0, 10, course_name, align="C")
-
-    pdf.set_y(config['award_text_y'])
-    pdf.set_font(config['font_name'], "", config['font_size_default'])
-    pdf.cell(0, 10, "This certificate is awarded to:", ln=True, align="C")
-    
-    pdf.set_y(config['person_name_y'])
-    pdf.set_font(config['font_name'], "B", config['font_size_person_name'])
-    pdf.cell(0, 10, person_name, ln=True, align="C")
-    
-    pdf.set_y(config['completion_text_y'])
-    pdf.set_font(config['font_name'], "", config['font_size_default'])
-    pdf.cell(0, 10, "for successfully completing the course content:", ln=True, align="C")
-    
-    pdf.set_y(config['course_description_y'])
-    pdf.set_font(config['font_name'], "I", config['font_size_default'])
-    bulleted_description = "\n".join([f"* {line}" for line in course_description.splitlines()])
-    pdf.multi_cell(0, 10, bulleted_description, align="C")
-    
-    pdf.set_y(config['date_y'])
-    pdf.set_font(config['font_name'], "", config['font_size_default'])
-    pdf.cell(0, 10, f"Date: {course_date}", ln=True, align="C")
-
-    # Certificate ID
-    pdf.set_y(-40)
-    pdf.set_font(config['font_name'], 'I', 8)
-    pdf.set_text_color(128, 128, 128) # Gray color
-    pdf.cell(0, 10, f"Certificate ID: {certificate_id}", ln=True, align='C')
-    
-    # Footer
-    pdf.set_y(-30)
-    pdf.set_font(config['font_name'], 'I', 10)
-    pdf.set_text_color(*config['footer_color'])
-    pdf.cell(0, 10, config['footer_text'], ln=True, align='C')
+# Ensure directories exist
+os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+os.makedirs(app.config['GENERATED_PDFS_FOLDER'], exist_ok=True)
 
-    pdf.output(output_path, "F")
+# Seconds clients turned away by the per-pair limits are asked to wait
+BUSY_RETRY_AFTER_SECONDS = 30
+
+job_runner = None
+pdf_cache = PDFCache(app.config['PDF_CACHE_MAX_BYTES'])
+
+def start_job_runner():
+    """Starts this process's background job runner, which also resumes jobs left behind by dead workers."""
+    global job_runner
+    if job_runner is None:
+        job_runner = JobRunner(app.config['DATABASE'],
+                               workers=app.config['BATCH_WORKERS'],
+                               chunk_size=app.config['BATCH_CHUNK_SIZE'],
+                               max_running_per_pair=app.config['JOBS_MAX_RUNNING_PER_PAIR'])
+    job_runner.ensure_started()
+    return job_runner
+
+@app.before_request
+def ensure_job_runner():
+    if not app.config['JOBS_RUN_INLINE']:
+        start_job_runner()
+
+@app.before_request
+def start_request_timing():
+    metrics.enabled = app.config['METRICS_ENABLED']
+    if metrics.enabled and app.config['METRICS_LOG_REQUESTS']:
+        g.request_started = time.perf_counter()
+        metrics.start_trace()
+
+@app.after_request
+def log_request_timing(response):
+    if 'request_started' in g:
+        trace = metrics.end_trace() or {}
+        elapsed = time.perf_counter() - g.request_started
+        logger.info("%s %s %s took %.1fms%s", request.method, request.path, response.status_code, elapsed * 1000,
+                    f": {format_trace(trace)}" if trace else "")
+    return response
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return render_template('index.html', instructor_pairs=template_cache.labels())
+
+def job_created_response(job_id):
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify(job_id=job_id,
+                       status_url=url_for('job_status', job_id=job_id),
+                       results_url=url_for('job_results', job_id=job_id)), 202
+    return redirect(url_for('job_results', job_id=job_id))
+
+def busy_response(store, instructor_pair):
+    """Returns a 429 response telling the client to retry later (see the JOBS_MAX_*_PER_PAIR config)."""
+    queued, running = store.active_jobs(instructor_pair)
+    metrics.increment('uploads_rejected')
+    logger.warning("Turned away an upload for %s: %d jobs queued, %d running", instructor_pair, queued, running)
+    message = "Too many certificate batches are being processed for these instructors. Please try again in a minute."
+    if request.accept_mimetypes.best == 'application/json':
+        response = jsonify(error=message)
+    else:
+        flash(message, 'error')
+        response = make_response(render_template('index.html', instructor_pairs=template_cache.labels()))
+    response.status_code = 429
+    response.headers['Retry-After'] = str(BUSY_RETRY_AFTER_SECONDS)
+    return response
+
+def queue_is_full(store, instructor_pair):
+    queued, _ = store.active_jobs(instructor_pair)
+    limit = app.config['JOBS_MAX_QUEUED_PER_PAIR']
+    return limit is not None and queued >= limit
+
+def claim_in_request(store, job_id):
+    """
+    Claims a job to process inside the request, unless its instructor pair
+    already has JOBS_MAX_RUNNING_PER_PAIR jobs running; the limit is checked
+    in the same transaction as the claim. A job that can't be claimed is marked as failed.
+    """
+    job = store.claim_job(job_id, max_running_per_pair=app.config['JOBS_MAX_RUNNING_PER_PAIR'])
+    if job is None:
+        store.finish_job(job_id, FAILED, "Too many certificate batches were being processed for these instructors.")
+    return job
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
@@ -148,97 +170,348 @@ def upload_file():
 
     if file:
         filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        job_id = new_job_id()
+        instructor_pair = request.form.get('instructor_pair')
+        output_mode = request.form.get('output_mode', INDIVIDUAL)
+        if output_mode not in OUTPUT_MODES:
+            flash('Invalid output mode. Please choose how the certificates should be generated.', 'error')
+            return redirect(url_for('index'))
+        incremental = bool(request.form.get('incremental'))
+        if incremental and output_mode != INDIVIDUAL:
+            flash('Keeping unchanged certificates only works with one PDF per certificate.', 'error')
+            return redirect(url_for('index'))
+        store = JobStore(app.config['DATABASE'])
+        if app.config['SAVE_UPLOADS'] and not app.config['JOBS_RUN_INLINE'] and queue_is_full(store, instructor_pair):
+            return busy_response(store, instructor_pair)
+
+        if not app.config['SAVE_UPLOADS']:
+            # Render rows straight from the upload stream; the job can't be resumed without a saved copy
+            try:
+                rows = read_csv_rows(file.stream)
+                first_row = next(rows, None)
+                if first_row is None:
+                    flash("CSV file is empty or could not be parsed.", 'warning')
+                    return render_template('results.html', message="CSV file is empty or could not be parsed.", pdf_files=None)
+
+                store.create_job(job_id, instructor_pair, None, app.config['GENERATED_PDFS_FOLDER'], 0, output_mode, incremental)
+                job = claim_in_request(store, job_id)
+                if job is None:
+                    return busy_response(store, instructor_pair)
+                metrics.increment('uploads')
+                logger.info("Streaming job %s from upload %s", job_id, filename)
+                run_job(store, job, app.config['BATCH_WORKERS'], app.config['BATCH_CHUNK_SIZE'], rows=chain([first_row], rows))
+                return job_created_response(job_id)
+
+            except MissingHeadersError as e:
+                flash(str(e), 'error')
+                return render_template('results.html', message=str(e), pdf_files=None)
+            except (csv.Error, UnicodeDecodeError) as e:
+                logger.error("CSV parsing error for file %s: %s", filename, e)
+                flash(f"Error parsing CSV file: {e}. Please ensure it's a valid CSV.", 'error')
+                return render_template('results.html', message=f"Error parsing CSV file: {e}. Please ensure it's a valid CSV.", pdf_files=None)
+
+        # The job reads its input later, so each upload gets its own file
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{job_id}_{filename}")
         try:
-            file.save(filepath)
-            logger.info(f"File saved to {filepath}")
+            with metrics.timed('save_upload'):
+                file.save(filepath)
+            logger.info("File saved to %s", filepath)
         except Exception as e:
-            logger.error(f"Error saving file {filename}: {e}")
+            logger.error("Error saving file %s: %s", filename, e)
             flash(f"Error saving file: {e}", 'error')
             return redirect(url_for('index'))
 
-        generated_filenames_list = []
-        failed_certificates_info = []
-        
         try:
-            instructor_pair = request.form.get('instructor_pair')
-            with open(filepath, mode='r', encoding='utf-8-sig') as csvfile: # utf-8-sig to handle BOM
-                reader = csv.DictReader(csvfile)
-                
-                # Check for required headers
-                required_headers = ['Person Name', 'Course Name', 'Course Description', 'Course Date']
-                if not all(header in reader.fieldnames for header in required_headers):
-                    missing_headers = [header for header in required_headers if header not in reader.fieldnames]
-                    flash(f"CSV file is missing required columns: {', '.join(missing_headers)}", 'error')
-                    return render_template('results.html', message=f"CSV file is missing required columns: {', '.join(missing_headers)}", pdf_files=None)
-
-                parsed_data = list(reader) # Read all data
-            
-            if not parsed_data:
+            # Only count the rows, for the job's progress; the job validates them all before rendering
+            with metrics.timed('csv_parse'), open_csv_rows(filepath) as rows:
+                total_rows = sum(1 for _ in rows)
+
+            if not total_rows:
                 flash("CSV file is empty or could not be parsed.", 'warning')
                 return render_template('results.html', message="CSV file is empty or could not be parsed.", pdf_files=None)
 
-            logger.info(f"Successfully parsed {len(parsed_data)} rows from CSV.")
-
-            for i, row in enumerate(parsed_data):
-                try:
-                    person_name = row['Person Name']
-                    course_name = row['Course Name']
-                    course_description = row['Course Description']
-                    course_date = row['Course Date']
-                    
-                    if not all([person_name, course_name, course_description, course_date]):
-                        logger.warning(f"Skipping row {i+1} due to missing data: {row}")
-                        failed_certificates_info.append(f"Row {i+1} (Person: {person_name or 'N/A'}) - Missing data")
-                        continue
-
-                    certificate_id = generate_certificate_id(person_name, course_name, course_date)
-                    output_filename = f"{certificate_id}.pdf"
-                    output_path = os.path.join(app.config['GENERATED_PDFS_FOLDER'], output_filename)
-                    
-                    create_certificate(person_name, course_name, course_description, course_date, certificate_id, output_path, instructor_pair)
-                    generated_filenames_list.append(output_filename)
-                    logger.info(f"Generated certificate: {output_filename}")
-
-                except KeyError as e:
-                    logger.error(f"Missing expected column for row {i+1}: {e}. Data: {row}")
-                    failed_certificates_info.append(f"Row {i+1} (Person: {row.get('Person Name', 'N/A')}) - Missing column {e}")
-                except Exception as e:
-                    logger.error(f"Error generating PDF for row {i+1} (Person: {row.get('Person Name', 'N/A')}): {e}")
-                    failed_certificates_info.append(f"Row {i+1} (Person: {row.get('Person Name', 'N/A')}) - {str(e)}")
-            
-            # Flashing messages based on outcome
-            if generated_filenames_list and not failed_certificates_info:
-                flash('Successfully generated all certificates!', 'success')
-            elif generated_filenames_list and failed_certificates_info:
-                flash(f'Successfully generated {len(generated_filenames_list)} PDF(s), but failed for {len(failed_certificates_info)} entries. See details below.', 'warning')
-            elif not generated_filenames_list and failed_certificates_info:
-                flash(f'Failed to generate any certificates. See details below.', 'error')
-            else: # No data or all rows skipped before PDF generation attempt
-                 flash('No certificates were generated. Please check your CSV data.', 'warning')
-
-
-            return render_template('results.html', 
-                                   message=f"Processed {len(parsed_data)} rows.", 
-                                   pdf_files=generated_filenames_list, 
-                                   failed_certificates=failed_certificates_info)
+            logger.info("Successfully parsed %d rows from CSV.", total_rows)
+
+            store.create_job(job_id, instructor_pair, filepath, app.config['GENERATED_PDFS_FOLDER'], total_rows, output_mode, incremental)
+            if app.config['JOBS_RUN_INLINE']:
+                job = claim_in_request(store, job_id)
+                if job is None:
+                    os.remove(filepath)
+                    return busy_response(store, instructor_pair)
+            metrics.increment('uploads')
+            logger.info("Queued job %s for %s", job_id, filepath)
+
+            if app.config['JOBS_RUN_INLINE']:
+                run_job(store, job, app.config['BATCH_WORKERS'], app.config['BATCH_CHUNK_SIZE'])
+            else:
+                start_job_runner().notify()
 
+            return job_created_response(job_id)
+
+        except MissingHeadersError as e:
+            flash(str(e), 'error')
+            return render_template('results.html', message=str(e), pdf_files=None)
         except FileNotFoundError:
-            logger.error(f"Uploaded file not found at path: {filepath}")
+            logger.error("Uploaded file not found at path: %s", filepath)
             flash("Error: Uploaded file not found. Please try uploading again.", 'error')
             return redirect(url_for('index'))
         except csv.Error as e:
-            logger.error(f"CSV parsing error for file {filename}: {e}")
+            logger.error("CSV parsing error for file %s: %s", filename, e)
             flash(f"Error parsing CSV file: {e}. Please ensure it's a valid CSV.", 'error')
             return render_template('results.html', message=f"Error parsing CSV file: {e}. Please ensure it's a valid CSV.", pdf_files=None)
         except Exception as e:
-            logger.error(f"An unexpected error occurred during processing of {filename}: {e}")
+            logger.error("An unexpected error occurred during processing of %s: %s", filename, e)
             flash(f"An unexpected error occurred: {e}", 'error')
             return render_template('results.html', message=f"An unexpected error occurred: {e}", pdf_files=None)
 
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = JobStore(app.config['DATABASE']).get_job(job_id)
+    if job is None:
+        abort(404)
+    progress = job_progress(job)
+    progress['results_url'] = url_for('job_results', job_id=job_id)
+    return jsonify(progress)
+
+@app.route('/jobs/<job_id>/results')
+def job_results(job_id):
+    store = JobStore(app.config['DATABASE'])
+    job = store.get_job(job_id)
+    if job is None:
+        abort(404)
+
+    if job['status'] in (QUEUED, RUNNING):
+        progress = job_progress(job)
+        message = f"Processed {progress['rows_done']} of {progress['total_rows']} rows."
+        if progress['eta_seconds'] is not None:
+            message += f" About {int(progress['eta_seconds'])} seconds remaining."
+        return render_template('results.html', message=message, pdf_files=None, job=progress)
+
+    if job['status'] == FAILED:
+        flash(f"An unexpected error occurred: {job['message']}", 'error')
+        return render_template('results.html', message=f"An unexpected error occurred: {job['message']}", pdf_files=None)
+
+    generated_filenames_list = []
+    failed_certificates_info = []
+    for result in store.get_results(job_id):
+        if result.filename:
+            generated_filenames_list.append(result.filename)
+        else:
+            failed_certificates_info.append(result.error)
+    # In combined mode every certificate is a page of the same file
+    generated_filenames_list = list(dict.fromkeys(generated_filenames_list))
+
+    # Flashing messages based on outcome
+    if generated_filenames_list and not failed_certificates_info:
+        flash('Successfully generated all certificates!', 'success')
+    elif generated_filenames_list and failed_certificates_info:
+        flash(f'Successfully generated {len(generated_filenames_list)} PDF(s), but failed for {len(failed_certificates_info)} entries. See details below.', 'warning')
+    elif not generated_filenames_list and failed_certificates_info:
+        flash(f'Failed to generate any certificates. See details below.', 'error')
+    else: # No data or all rows skipped before PDF generation attempt
+         flash('No certificates were generated. Please check your CSV data.', 'warning')
+
+
+    return render_template('results.html', 
+                           message=f"Processed {job['total_rows']} rows.", 
+                           pdf_files=generated_filenames_list, 
+                           failed_certificates=failed_certificates_info,
+                           batch_id=job_id)
+
+@app.route('/batches/<batch_id>/download.zip')
+def download_batch_zip(batch_id):
+    """Streams the certificates of a finished batch as one ZIP archive, with support for resuming through Range requests."""
+    store = JobStore(app.config['DATABASE'])
+    job = store.get_job(batch_id)
+    if job is None:
+        abort(404)
+    if job['status'] == FAILED:
+        abort(409, description="The batch failed, so it has no certificates to download.")
+    if job['status'] != FINISHED:
+        abort(409, description="The batch is still being processed.")
+
+    files = []
+    filenames = dict.fromkeys(result.filename for result in store.get_results(batch_id) if result.filename)
+    for filename in filenames:
+        path = os.path.join(job['output_folder'], filename)
+        if os.path.exists(path):
+            files.append((os.path.basename(filename), path))
+    archive = ZipStream(files)
+
+    start, stop, status = 0, archive.size, 200
+    if_range = request.headers.get('If-Range')
+    # Only a single byte range is served; other Range headers are ignored (RFC 7233)
+    single_byte_range = request.range and request.range.units == 'bytes' and len(request.range.ranges) == 1
+    if single_byte_range and (if_range is None or request.if_range.etag == archive.etag):
+        byte_range = request.range.range_for_length(archive.size)
+        if byte_range is None:
+            response = Response(status=416)
+            response.headers['Content-Range'] = f"bytes */{archive.size}"
+            return response
+        start, stop = byte_range
+        status = 206
+
+    response = Response(archive.iter_bytes(start, stop), status=status, mimetype='application/zip', direct_passthrough=True)
+    response.content_length = stop - start
+    if status == 206:
+        response.content_range = ContentRange('bytes', start, stop, archive.size)
+    response.accept_ranges = 'bytes'
+    response.set_etag(archive.etag)
+    response.headers['Content-Disposition'] = content_disposition('attachment', f"certificates-{batch_id}.zip")
+    return response
+
+@app.route('/verify/<certificate_id>')
+def verify_certificate(certificate_id):
+    """Tells whether a certificate ID was issued by this server, answered from the registry alone."""
+    certificate = CertificateRegistry(app.config['DATABASE']).get(certificate_id)
+    if certificate is None:
+        return jsonify(valid=False, certificate_id=certificate_id), 404
+    return jsonify(valid=True,
+                   certificate_id=certificate['certificate_id'],
+                   person_name=certificate['person_name'],
+                   course_name=certificate['course_name'],
+                   course_date=certificate['course_date'],
+                   instructor_pair=certificate['instructor_pair'],
+                   issued_at=certificate['issued_at'])
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Metrics of this server process in the Prometheus text format."""
+    if not app.config['METRICS_ENABLED']:
+        abort(404)
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+# Parameters of /render and the CSV columns they stand for
+RENDER_PARAMETERS = {
+    'person_name': 'Person Name',
+    'course_name': 'Course Name',
+    'course_description': 'Course Description',
+    'course_date': 'Course Date',
+}
+
+def render_registered_certificate(certificate):
+    return render_certificate(certificate['person_name'], certificate['course_name'], certificate['course_description'],
+                              certificate['course_date'], certificate['certificate_id'], certificate['instructor_pair'])
+
+def content_disposition(disposition, filename):
+    """
+    Content-Disposition header value for `filename`. Header values must be
+    Latin-1, so names outside ASCII (certificate IDs start with the holder's
+    initials) get an ASCII fallback and a UTF-8 `filename*`, as send_file does.
+    """
+    try:
+        filename.encode('ascii')
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+        return f"{disposition}; filename=\"{simple}\"; filename*=UTF-8''{quote(filename, safe='!#$&+^`|')}"
+    return f'{disposition}; filename="{filename}"'
+
+def certificate_response(certificate, download=False):
+    """Generates a registered certificate in memory and returns it as the response, without writing a file."""
+    response = Response(bytes(render_registered_certificate(certificate)), mimetype='application/pdf')
+    response.headers['Content-Disposition'] = content_disposition('attachment' if download else 'inline',
+                                                                  f"{certificate['certificate_id']}.pdf")
+    return response
+
+@app.route('/render', methods=['GET', 'POST'])
+def render_pdf():
+    """
+    Generates one certificate on the fly and streams it back.
+
+    Either re-renders a registered certificate (`certificate_id`, as a query,
+    form or JSON parameter), or, for POST requests only, issues a new one from
+    `person_name`, `course_name`, `course_description`, `course_date` and
+    `instructor_pair` form or JSON parameters, checked like an uploaded row.
+    """
+    params = request.get_json(silent=True)
+    if params is None:
+        params = request.values
+    elif not isinstance(params, dict):
+        return jsonify(error="Expected a JSON object"), 400
+    invalid = [name for name in list(RENDER_PARAMETERS) + ['instructor_pair', 'certificate_id']
+               if params.get(name) is not None and not isinstance(params[name], str)]
+    if invalid:
+        return jsonify(error=f"Parameters must be strings: {', '.join(invalid)}"), 400
+    registry = CertificateRegistry(app.config['DATABASE'])
+
+    certificate_id = params.get('certificate_id')
+    if certificate_id:
+        certificate = registry.get(certificate_id)
+        if certificate is None:
+            return jsonify(error=f"Unknown certificate ID: {certificate_id}"), 404
+    elif request.method != 'POST':
+        return jsonify(error="Pass a certificate_id, or POST the certificate's fields to issue a new one"), 400
+    else:
+        missing = [name for name in list(RENDER_PARAMETERS) + ['instructor_pair'] if not params.get(name)]
+        if missing:
+            return jsonify(error=f"Missing parameters: {', '.join(missing)}"), 400
+        instructor_pair = params['instructor_pair']
+        if instructor_pair not in template_cache.labels():
+            return jsonify(error=f"Unknown instructor pair: {instructor_pair}"), 400
+        row = {column: params[name] for name, column in RENDER_PARAMETERS.items()}
+        errors = RowValidator(instructor_pair).check([(1, row)])
+        if errors:
+            return jsonify(error=errors[1]), 400
+        certificate_id = registry.issue_ids([(1, row)], instructor_pair)[1]
+        certificate = registry.get(certificate_id)
+        logger.info("Issued certificate %s for rendering on demand", certificate_id)
+
+    return certificate_response(certificate, download=bool(params.get('download')))
+
 @app.route('/generated_pdfs/<path:filename>')
 def serve_pdf(filename):
-    return send_from_directory(app.config['GENERATED_PDFS_FOLDER'], filename)
+    """Serves a generated PDF from the in-memory cache, with ETag/Last-Modified validation."""
+    try:
+        path = CertificateStorage(app.config['GENERATED_PDFS_FOLDER']).path(filename)
+    except ValueError:
+        abort(404)
+
+    entry = pdf_cache.get_file(path)
+    if entry is None and os.path.isfile(path):
+        # Too large for the cache (e.g. a combined PDF of a big roster), so it's streamed from disk
+        return send_from_directory(app.config['GENERATED_PDFS_FOLDER'], filename)
+    if entry is None:
+        # Files of registered certificates can be deleted to save space; they are generated again on demand
+        certificate_id, extension = os.path.splitext(os.path.basename(filename))
+        certificate = CertificateRegistry(app.config['DATABASE']).get(certificate_id) if extension == '.pdf' else None
+        if certificate is None or os.path.basename(certificate['filename']) != os.path.basename(filename):
+            abort(404)
+        if certificate['filename'] != filename:
+            # A link from before the file was moved into its shard
+            return redirect(url_for('serve_pdf', filename=certificate['filename']), 301)
+        template = template_cache.get(certificate['instructor_pair'])
+        entry = pdf_cache.get(path, ('render', template.fingerprint),
+                              lambda: (render_registered_certificate(certificate), certificate['issued_at']))
+
+    response = Response(entry.data, mimetype='application/pdf')
+    response.set_etag(entry.etag)
+    response.last_modified = entry.last_modified
+    response.cache_control.no_cache = True # Revalidate with the ETag before reusing a download
+    # PDF viewers fetch large documents in byte ranges
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(entry.data))
+
+@app.cli.group('storage')
+def storage_cli():
+    """Manage the generated PDFs folder."""
+
+@storage_cli.command('migrate')
+def migrate_storage():
+    """Moves the PDFs of a flat generated PDFs folder into the sharded layout."""
+    moved = CertificateStorage(app.config['GENERATED_PDFS_FOLDER']).migrate()
+    if moved:
+        database = app.config['DATABASE']
+        CertificateRegistry(database).rename_files(moved)
+        Manifest(database).rename_files(moved)
+        JobStore(database).rename_files(moved)
+    click.echo(f"Moved {len(moved)} files into the sharded layout.")
+
+@storage_cli.command('sweep')
+@click.option('--days', type=int, default=None, help='Remove PDFs generated more than this many days ago (default: PDF_RETENTION_DAYS).')
+def sweep_storage(days):
+    """Removes old generated PDFs, a day of batches at a time."""
+    days = app.config['PDF_RETENTION_DAYS'] if days is None else days
+    removed = CertificateStorage(app.config['GENERATED_PDFS_FOLDER']).sweep(date.today() - timedelta(days=days))
+    click.echo(f"Removed {removed} files generated more than {days} days ago.")
 
 if __name__ == '__main__':
     app.run(debug=True)
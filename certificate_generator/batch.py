@@ -0,0 +1,241 @@
+import os
+import logging
+import random
+import multiprocessing
+from datetime import date
+from functools import partial
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from certificate_generator.certificates import generate_certificate_id, create_certificate, CertificateBook
+from certificate_generator.metrics import metrics
+from certificate_generator.storage import certificate_filename
+from certificate_generator.template_cache import template_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 16
+
+# Render workers are started from threads (request handlers, the job runner).
+# Forking a threaded process can copy a lock another thread holds into the
+# worker, so where possible workers are forked from a single-threaded server
+# process that has the rendering modules loaded instead.
+if 'forkserver' in multiprocessing.get_all_start_methods():
+    _pool_context = multiprocessing.get_context('forkserver')
+    _pool_context.set_forkserver_preload([__name__])
+else:
+    _pool_context = multiprocessing.get_context()
+
+# Output modes: one PDF per certificate, or all certificates as pages of one PDF
+INDIVIDUAL = 'individual'
+COMBINED = 'combined'
+OUTPUT_MODES = (INDIVIDUAL, COMBINED)
+
+# Outcome of one CSV row: `filename` is set on success, `error` is the
+# message shown in the "Failed Certificate Attempts" list otherwise.
+RowResult = namedtuple('RowResult', ['row_number', 'filename', 'error'])
+
+
+def render_row(row_number, row, instructor_pair, output_folder, book=None, certificate_id=None, filename=None):
+    """
+    Generates the certificate for one parsed CSV row (`row_number` is 1-based).
+
+    With a CertificateBook, the certificate becomes a page of the book instead of its own file.
+    A new certificate ID is generated unless `certificate_id` was issued beforehand, and the
+    file is stored in today's shard of `output_folder` unless `filename` was chosen with it.
+    """
+    try:
+        person_name = row['Person Name']
+        course_name = row['Course Name']
+        course_description = row['Course Description']
+        course_date = row['Course Date']
+
+        if not all([person_name, course_name, course_description, course_date]):
+            logger.warning("Skipping row %d due to missing data: %s", row_number, row)
+            return RowResult(row_number, None, f"Row {row_number} (Person: {person_name or 'N/A'}) - Missing data")
+
+        if not certificate_id:
+            with metrics.timed('generate_id'):
+                certificate_id = generate_certificate_id(person_name, course_name, course_date)
+        if book is not None:
+            book.add(person_name, course_name, course_description, course_date, certificate_id, instructor_pair)
+            return RowResult(row_number, book.filename, None)
+
+        output_filename = filename or certificate_filename(certificate_id)
+        output_path = os.path.join(output_folder, output_filename)
+
+        create_certificate(person_name, course_name, course_description, course_date, certificate_id, output_path, instructor_pair)
+        logger.info("Generated certificate: %s", output_filename)
+        return RowResult(row_number, output_filename, None)
+
+    except KeyError as e:
+        logger.error("Missing expected column for row %d: %s. Data: %s", row_number, e, row)
+        return RowResult(row_number, None, f"Row {row_number} (Person: {row.get('Person Name', 'N/A')}) - Missing column {e}")
+    except Exception as e:
+        logger.error("Error generating PDF for row %d (Person: %s): %s", row_number, row.get('Person Name', 'N/A'), e)
+        return RowResult(row_number, None, f"Row {row_number} (Person: {row.get('Person Name', 'N/A')}) - {str(e)}")
+
+
+def _render_chunk(tasks, instructor_pair, output_folder, book=None):
+    results = []
+    for row_number, row, certificate_id, filename in tasks:
+        with metrics.timed('certificate'):
+            results.append(render_row(row_number, row, instructor_pair, output_folder, book, certificate_id, filename))
+    return results
+
+
+def _render_chunk_in_worker(tasks, instructor_pair, output_folder):
+    # Metrics recorded in a worker process are handed back to the parent with the results
+    return _render_chunk(tasks, instructor_pair, output_folder), metrics.collect()
+
+
+def _issue_ids(chunk, instructor_pair, registry, filename=None):
+    """
+    Turns each (row_number, row) into a (row_number, row, certificate ID, filename) task,
+    with the ID issued for it by `registry` and the file registered with it (both None without one).
+    """
+    if registry is None:
+        return [(row_number, row, None, None) for row_number, row in chunk]
+    day = date.today() # Stored under the day the IDs were issued, even if rendering ends after midnight
+    with metrics.timed('issue_ids'):
+        certificate_ids = registry.issue_ids(chunk, instructor_pair, filename or partial(certificate_filename, day=day), pending=True)
+    tasks = []
+    for row_number, row in chunk:
+        certificate_id = certificate_ids.get(row_number)
+        if certificate_id is None:
+            tasks.append((row_number, row, None, None))
+        else:
+            tasks.append((row_number, row, certificate_id, filename or certificate_filename(certificate_id, day)))
+    return tasks
+
+
+def _finish_chunk(tasks, results, registry, confirm=True):
+    """
+    Releases the IDs issued for rows whose certificate couldn't be generated,
+    confirms the others (unless their file is written later), and counts the outcomes.
+    """
+    failed = [certificate_id for (_, _, certificate_id, _), result in zip(tasks, results) if result.error]
+    if registry is not None and any(failed):
+        registry.revoke([certificate_id for certificate_id in failed if certificate_id])
+    if registry is not None and confirm:
+        registry.confirm([certificate_id for (_, _, certificate_id, _), result in zip(tasks, results)
+                          if certificate_id and not result.error])
+    metrics.increment('rows_failed', len(failed))
+    metrics.increment('rows_generated', len(results) - len(failed))
+    return results
+
+
+def _collect_worker_results(future):
+    results, worker_metrics = future.result()
+    metrics.merge(worker_metrics)
+    return results
+
+
+def _init_worker(instructor_pair, metrics_enabled):
+    # Workers forked from the same process inherit its random state; reseed so their certificate IDs differ
+    random.seed()
+    # ... and its metrics, which the parent already has
+    metrics.enabled = metrics_enabled
+    metrics.reset()
+    # Load the template up front so the first chunk doesn't pay for it
+    template_cache.get(instructor_pair)
+
+
+def _chunks(numbered_rows, chunk_size):
+    numbered_rows = iter(numbered_rows)
+    while True:
+        chunk = list(islice(numbered_rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_batch(rows, instructor_pair, output_folder, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, start=1, registry=None):
+    """
+    Renders `rows` (an iterable of CSV row dicts) and yields a RowResult per row, in row order.
+    The first row is numbered `start`.
+
+    Rows are handed to a pool of `workers` processes (default: one per CPU) in
+    chunks of `chunk_size`. At most two chunks per worker are in flight, so
+    `rows` can be a lazy iterator of any length. Batches that fit in a single
+    chunk, or `workers=1`, are rendered in the calling process.
+
+    With a CertificateRegistry, the IDs of each chunk are issued by it (checked
+    for collisions in one query) before the chunk is handed to a worker.
+    """
+    return iter_numbered_batch(enumerate(rows, start=start), instructor_pair, output_folder, workers, chunk_size, registry)
+
+
+def iter_numbered_batch(numbered_rows, instructor_pair, output_folder, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, registry=None):
+    """Like iter_batch, for an iterable of (row_number, row) pairs in increasing row order."""
+    workers = workers or os.cpu_count() or 1
+    chunks = (_issue_ids(chunk, instructor_pair, registry) for chunk in _chunks(numbered_rows, chunk_size))
+
+    first_chunk = next(chunks, None)
+    if first_chunk is None:
+        return
+    second_chunk = next(chunks, None)
+
+    if workers == 1 or second_chunk is None:
+        for chunk in (first_chunk, second_chunk):
+            if chunk:
+                yield from _finish_chunk(chunk, _render_chunk(chunk, instructor_pair, output_folder), registry)
+        for chunk in chunks:
+            yield from _finish_chunk(chunk, _render_chunk(chunk, instructor_pair, output_folder), registry)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context,
+                             initializer=_init_worker, initargs=(instructor_pair, metrics.enabled)) as pool:
+        pending = deque()
+        for chunk in (first_chunk, second_chunk):
+            pending.append((chunk, pool.submit(_render_chunk_in_worker, chunk, instructor_pair, output_folder)))
+
+        for chunk in chunks:
+            if len(pending) >= workers * 2:
+                done, future = pending.popleft()
+                yield from _finish_chunk(done, _collect_worker_results(future), registry)
+            pending.append((chunk, pool.submit(_render_chunk_in_worker, chunk, instructor_pair, output_folder)))
+
+        while pending:
+            done, future = pending.popleft()
+            yield from _finish_chunk(done, _collect_worker_results(future), registry)
+
+
+def iter_combined(rows, instructor_pair, output_folder, filename, start=1, registry=None):
+    """
+    Renders `rows` as the pages of one PDF, `filename` in `output_folder`, yielding a RowResult per row.
+
+    Successful rows all refer to that file, which is written once the rows are exhausted
+    (and only if at least one certificate was generated). A single document can't be
+    split across processes, so this runs in the calling process.
+    """
+    return iter_numbered_combined(enumerate(rows, start=start), instructor_pair, output_folder, filename, registry)
+
+
+def iter_numbered_combined(numbered_rows, instructor_pair, output_folder, filename, registry=None):
+    """Like iter_combined, for an iterable of (row_number, row) pairs in increasing row order."""
+    book = CertificateBook(os.path.join(output_folder, filename))
+    # The IDs of the pages, confirmed once the file is written
+    certificate_ids = []
+    for chunk in _chunks(numbered_rows, DEFAULT_CHUNK_SIZE):
+        tasks = _issue_ids(chunk, instructor_pair, registry, filename)
+        results = _finish_chunk(tasks, _render_chunk(tasks, instructor_pair, output_folder, book), registry, confirm=False)
+        certificate_ids += [certificate_id for (_, _, certificate_id, _), result in zip(tasks, results)
+                            if certificate_id and not result.error]
+        yield from results
+
+    if book.certificates:
+        try:
+            book.save()
+        except Exception:
+            if registry is not None:
+                registry.revoke(certificate_ids)
+            raise
+        if registry is not None:
+            registry.confirm(certificate_ids)
+        logger.info("Generated %d certificates in %s", book.certificates, filename)
+
+
+def render_batch(rows, instructor_pair, output_folder, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, registry=None):
+    """Renders all `rows` and returns the list of RowResults, in row order."""
+    return list(iter_batch(rows, instructor_pair, output_folder, workers, chunk_size, registry=registry))
@@ -0,0 +1,95 @@
+import os
+import random
+from datetime import datetime
+from functools import lru_cache
+from fpdf import FPDF
+from certificate_generator.metrics import metrics
+from certificate_generator.layout import bulleted
+from certificate_generator.storage import write_file
+from certificate_generator.template_cache import template_cache
+
+# Date formats understood in the Course Date column
+DATE_FORMATS = ('%Y-%m-%d', '%d-%m-%Y', '%m/%d/%Y')
+
+@lru_cache(maxsize=4096)
+def parse_date(text):
+    """Parses a date in one of DATE_FORMATS; returns None if it isn't one."""
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            pass
+    return None
+
+@lru_cache(maxsize=1024)
+def _course_code(course_name):
+    # Sanitize course name: remove newlines, then other non-alphanumeric chars, and shorten
+    sanitized_course_name = course_name.replace("\n", " ").replace("\r", "")
+    sanitized_course_name = "".join(filter(str.isalnum, sanitized_course_name))
+    return sanitized_course_name[:8]
+
+@lru_cache(maxsize=1024)
+def _date_code(course_date):
+    # Use the first date from the date range for the ID
+    date_obj = parse_date(course_date.split(':')[0])
+    # Fallback if date format is not as expected
+    return date_obj.strftime('%d%m%y') if date_obj else "000000"
+
+def generate_certificate_id(person_name, course_name, course_date):
+    """Generates a unique certificate ID."""
+    initials = "".join(part[0] for part in person_name.split()).upper()
+    random_digits = f"{random.randint(0, 999999):06d}"
+    return f"{initials}-{_course_code(course_name)}-{_date_code(course_date)}-{random_digits}"
+
+def create_certificate(person_name, course_name, course_description, course_date, certificate_id, output_path, instructor_pair):
+    pdf_bytes = render_certificate(person_name, course_name, course_description, course_date, certificate_id, instructor_pair)
+    with metrics.timed('disk_write'):
+        write_file(output_path, pdf_bytes)
+    metrics.increment('bytes_written', len(pdf_bytes))
+
+def render_certificate(person_name, course_name, course_description, course_date, certificate_id, instructor_pair):
+    """Generates a certificate in memory and returns the PDF as a bytearray."""
+    pdf = FPDF()
+    with metrics.timed('page'):
+        add_certificate_page(pdf, person_name, course_name, course_description, course_date, certificate_id, instructor_pair)
+    with metrics.timed('pdf_output'):
+        return pdf.output()
+
+def add_certificate_page(pdf, person_name, course_name, course_description, course_date, certificate_id, instructor_pair):
+    """Draws a certificate on a new page of `pdf`."""
+    template = template_cache.get(instructor_pair)
+    pdf.add_page()
+    template.layout.draw(pdf, template, {
+        'person_name': person_name,
+        'course_name': course_name,
+        'course_description': course_description,
+        'bulleted_description': bulleted(course_description),
+        'course_date': course_date,
+        'certificate_id': certificate_id,
+    })
+
+
+class CertificateBook:
+    """
+    Certificates collected as the pages of a single PDF, e.g. for printing.
+
+    The background image and fonts are embedded once and shared by all pages.
+    """
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.filename = os.path.basename(output_path)
+        self.certificates = 0
+        self._pdf = FPDF()
+
+    def add(self, person_name, course_name, course_description, course_date, certificate_id, instructor_pair):
+        with metrics.timed('page'):
+            add_certificate_page(self._pdf, person_name, course_name, course_description, course_date, certificate_id, instructor_pair)
+        self.certificates += 1
+
+    def save(self):
+        with metrics.timed('pdf_output'):
+            pdf_bytes = self._pdf.output()
+        with metrics.timed('disk_write'):
+            write_file(self.output_path, pdf_bytes)
+        metrics.increment('bytes_written', len(pdf_bytes))
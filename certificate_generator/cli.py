@@ -0,0 +1,188 @@
+"""
+Command-line batch generation, for rosters too big or too regular for an HTTP upload.
+
+    python -m certificate_generator batch roster.csv --instructor-pair DTK_AA [--workers N]
+
+Rows are read from the CSV as they are rendered and every outcome is appended
+to a manifest CSV (by default next to the roster). Running the same command
+again after an interruption resumes after the last row in the manifest.
+Certificates are issued through the application's registry, so they can be
+verified and downloaded from the server like uploaded ones.
+
+This module must not import Flask (or the app), so the command starts quickly.
+"""
+import os
+import sys
+import csv
+import time
+import argparse
+from itertools import islice
+from certificate_generator.batch import iter_numbered_batch, DEFAULT_CHUNK_SIZE
+from certificate_generator.ingest import open_csv_rows, MissingHeadersError
+from certificate_generator.registry import CertificateRegistry
+from certificate_generator.template_cache import ROOT_PATH, template_cache
+from certificate_generator.validation import validate_rows, iter_validated
+
+# The server's defaults (see app.py)
+DEFAULT_OUTPUT_FOLDER = os.path.join(ROOT_PATH, 'generated_pdfs')
+DEFAULT_DATABASE = os.path.join(ROOT_PATH, 'certificate_generator.sqlite3')
+
+MANIFEST_HEADERS = ['Row', 'Certificate ID', 'Person Name', 'Course Name', 'Course Date', 'File', 'Error']
+
+# Seconds between progress updates
+PROGRESS_INTERVAL = 0.5
+
+
+def default_manifest_path(csv_path):
+    return f"{os.path.splitext(csv_path)[0]}-manifest.csv"
+
+
+def read_manifest(path):
+    """
+    Returns the entries of a manifest written by an earlier run, as dicts in row order.
+
+    A run that was killed can leave a partly written last line; entries are
+    only kept up to the last complete one.
+    """
+    entries = []
+    try:
+        with open(path, newline='', encoding='utf-8') as f:
+            for entry in csv.DictReader(f):
+                if not (entry.get('Row') or '').isdigit() or entry.get('Error') is None:
+                    break
+                entries.append(entry)
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def write_manifest(path, entries):
+    """Writes a manifest with `entries` (e.g. those kept from an earlier run), replacing the file in one step."""
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=MANIFEST_HEADERS)
+        writer.writeheader()
+        writer.writerows(entries)
+    os.replace(temporary_path, path)
+
+
+def manifest_entry(result, row):
+    certificate_id = os.path.splitext(os.path.basename(result.filename))[0] if result.filename else ''
+    return {
+        'Row': result.row_number,
+        'Certificate ID': certificate_id,
+        'Person Name': row.get('Person Name') or '',
+        'Course Name': row.get('Course Name') or '',
+        'Course Date': row.get('Course Date') or '',
+        'File': result.filename or '',
+        'Error': result.error or '',
+    }
+
+
+class Progress:
+    """Rows done, throughput and time remaining, redrawn on one line of a terminal."""
+
+    def __init__(self, total_rows, done, stream=None):
+        self.total_rows = total_rows
+        self.done = done
+        self.started_row = done
+        self.failed = 0
+        self.stream = stream or sys.stderr
+        self.started = self.last_update = time.perf_counter()
+
+    @property
+    def rows_per_second(self):
+        elapsed = time.perf_counter() - self.started
+        return (self.done - self.started_row) / elapsed if elapsed > 0 else 0.0
+
+    def advance(self, failed):
+        self.done += 1
+        self.failed += failed
+        now = time.perf_counter()
+        if self.stream.isatty() and now - self.last_update >= PROGRESS_INTERVAL:
+            self.last_update = now
+            self.stream.write(f"\r{self.line()}")
+            self.stream.flush()
+
+    def line(self):
+        text = f"{self.done}/{self.total_rows} rows, {self.failed} failed, {self.rows_per_second:.1f} rows/s"
+        rate = self.rows_per_second
+        if rate and self.done < self.total_rows:
+            text += f", about {int((self.total_rows - self.done) / rate)} s left"
+        return text
+
+    def finish(self):
+        elapsed = time.perf_counter() - self.started
+        if self.stream.isatty():
+            self.stream.write("\r\033[K")
+        self.stream.write(f"{self.done}/{self.total_rows} rows, {self.failed} failed this run, "
+                          f"in {elapsed:.1f} s ({self.rows_per_second:.1f} rows/s)\n")
+
+
+def run_batch(args):
+    manifest_path = args.manifest or default_manifest_path(args.csv_file)
+    entries = [] if args.restart else read_manifest(manifest_path)
+    done = int(entries[-1]['Row']) if entries else 0
+    write_manifest(manifest_path, entries)
+
+    # Check every row up front, so duplicates of rows from an earlier run are caught too
+    with open_csv_rows(args.csv_file) as rows:
+        report = validate_rows(rows, args.instructor_pair)
+    if done:
+        print(f"Resuming after row {done} from {manifest_path}", file=sys.stderr)
+    if done >= report.total_rows:
+        print(f"All {report.total_rows} rows are already in {manifest_path}", file=sys.stderr)
+        return 0
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    registry = CertificateRegistry(args.database)
+    progress = Progress(report.total_rows, done)
+    rows_by_number = {}
+
+    def remember(numbered_rows):
+        # Keeps the rows until their result is in, for their manifest entries
+        for row_number, row in numbered_rows:
+            rows_by_number[row_number] = row
+            yield row_number, row
+
+    def render(numbered_rows):
+        return iter_numbered_batch(numbered_rows, args.instructor_pair, args.output_dir,
+                                   workers=args.workers, chunk_size=args.chunk_size, registry=registry)
+
+    with open_csv_rows(args.csv_file) as rows, open(manifest_path, 'a', newline='', encoding='utf-8') as manifest:
+        writer = csv.DictWriter(manifest, fieldnames=MANIFEST_HEADERS)
+        numbered_rows = remember(enumerate(islice(rows, done, None), start=done + 1))
+        for result in iter_validated(numbered_rows, report.check, render):
+            writer.writerow(manifest_entry(result, rows_by_number.pop(result.row_number)))
+            manifest.flush()
+            progress.advance(failed=result.error is not None)
+    progress.finish()
+    print(f"Manifest written to {manifest_path}", file=sys.stderr)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m certificate_generator', description='Generate certificates without the web server.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    batch_parser = commands.add_parser('batch', help='Generate the certificates of a roster CSV.')
+    batch_parser.add_argument('csv_file')
+    batch_parser.add_argument('--instructor-pair', required=True)
+    batch_parser.add_argument('--workers', type=int, help='Render worker processes (default: one per CPU).')
+    batch_parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Rows handed to a worker at a time.')
+    batch_parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_FOLDER, help='Where the PDFs are stored (default: the server\'s folder).')
+    batch_parser.add_argument('--database', default=DEFAULT_DATABASE, help='Registry the certificate IDs are issued in (default: the server\'s).')
+    batch_parser.add_argument('--manifest', help='Manifest CSV (default: <csv_file>-manifest.csv).')
+    batch_parser.add_argument('--restart', action='store_true', help='Ignore an existing manifest and start from the first row.')
+
+    args = parser.parse_args(argv)
+    instructor_pairs = template_cache.labels()
+    if args.instructor_pair not in instructor_pairs:
+        # Unknown pairs would silently get the default background
+        print(f"Error: unknown instructor pair {args.instructor_pair!r} (expected one of {', '.join(instructor_pairs)})", file=sys.stderr)
+        return 1
+    try:
+        return run_batch(args)
+    except (MissingHeadersError, FileNotFoundError, csv.Error, UnicodeDecodeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
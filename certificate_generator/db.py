@@ -0,0 +1,80 @@
+import sqlite3
+
+
+class SQLiteStore:
+    """
+    Base class for the tables kept in the application's SQLite database.
+
+    Subclasses define SCHEMA (run on every open, so it must be idempotent) and
+    COLUMNS, columns added after the first release as {table: {name: definition}},
+    which are added to databases created before them.
+    """
+
+    SCHEMA = ''
+    COLUMNS = {}
+
+    def __init__(self, database_path):
+        self.database_path = database_path
+        conn = self._connect()
+        try:
+            conn.executescript(self.SCHEMA)
+            self._add_missing_columns(conn)
+        finally:
+            conn.close()
+
+    def _add_missing_columns(self, conn):
+        for table, columns in self.COLUMNS.items():
+            if set(columns) <= self._column_names(conn, table):
+                continue
+            with conn:
+                # Checked again under the write lock, as other stores may be adding them at the same time
+                conn.execute('BEGIN IMMEDIATE')
+                existing = self._column_names(conn, table)
+                for name, definition in columns.items():
+                    if name not in existing:
+                        conn.execute(f'ALTER TABLE {table} ADD COLUMN {name} {definition}')
+
+    @staticmethod
+    def _column_names(conn, table):
+        return {row['name'] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def _query(self, sql, params=()):
+        conn = self._connect()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def _execute(self, sql, params=()):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(sql, params)
+        finally:
+            conn.close()
+
+    def _executemany(self, sql, seq_of_params):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(sql, seq_of_params)
+        finally:
+            conn.close()
+
+    def _rename_values(self, table, column, renames):
+        """Replaces the values of a column, given [(old value, new value)], in one pass over the table."""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('CREATE TEMP TABLE renames (old TEXT PRIMARY KEY, new TEXT NOT NULL)')
+                conn.executemany('INSERT OR REPLACE INTO renames (old, new) VALUES (?, ?)', renames)
+                conn.execute(f'UPDATE {table} SET {column} = (SELECT new FROM renames WHERE old = {table}.{column}) '
+                             f'WHERE {column} IN (SELECT old FROM renames)')
+        finally:
+            conn.close()
@@ -0,0 +1,97 @@
+import os
+import copy
+import logging
+import threading
+from io import BytesIO
+from collections import namedtuple
+from fontTools import ttLib
+from fpdf import FPDF
+from fpdf.enums import TextEmphasis
+from fpdf.fonts import TTFFont, SubsetMap
+
+STYLES = ('', 'B', 'I', 'BI')
+
+# fontTools logs every step of subsetting a font at INFO, dozens of lines per
+# font style of every PDF, which would drown out the server's own log
+logging.getLogger('fontTools').setLevel(logging.WARNING)
+
+# Attributes of a parsed font that don't change once it's in a document (the
+# character widths and glyph maps are only read)
+_SHARED_ATTRIBUTES = ('type', 'ttffile', 'name', 'up', 'ut', 'cw', 'cmap', 'glyph_ids', 'scale')
+
+# A font file parsed by fpdf, with the file's contents and modification time
+ParsedFont = namedtuple('ParsedFont', ['font', 'data', 'mtime'])
+
+
+def configured_fonts(config, root_path):
+    """
+    Returns {(family, style): font file path} of the "fonts" key of a config,
+    e.g. {"DejaVu": {"": "fonts/DejaVuSerif.ttf", "B": "fonts/DejaVuSerif-Bold.ttf"}}.
+    Relative paths are relative to `root_path`.
+    """
+    fonts = {}
+    for family, styles in config.get('fonts', {}).items():
+        for style, path in styles.items():
+            style = ''.join(sorted(style.upper()))
+            if style not in STYLES:
+                raise ValueError(f"Unknown style {style!r} for font {family!r} (expected one of B, I, BI or \"\")")
+            fonts[(family.lower(), style)] = os.path.join(root_path, path)
+    return fonts
+
+
+class FontCache:
+    """
+    Process-wide cache of parsed TrueType fonts.
+
+    fpdf parses a font file again for every document it is added to. Here a
+    file is parsed once per process (and again if it changes), and documents
+    get a copy that shares the parsed metrics and only tracks the characters
+    the document uses, so each PDF embeds a subset of the font with just
+    those glyphs.
+    """
+
+    def __init__(self):
+        self.parses = 0
+        self._fonts = {}
+        self._lock = threading.Lock()
+
+    def _parsed(self, path):
+        mtime = os.stat(path).st_mtime_ns
+        with self._lock:
+            parsed = self._fonts.get(path)
+            if parsed is None or parsed.mtime != mtime:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                parsed = ParsedFont(TTFFont(FPDF(), path, None, ''), data, mtime)
+                self._fonts[path] = parsed
+                self.parses += 1
+            return parsed
+
+    def add_to(self, pdf, family, style, path):
+        """Makes the font file `path` available to pdf.set_font(family, style), unless it already is."""
+        fontkey = family.lower() + style
+        if fontkey in pdf.fonts:
+            return
+        parsed = self._parsed(path)
+        font = TTFFont.__new__(TTFFont)
+        for attribute in _SHARED_ATTRIBUTES:
+            setattr(font, attribute, getattr(parsed.font, attribute))
+        font.i = len(pdf.fonts) + 1
+        font.fontkey = fontkey
+        font.emphasis = TextEmphasis.coerce(style)
+        # Output fills in the descriptor and subsets the font in place
+        font.desc = copy.copy(parsed.font.desc)
+        font.ttfont = ttLib.TTFont(BytesIO(parsed.data), recalcTimestamp=False, fontNumber=0, lazy=True)
+        font.missing_glyphs = []
+        reserved = "\x00 \r\n"
+        if pdf.str_alias_nb_pages:
+            reserved += "0123456789" + pdf.str_alias_nb_pages
+        font.subset = SubsetMap(font, [ord(char) for char in reserved])
+        pdf.fonts[fontkey] = font
+
+    def clear(self):
+        with self._lock:
+            self._fonts.clear()
+
+
+font_cache = FontCache()
@@ -0,0 +1,59 @@
+import os
+import hashlib
+import tempfile
+from PIL import Image
+
+# A4 page size in millimetres, which the background image always covers
+PAGE_SIZE_MM = (210, 297)
+MM_PER_INCH = 25.4
+
+
+def _source_digest(source_path, dpi, quality):
+    digest = hashlib.sha256()
+    with open(source_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    digest.update(f":{dpi}:{quality}".encode())
+    return digest.hexdigest()
+
+
+def target_size(image_size, dpi):
+    """Pixel size of a full page background at `dpi`, never larger than the source."""
+    width = round(PAGE_SIZE_MM[0] / MM_PER_INCH * dpi)
+    height = round(PAGE_SIZE_MM[1] / MM_PER_INCH * dpi)
+    return min(width, image_size[0]), min(height, image_size[1])
+
+
+def optimize_image(source_path, cache_dir, dpi, quality):
+    """
+    Downsamples and recompresses a background image to `dpi` and JPEG `quality`.
+
+    The result is stored in `cache_dir` under a name derived from the source
+    content and the settings, so it is only computed once and reused by every
+    render (and by every worker process). Returns the path of the optimized image.
+    """
+    optimized_path = os.path.join(cache_dir, f"{_source_digest(source_path, dpi, quality)}.jpg")
+    if os.path.exists(optimized_path):
+        return optimized_path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with Image.open(source_path) as img:
+        icc_profile = img.info.get('icc_profile')
+        size = target_size(img.size, dpi)
+        if size != img.size:
+            img = img.resize(size, Image.LANCZOS)
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+
+        # Write to a temporary file first so concurrent workers never see a partial image
+        fd, tmp_path = tempfile.mkstemp(suffix='.jpg', dir=cache_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                img.save(f, format='JPEG', quality=quality, optimize=True, dpi=(dpi, dpi), icc_profile=icc_profile)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, optimized_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    return optimized_path
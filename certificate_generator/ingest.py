@@ -0,0 +1,41 @@
+import io
+import csv
+from contextlib import contextmanager
+
+REQUIRED_HEADERS = ['Person Name', 'Course Name', 'Course Description', 'Course Date']
+
+
+class MissingHeadersError(ValueError):
+    """The CSV header row lacks some of the REQUIRED_HEADERS."""
+
+    def __init__(self, missing_headers):
+        self.missing_headers = missing_headers
+        super().__init__(f"CSV file is missing required columns: {', '.join(missing_headers)}")
+
+
+def read_csv_rows(stream):
+    """
+    Returns an iterator of row dicts read lazily from a CSV stream.
+
+    `stream` may be a binary stream (decoded as UTF-8, with or without BOM)
+    or a text stream opened with newline=''. The header row is read and
+    checked immediately; MissingHeadersError is raised if required columns
+    are missing. Rows are only parsed as the iterator is consumed, so memory
+    use doesn't depend on the size of the file.
+    """
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='') # utf-8-sig to handle BOM
+    reader = csv.DictReader(stream)
+
+    fieldnames = reader.fieldnames or []
+    missing_headers = [header for header in REQUIRED_HEADERS if header not in fieldnames]
+    if missing_headers:
+        raise MissingHeadersError(missing_headers)
+    return reader
+
+
+@contextmanager
+def open_csv_rows(path):
+    """Context manager yielding the rows iterator of a CSV file (see read_csv_rows)."""
+    with open(path, mode='rb') as csvfile:
+        yield read_csv_rows(csvfile)
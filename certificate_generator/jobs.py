@@ -0,0 +1,334 @@
+import os
+import time
+import uuid
+import logging
+import sqlite3
+import threading
+from datetime import date
+from functools import partial
+from itertools import islice
+from certificate_generator.batch import iter_numbered_batch, iter_numbered_combined, RowResult, DEFAULT_CHUNK_SIZE, INDIVIDUAL, COMBINED
+from certificate_generator.db import SQLiteStore
+from certificate_generator.ingest import open_csv_rows
+from certificate_generator.manifest import Manifest, iter_incremental
+from certificate_generator.metrics import metrics
+from certificate_generator.registry import CertificateRegistry
+from certificate_generator.storage import shard_filename
+from certificate_generator.validation import RowValidator, validate_rows, iter_validated
+
+logger = logging.getLogger(__name__)
+
+# A running job whose heartbeat is older than this is assumed to belong to a
+# dead worker and is picked up again by the next runner that polls.
+DEFAULT_LEASE_SECONDS = 120
+
+# Jobs of one instructor pair that runners run at the same time, so a pair
+# with several big batches doesn't keep every runner busy
+DEFAULT_MAX_RUNNING_PER_PAIR = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    instructor_pair TEXT,
+    csv_path TEXT,
+    output_folder TEXT NOT NULL,
+    total_rows INTEGER NOT NULL,
+    rows_done INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    message TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    started_row INTEGER NOT NULL DEFAULT 0,
+    heartbeat_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_pair_status ON jobs (instructor_pair, status);
+CREATE TABLE IF NOT EXISTS job_results (
+    job_id TEXT NOT NULL,
+    row_number INTEGER NOT NULL,
+    filename TEXT,
+    error TEXT,
+    PRIMARY KEY (job_id, row_number)
+);
+"""
+
+QUEUED = 'queued'
+RUNNING = 'running'
+FINISHED = 'finished'
+FAILED = 'failed'
+
+ABANDONED_STREAM_MESSAGE = 'The server stopped while processing this upload. Please upload the file again.'
+
+
+def new_job_id():
+    return uuid.uuid4().hex
+
+
+class JobStore(SQLiteStore):
+    """Certificate generation jobs and their per-row results, persisted in SQLite."""
+
+    SCHEMA = SCHEMA
+    COLUMNS = {
+        'jobs': {
+            'output_mode': f"TEXT NOT NULL DEFAULT '{INDIVIDUAL}'",
+            'incremental': 'INTEGER NOT NULL DEFAULT 0',
+        },
+    }
+
+    def create_job(self, job_id, instructor_pair, csv_path, output_folder, total_rows, output_mode=INDIVIDUAL, incremental=False):
+        self._execute(
+            'INSERT INTO jobs (id, status, instructor_pair, csv_path, output_folder, output_mode, incremental, total_rows, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (job_id, QUEUED, instructor_pair, csv_path, output_folder, output_mode, int(incremental), total_rows, time.time()))
+
+    def get_job(self, job_id):
+        rows = self._query('SELECT * FROM jobs WHERE id = ?', (job_id,))
+        return dict(rows[0]) if rows else None
+
+    def claim_job(self, job_id=None, lease_seconds=DEFAULT_LEASE_SECONDS, max_running_per_pair=None):
+        """
+        Marks the oldest runnable job (or `job_id`) as running and returns it.
+
+        Runnable means queued, or running with a heartbeat older than
+        `lease_seconds`. Returns None when there is nothing to run. Abandoned
+        jobs whose upload was streamed rather than saved can't be resumed
+        and are marked as failed instead; such jobs are only claimed by
+        naming them, as their rows come from the request that created them.
+        With `max_running_per_pair`, jobs
+        of an instructor pair that already has that many jobs running are
+        left queued.
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                conn.execute(
+                    'UPDATE jobs SET status = ?, message = ?, finished_at = ? '
+                    'WHERE status = ? AND csv_path IS NULL AND heartbeat_at < ?',
+                    (FAILED, ABANDONED_STREAM_MESSAGE, now, RUNNING, now - lease_seconds))
+                sql = 'SELECT * FROM jobs WHERE (status = ? OR (status = ? AND heartbeat_at < ? AND csv_path IS NOT NULL))'
+                params = [QUEUED, RUNNING, now - lease_seconds]
+                if max_running_per_pair is not None:
+                    sql += (' AND (SELECT COUNT(*) FROM jobs AS running WHERE running.instructor_pair IS jobs.instructor_pair'
+                            ' AND running.status = ? AND running.heartbeat_at >= ?) < ?')
+                    params += [RUNNING, now - lease_seconds, max_running_per_pair]
+                if job_id is not None:
+                    sql += ' AND id = ?'
+                    params.append(job_id)
+                else:
+                    sql += ' AND csv_path IS NOT NULL'
+                rows = conn.execute(sql + ' ORDER BY created_at LIMIT 1', params).fetchall()
+                if not rows:
+                    return None
+                job = dict(rows[0])
+                conn.execute(
+                    'UPDATE jobs SET status = ?, started_at = ?, started_row = rows_done, heartbeat_at = ? WHERE id = ?',
+                    (RUNNING, now, now, job['id']))
+        finally:
+            conn.close()
+        job.update(status=RUNNING, started_at=now, started_row=job['rows_done'], heartbeat_at=now)
+        return job
+
+    def record_results(self, job_id, results):
+        """Stores a run of consecutive RowResults and advances the job's progress past them."""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO job_results (job_id, row_number, filename, error) VALUES (?, ?, ?, ?)',
+                    [(job_id, result.row_number, result.filename, result.error) for result in results])
+                conn.execute(
+                    'UPDATE jobs SET rows_done = ?, total_rows = MAX(total_rows, ?), failed = failed + ?, heartbeat_at = ? WHERE id = ?',
+                    (results[-1].row_number, results[-1].row_number, sum(1 for result in results if result.error), time.time(), job_id))
+        finally:
+            conn.close()
+
+    def reset_progress(self, job_id):
+        """Forgets the recorded results of a job so it runs again from its first row."""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('DELETE FROM job_results WHERE job_id = ?', (job_id,))
+                conn.execute('UPDATE jobs SET rows_done = 0, failed = 0, started_row = 0 WHERE id = ?', (job_id,))
+        finally:
+            conn.close()
+
+    def active_jobs(self, instructor_pair, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Returns (queued, running) job counts of an instructor pair, not counting abandoned jobs."""
+        rows = self._query(
+            'SELECT COALESCE(SUM(status = ?), 0), COALESCE(SUM(status = ? AND heartbeat_at >= ?), 0) '
+            'FROM jobs WHERE instructor_pair IS ? AND status IN (?, ?)',
+            (QUEUED, RUNNING, time.time() - lease_seconds, instructor_pair, QUEUED, RUNNING))
+        return tuple(rows[0])
+
+    def finish_job(self, job_id, status=FINISHED, message=None):
+        now = time.time()
+        self._execute('UPDATE jobs SET status = ?, message = ?, heartbeat_at = ?, finished_at = ? WHERE id = ?',
+                      (status, message, now, now, job_id))
+
+    def rename_files(self, renames):
+        """Updates the files of job results after they moved, given [(old filename, new filename)]."""
+        self._rename_values('job_results', 'filename', renames)
+
+    def get_results(self, job_id):
+        rows = self._query('SELECT row_number, filename, error FROM job_results WHERE job_id = ? ORDER BY row_number', (job_id,))
+        return [RowResult(*row) for row in rows]
+
+
+def job_progress(job, now=None):
+    """Progress summary of a job, as returned by the /jobs/<id> endpoint."""
+    now = now or time.time()
+    eta_seconds = None
+    if job['status'] == RUNNING and job['started_at']:
+        rows_this_run = job['rows_done'] - job['started_row']
+        elapsed = now - job['started_at']
+        if rows_this_run > 0 and elapsed > 0:
+            eta_seconds = round((job['total_rows'] - job['rows_done']) * elapsed / rows_this_run, 1)
+    elif job['status'] in (FINISHED, FAILED):
+        eta_seconds = 0
+
+    return {
+        'id': job['id'],
+        'status': job['status'],
+        'total_rows': job['total_rows'],
+        'rows_done': job['rows_done'],
+        'failed': job['failed'],
+        'generated': job['rows_done'] - job['failed'],
+        'eta_seconds': eta_seconds,
+        'message': job['message'],
+    }
+
+
+def run_job(store, job, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, rows=None):
+    """
+    Renders a claimed job, resuming after its last recorded row.
+
+    Rows are read from the job's saved CSV, unless the caller streams them
+    in through `rows` (uploads that aren't saved); the total row count of
+    such jobs is only known once the stream is exhausted. Invalid rows fail
+    without being rendered: a saved CSV is validated as a whole before the
+    first certificate (so duplicates of rows recorded by an earlier run are
+    found too), streamed rows a block at a time.
+    """
+    if job['output_mode'] == COMBINED and job['rows_done']:
+        # The pages rendered before the interruption were never written; start
+        # over, with new certificate IDs
+        CertificateRegistry(store.database_path).revoke_file(combined_filename(job))
+        store.reset_progress(job['id'])
+        job.update(rows_done=0, failed=0, started_row=0)
+
+    rows_done = job['rows_done']
+    logger.info("Running job %s from row %d", job['id'], rows_done + 1)
+    started = time.perf_counter()
+    try:
+        with metrics.timed('job'):
+            if rows is not None:
+                check = RowValidator(job['instructor_pair']).check
+                rows_processed = _render_job_rows(store, job, rows, check, workers, chunk_size)
+            else:
+                with open_csv_rows(job['csv_path']) as csv_rows:
+                    report = validate_rows(csv_rows, job['instructor_pair'])
+                if report.errors:
+                    logger.warning("%d of %d rows of job %s are invalid and will not be rendered.",
+                                   len(report.errors), report.total_rows, job['id'])
+                with open_csv_rows(job['csv_path']) as csv_rows:
+                    rows_processed = _render_job_rows(store, job, islice(csv_rows, rows_done, None), report.check, workers, chunk_size)
+    except Exception as e:
+        logger.error("Job %s failed: %s", job['id'], e)
+        store.finish_job(job['id'], FAILED, str(e))
+        return
+
+    elapsed = time.perf_counter() - started
+    if rows_processed and elapsed > 0:
+        metrics.set_gauge('last_job_rows_per_second', round(rows_processed / elapsed, 2))
+    store.finish_job(job['id'])
+    logger.info("Finished job %s", job['id'])
+
+
+def combined_filename(job):
+    return shard_filename(f"certificates-{job['id']}.pdf", date.fromtimestamp(job['created_at']))
+
+
+def _render_job_rows(store, job, rows, check, workers, chunk_size):
+    """Renders and records `rows` of a job, failing those `check` rejects; returns how many rows were processed."""
+    registry = CertificateRegistry(store.database_path)
+    if job['output_mode'] == COMBINED:
+        render = partial(iter_numbered_combined, instructor_pair=job['instructor_pair'], output_folder=job['output_folder'],
+                         filename=combined_filename(job), registry=registry)
+    else:
+        render = partial(iter_numbered_batch, instructor_pair=job['instructor_pair'], output_folder=job['output_folder'],
+                         workers=workers, chunk_size=chunk_size, registry=registry)
+        if job['incremental']:
+            # Only render rows whose certificate doesn't exist yet or would come out differently
+            render = partial(iter_incremental, instructor_pair=job['instructor_pair'], output_folder=job['output_folder'],
+                             manifest=Manifest(store.database_path), render=render)
+    results = iter_validated(enumerate(rows, start=job['rows_done'] + 1), check, render)
+
+    pending = []
+    rows_processed = 0
+    for result in results:
+        pending.append(result)
+        rows_processed += 1
+        if len(pending) >= chunk_size:
+            store.record_results(job['id'], pending)
+            pending = []
+    if pending:
+        store.record_results(job['id'], pending)
+    return rows_processed
+
+
+class JobRunner:
+    """Background thread that runs queued jobs and resumes abandoned ones."""
+
+    def __init__(self, database_path, workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                 poll_interval=5, lease_seconds=DEFAULT_LEASE_SECONDS, max_running_per_pair=DEFAULT_MAX_RUNNING_PER_PAIR):
+        self.database_path = database_path
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_running_per_pair = max_running_per_pair
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        # Threads don't survive a fork, so a forked server worker starts its own
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='certificate-job-runner', daemon=True)
+            self._thread.start()
+
+    def notify(self):
+        self._wakeup.set()
+
+    def stop(self):
+        """Stops the runner once its current job (if any) is done."""
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        store = JobStore(self.database_path)
+        while not self._stopping:
+            try:
+                job = store.claim_job(lease_seconds=self.lease_seconds, max_running_per_pair=self.max_running_per_pair)
+            except sqlite3.Error as e:
+                logger.error("Could not poll for jobs: %s", e)
+                job = None
+
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            run_job(store, job, self.workers, self.chunk_size)
@@ -0,0 +1,231 @@
+import re
+import string
+import threading
+from collections import namedtuple
+from fpdf import FPDF
+from fpdf.enums import XPos, YPos, MethodReturnValue
+from fpdf.fonts import CORE_FONTS
+from certificate_generator.fonts import font_cache
+from certificate_generator.metrics import metrics
+
+# Values a layout element's text can refer to, e.g. "Date: {course_date}"
+FIELDS = ('person_name', 'course_name', 'course_description', 'bulleted_description', 'course_date', 'certificate_id')
+
+LINE_HEIGHT = 10
+
+# Height of the page and the bottom margin fpdf breaks pages at (mm)
+PAGE_HEIGHT = 297
+PAGE_BREAK_MARGIN = 20
+
+# Wrapped texts whose line breaks are remembered per layout. Rosters repeat the
+# same course name and description on every row, so each is only broken once.
+LINE_CACHE_SIZE = 1024
+
+_FONT_LINE = re.compile(rb'BT /F(\d+) (\d+(?:\.\d+)?) Tf ET')
+
+# One text element of a layout. `fields` is empty for static text.
+TextElement = namedtuple('TextElement', ['text', 'y', 'font', 'style', 'size', 'color', 'align', 'wrap', 'fields'])
+
+
+def _font_key(element):
+    return element.font.lower(), ''.join(sorted(element.style.upper()))
+
+
+def _prerenderable(element):
+    # Text in embedded (non-core) fonts is encoded with glyph IDs that are assigned per document
+    return not element.fields and ''.join(_font_key(element)) in CORE_FONTS
+
+
+def bulleted(text):
+    """The course description as drawn on certificates: one bullet per line."""
+    return "\n".join([f"* {line}" for line in text.splitlines()])
+
+
+def _page_y(y):
+    # Negative positions are measured from the bottom of the page, as fpdf's set_y does
+    return y if y >= 0 else PAGE_HEIGHT + y
+
+
+def _literal(text):
+    """Escapes a config value for use as element text (which is a format string)."""
+    return text.replace('{', '{{').replace('}', '}}')
+
+
+def default_layout(config):
+    """The standard certificate layout, positioned and styled by the flat config.json keys."""
+    return [
+        {'text': _literal(config['header_text']), 'y': 50, 'style': 'BI', 'size': 20, 'color': config['header_color']},
+        {'text': '{course_name}', 'y': config['course_name_y'], 'style': 'B', 'size': config['font_size_course_name'], 'wrap': True},
+        {'text': 'This certificate is awarded to:', 'y': config['award_text_y'], 'size': config['font_size_default']},
+        {'text': '{person_name}', 'y': config['person_name_y'], 'style': 'B', 'size': config['font_size_person_name']},
+        {'text': 'for successfully completing the course content:', 'y': config['completion_text_y'], 'size': config['font_size_default']},
+        {'text': '{bulleted_description}', 'y': config['course_description_y'], 'style': 'I', 'size': config['font_size_default'], 'wrap': True},
+        {'text': 'Date: {course_date}', 'y': config['date_y'], 'size': config['font_size_default']},
+        {'text': 'Certificate ID: {certificate_id}', 'y': -40, 'style': 'I', 'size': 8, 'color': [128, 128, 128]},
+        {'text': _literal(config['footer_text']), 'y': -30, 'style': 'I', 'size': 10, 'color': config['footer_color']},
+    ]
+
+
+def _compile_element(element, font_name):
+    fields = tuple(field for _, field, _, _ in string.Formatter().parse(element['text']) if field is not None)
+    unknown = [field for field in fields if field not in FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown layout field(s) {', '.join(unknown)} in {element['text']!r}")
+    return TextElement(
+        text=element['text'],
+        y=element['y'],
+        font=element.get('font', font_name),
+        style=element.get('style', ''),
+        size=element['size'],
+        color=tuple(element.get('color', (0, 0, 0))),
+        align=element.get('align', 'C'),
+        wrap=element.get('wrap', False),
+        fields=fields,
+    )
+
+
+class LayoutPlan:
+    """
+    A certificate layout compiled once per template.
+
+    Elements whose text doesn't refer to any field form the static layer: they
+    are rendered once, into a fragment of PDF page content that every
+    certificate copies (static text in an embedded font is drawn with the
+    slots instead). Only the text slots that refer to fields are laid out per
+    certificate, and the line breaks of wrapped slots are remembered.
+    The layout comes from the "layout" list of the config (see default_layout
+    for the element format) or, without one, from the flat config keys.
+    `font_files` maps the (family, style) of TrueType fonts the elements can
+    use to their file (see fonts.configured_fonts); other fonts must be core fonts.
+    """
+
+    def __init__(self, config, font_files=None):
+        self.background_color = tuple(config['background_color'])
+        font_files = font_files or {}
+        elements = [_compile_element(element, config['font_name']) for element in config.get('layout') or default_layout(config)]
+        # TrueType fonts the elements use, added to every document they're drawn in
+        self.embedded_fonts = {}
+        for element in elements:
+            key = _font_key(element)
+            if key in font_files:
+                self.embedded_fonts[key] = font_files[key]
+            elif ''.join(key) not in CORE_FONTS:
+                raise ValueError(f"Font {element.font!r} with style {element.style!r} is neither a core font nor in \"fonts\"")
+        self.static_elements = [element for element in elements if _prerenderable(element)]
+        self.slots = [element for element in elements if not _prerenderable(element)]
+        self._static_content, self._static_fonts = self._prerender(self.static_elements)
+        self._lines = {}
+        self._lines_lock = threading.Lock()
+        self._measure_pdf = None
+        self._measure_lock = threading.Lock()
+
+        # Lines of text that fit in each wrapped slot before the element below it
+        self.max_lines = {}
+        for slot in self.slots:
+            if slot.wrap:
+                below = [_page_y(element.y) for element in elements if _page_y(element.y) > _page_y(slot.y)]
+                bottom = min(below, default=PAGE_HEIGHT - PAGE_BREAK_MARGIN)
+                self.max_lines[slot] = int((bottom - _page_y(slot.y)) // LINE_HEIGHT)
+
+    @staticmethod
+    def _prerender(elements):
+        """
+        Renders static elements on a scratch page and returns the page content
+        they produced, as lines, with the fonts it selects as {scratch font index: (family, style)}.
+        """
+        if not elements:
+            return [], {}
+        scratch = FPDF()
+        scratch.add_page()
+        start = len(scratch.pages[scratch.page].contents)
+        # fpdf leaves out the text color when it matches the fill color, so the
+        # content starts by restoring the fill color the scratch page had
+        scratch._out(scratch.fill_color.serialize().lower())
+        fonts = {}
+        for element in elements:
+            _draw_text(scratch, element, element.text.format())
+            fonts[scratch.current_font.i] = (element.font, element.style)
+        lines = bytes(scratch.pages[scratch.page].contents[start:]).splitlines()
+        # Each certificate's document numbers fonts differently, so the font
+        # selections are rewritten when the layer is copied; if fpdf wrote them
+        # some other way, the copies would select the wrong fonts
+        selected = {int(match.group(1)) for match in map(_FONT_LINE.fullmatch, lines) if match}
+        if selected != set(fonts):
+            raise RuntimeError(f"Unexpected font selections in the static layer: expected fonts {sorted(fonts)}, found {sorted(selected)}")
+        return lines, fonts
+
+    def draw(self, pdf, template, values):
+        """Draws a certificate on the current page of `pdf`; `values` maps FIELDS to their text."""
+        pdf.set_fill_color(*self.background_color)
+        pdf.rect(0, 0, 210, 297, 'F')
+        with metrics.timed('image_embed'):
+            template.draw_background(pdf)
+        self._draw_static(pdf)
+        self._add_fonts(pdf)
+        for slot in self.slots:
+            text = slot.text.format(**values)
+            if slot.wrap:
+                _set_style(pdf, slot)
+                for line in self._wrap(pdf, slot, text):
+                    pdf.cell(0, LINE_HEIGHT, line, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align=slot.align)
+            else:
+                _draw_text(pdf, slot, text)
+
+    def _add_fonts(self, pdf):
+        for (family, style), path in self.embedded_fonts.items():
+            font_cache.add_to(pdf, family, style, path)
+
+    def _draw_static(self, pdf):
+        if not self._static_content:
+            return
+        # Inside q/Q the fonts selected by the static layer don't outlive it, so
+        # the font state fpdf tracks still matches the page afterwards
+        saved_font = (pdf.font_family, pdf.font_style, pdf.font_size_pt, pdf.current_font, pdf.underline)
+        pdf._out('q')
+        font_indices = {}
+        for scratch_index, (family, style) in self._static_fonts.items():
+            pdf.set_font(family, style)  # Adds the font to the document if it's new
+            font_indices[scratch_index] = pdf.current_font.i
+        pdf.font_family, pdf.font_style, pdf.font_size_pt, pdf.current_font, pdf.underline = saved_font
+
+        for line in self._static_content:
+            match = _FONT_LINE.fullmatch(line)
+            if match:
+                line = b'BT /F%d %s Tf ET' % (font_indices[int(match.group(1))], match.group(2))
+            pdf._out(line)
+        pdf._out('Q')
+
+    def line_count(self, slot, text):
+        """Number of lines `text` takes when drawn in the wrapped `slot`."""
+        with self._measure_lock:
+            if self._measure_pdf is None:
+                self._measure_pdf = FPDF()
+                self._measure_pdf.add_page()
+                self._add_fonts(self._measure_pdf)
+            _set_style(self._measure_pdf, slot)
+            return len(self._wrap(self._measure_pdf, slot, text))
+
+    def _wrap(self, pdf, slot, text):
+        key = (slot.font, slot.style, slot.size, pdf.epw, text)
+        lines = self._lines.get(key)
+        if lines is None:
+            lines = pdf.multi_cell(0, LINE_HEIGHT, text, align=slot.align, dry_run=True, output=MethodReturnValue.LINES)
+            with self._lines_lock:
+                if len(self._lines) >= LINE_CACHE_SIZE:
+                    self._lines.clear()
+                self._lines[key] = lines
+        return lines
+
+
+def _set_style(pdf, element):
+    pdf.set_y(element.y)
+    pdf.set_font(element.font, element.style, element.size)
+    pdf.set_text_color(*element.color)
+
+
+def _draw_text(pdf, element, text):
+    _set_style(pdf, element)
+    if element.wrap:
+        pdf.multi_cell(0, LINE_HEIGHT, text, align=element.align)
+    else:
+        pdf.cell(0, LINE_HEIGHT, text, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align=element.align)
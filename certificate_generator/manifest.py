@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import hashlib
+from collections import deque
+from itertools import islice
+from certificate_generator.batch import RowResult
+from certificate_generator.db import SQLiteStore
+from certificate_generator.metrics import metrics
+from certificate_generator.template_cache import template_cache
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS manifest (
+    fingerprint TEXT PRIMARY KEY,
+    certificate_id TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+# Rows whose fingerprints are looked up in one query
+LOOKUP_SIZE = 256
+
+# Skipped rows held back, at most, while the rows before them are rendered
+MAX_SKIPPED_WAITING = 16 * LOOKUP_SIZE
+
+CERTIFICATE_FIELDS = ['Person Name', 'Course Name', 'Course Description', 'Course Date']
+
+
+def row_fingerprint(row, instructor_pair, template_fingerprint):
+    """Digest of a row's certificate fields, the instructor pair and the template (config and background)."""
+    values = [row.get(field) for field in CERTIFICATE_FIELDS] + [instructor_pair, template_fingerprint]
+    return hashlib.sha256(json.dumps(values).encode()).hexdigest()
+
+
+class Manifest(SQLiteStore):
+    """Certificates already issued, keyed by the fingerprint of everything that went into them."""
+
+    SCHEMA = SCHEMA
+
+    def lookup(self, fingerprints):
+        """Returns {fingerprint: (certificate_id, filename)} for the known `fingerprints`."""
+        fingerprints = list(fingerprints)
+        if not fingerprints:
+            return {}
+        placeholders = ', '.join('?' * len(fingerprints))
+        rows = self._query(f'SELECT fingerprint, certificate_id, filename FROM manifest WHERE fingerprint IN ({placeholders})',
+                           fingerprints)
+        return {row['fingerprint']: (row['certificate_id'], row['filename']) for row in rows}
+
+    def record(self, entries):
+        """Stores (fingerprint, certificate_id, filename) entries."""
+        now = time.time()
+        self._executemany('INSERT OR REPLACE INTO manifest (fingerprint, certificate_id, filename, created_at) VALUES (?, ?, ?, ?)',
+                          [(fingerprint, certificate_id, filename, now) for fingerprint, certificate_id, filename in entries])
+
+
+    def rename_files(self, renames):
+        """Updates the files of manifest entries after they moved, given [(old filename, new filename)]."""
+        self._rename_values('manifest', 'filename', renames)
+
+
+def iter_incremental(numbered_rows, instructor_pair, output_folder, manifest, render):
+    """
+    Yields a RowResult per (row_number, row), in row order, rendering only rows without an up-to-date certificate.
+
+    A row is skipped when the manifest knows its fingerprint and the issued file
+    still exists in `output_folder`; its result points at that file. The other
+    rows are passed as (row_number, row) pairs to `render`, which must return
+    their RowResults in order (e.g. batch.iter_numbered_batch); the certificates
+    it generates are added to the manifest.
+
+    Skipped results can only be yielded once the rows before them have been
+    rendered. So that long runs of skipped rows aren't held back, `render` is
+    given its rows in segments: a segment ends once LOOKUP_SIZE skipped rows
+    are waiting and no row is being rendered, or MAX_SKIPPED_WAITING are
+    waiting in any case, and `render` is called again for the next one.
+    """
+    template_fingerprint = template_cache.get(instructor_pair).fingerprint
+    numbered_rows = iter(numbered_rows)
+    skipped = deque()
+    fingerprints = {}
+    in_flight = 0
+    exhausted = False
+
+    def checked_rows():
+        """Yields (row_number, row, RowResult of the issued certificate or None)."""
+        while True:
+            block = list(islice(numbered_rows, LOOKUP_SIZE))
+            if not block:
+                return
+            block_fingerprints = {
+                row_number: row_fingerprint(row, instructor_pair, template_fingerprint)
+                for row_number, row in block
+                if all(row.get(field) for field in CERTIFICATE_FIELDS)
+            }
+            issued = manifest.lookup(set(block_fingerprints.values()))
+            for row_number, row in block:
+                fingerprint = block_fingerprints.get(row_number)
+                if fingerprint in issued:
+                    filename = issued[fingerprint][1]
+                    if os.path.exists(os.path.join(output_folder, filename)):
+                        yield row_number, row, RowResult(row_number, filename, None)
+                        continue
+                if fingerprint is not None:
+                    fingerprints[row_number] = fingerprint
+                yield row_number, row, None
+
+    checked = checked_rows()
+
+    def rows_to_render():
+        nonlocal in_flight, exhausted
+        for row_number, row, result in checked:
+            if result is None:
+                in_flight += 1
+                yield row_number, row
+                continue
+            skipped.append(result)
+            metrics.increment('rows_skipped')
+            if len(skipped) >= MAX_SKIPPED_WAITING or (len(skipped) >= LOOKUP_SIZE and not in_flight):
+                return
+        exhausted = True
+
+    new_entries = []
+    while not exhausted:
+        for result in render(rows_to_render()):
+            in_flight -= 1
+            while skipped and skipped[0].row_number < result.row_number:
+                yield skipped.popleft()
+            fingerprint = fingerprints.pop(result.row_number, None)
+            if fingerprint is not None and result.filename:
+                new_entries.append((fingerprint, os.path.splitext(os.path.basename(result.filename))[0], result.filename))
+                if len(new_entries) >= LOOKUP_SIZE:
+                    manifest.record(new_entries)
+                    new_entries = []
+            yield result
+        # Every row of the segment has been rendered; the skipped ones come after them
+        while skipped:
+            yield skipped.popleft()
+
+    if new_entries:
+        manifest.record(new_entries)
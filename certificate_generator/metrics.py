@@ -0,0 +1,183 @@
+import time
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import nullcontext
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the stage duration histogram buckets
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Counter name -> help text
+COUNTERS = {
+    'rows_generated': 'Certificates generated.',
+    'rows_failed': 'Rows that failed to produce a certificate.',
+    'rows_skipped': 'Rows whose certificate was already issued and unchanged.',
+    'bytes_written': 'Bytes of PDF written to disk.',
+    'uploads': 'CSV uploads accepted.',
+    'uploads_rejected': 'CSV uploads turned away because their instructor pair had too many jobs.',
+    'pdf_cache_hits': 'Certificate downloads served from the in-memory PDF cache.',
+    'pdf_cache_misses': 'Certificate downloads that had to read or render the PDF.',
+}
+
+# Gauge name -> help text
+GAUGES = {
+    'last_job_rows_per_second': 'Rows processed per second by the most recently finished job.',
+    'pdf_cache_bytes': 'Bytes of PDF held in the in-memory PDF cache.',
+}
+
+PREFIX = 'certificate_generator'
+
+_NULL_TIMER = nullcontext()
+
+
+class Metrics:
+    """
+    Stage duration histograms, counters and gauges of one process.
+
+    When disabled, timed() returns a shared no-op context manager and the
+    other methods return immediately, so instrumented code pays one attribute
+    check per call. Metrics recorded in batch worker processes are sent back
+    with each chunk's results (collect() in the worker, merge() in the parent).
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {} # stage -> [bucket counts..., +Inf count], sum
+            self._counters = dict.fromkeys(COUNTERS, 0)
+            self._gauges = {}
+
+    def timed(self, stage):
+        """Context manager recording the duration of its block under `stage`."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, stage)
+
+    def observe(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = [[0] * (len(BUCKETS) + 1), 0.0]
+            histogram[0][bisect_left(BUCKETS, seconds)] += 1
+            histogram[1] += seconds
+        trace = getattr(self._local, 'trace', None)
+        if trace is not None:
+            trace[stage] = trace.get(stage, 0.0) + seconds
+
+    def increment(self, name, amount=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] += amount
+
+    def set_gauge(self, name, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[name] = value
+
+    def collect(self):
+        """Returns everything recorded since the last collect() and starts over (used in worker processes)."""
+        with self._lock:
+            snapshot = {
+                'histograms': self._histograms,
+                'counters': self._counters,
+            }
+            self._histograms = {}
+            self._counters = dict.fromkeys(COUNTERS, 0)
+        return snapshot
+
+    def merge(self, snapshot):
+        """Adds a snapshot returned by collect() in another process."""
+        if not self.enabled or not snapshot:
+            return
+        trace = getattr(self._local, 'trace', None)
+        with self._lock:
+            for stage, (counts, total) in snapshot['histograms'].items():
+                histogram = self._histograms.get(stage)
+                if histogram is None:
+                    histogram = self._histograms[stage] = [[0] * (len(BUCKETS) + 1), 0.0]
+                histogram[0] = [a + b for a, b in zip(histogram[0], counts)]
+                histogram[1] += total
+                if trace is not None:
+                    trace[stage] = trace.get(stage, 0.0) + total
+            for name, value in snapshot['counters'].items():
+                self._counters[name] += value
+
+    def start_trace(self):
+        """Starts collecting a per-stage breakdown of the time spent in this thread (e.g. by one request)."""
+        if self.enabled:
+            self._local.trace = {}
+
+    def end_trace(self):
+        """Returns {stage: seconds} recorded since start_trace() in this thread, or None."""
+        trace = getattr(self._local, 'trace', None)
+        self._local.trace = None
+        return trace
+
+    def render_prometheus(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            histograms = {stage: (list(counts), total) for stage, (counts, total) in self._histograms.items()}
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+
+        lines = [
+            f'# HELP {PREFIX}_stage_seconds Time spent in each stage of certificate generation.',
+            f'# TYPE {PREFIX}_stage_seconds histogram',
+        ]
+        for stage in sorted(histograms):
+            counts, total = histograms[stage]
+            cumulative = 0
+            for bound, count in zip(BUCKETS, counts):
+                cumulative += count
+                lines.append(f'{PREFIX}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{PREFIX}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {cumulative}')
+            lines.append(f'{PREFIX}_stage_seconds_sum{{stage="{stage}"}} {total}')
+            lines.append(f'{PREFIX}_stage_seconds_count{{stage="{stage}"}} {cumulative}')
+
+        for name, help_text in COUNTERS.items():
+            lines.append(f'# HELP {PREFIX}_{name}_total {help_text}')
+            lines.append(f'# TYPE {PREFIX}_{name}_total counter')
+            lines.append(f'{PREFIX}_{name}_total {counters[name]}')
+
+        for name, help_text in GAUGES.items():
+            if name in gauges:
+                lines.append(f'# HELP {PREFIX}_{name} {help_text}')
+                lines.append(f'# TYPE {PREFIX}_{name} gauge')
+                lines.append(f'{PREFIX}_{name} {gauges[name]}')
+        return '\n'.join(lines) + '\n'
+
+
+class _Timer:
+    __slots__ = ('_metrics', '_stage', '_start')
+
+    def __init__(self, metrics, stage):
+        self._metrics = metrics
+        self._stage = stage
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._metrics.observe(self._stage, time.perf_counter() - self._start)
+        return False
+
+
+def format_trace(trace):
+    """One-line summary of a start_trace()/end_trace() breakdown, slowest stage first."""
+    return ' '.join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in sorted(trace.items(), key=lambda item: -item[1]))
+
+
+metrics = Metrics()
@@ -0,0 +1,106 @@
+import os
+import stat
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+from certificate_generator.metrics import metrics
+
+DEFAULT_MAX_BYTES = 128 * 1024 * 1024
+
+# `validator` identifies the version of the source the data was loaded from,
+# e.g. the file's modification time and size; a different one means the
+# certificate was regenerated and the entry is stale.
+CachedPDF = namedtuple('CachedPDF', ['data', 'etag', 'last_modified', 'validator'])
+
+
+class PDFCache:
+    """
+    Least recently used PDFs kept in memory, up to `max_bytes` in total.
+
+    Entries are checked against their source on every lookup (a stat for
+    files), so a certificate that is regenerated, even by another process,
+    is never served stale. PDFs larger than `max_bytes` are not cached.
+    ETags are digests of the content, so they are strong validators.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, validator, load):
+        """
+        Returns the CachedPDF for `key`. On a miss, or if the cached entry's
+        validator differs from `validator`, load() is called and must return
+        (data, last_modified timestamp).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.validator == validator:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.increment('pdf_cache_hits')
+                return entry
+            self.misses += 1
+            metrics.increment('pdf_cache_misses')
+
+        data, last_modified = load()
+        entry = CachedPDF(bytes(data), hashlib.sha1(data).hexdigest(), last_modified, validator)
+        self._store(key, entry)
+        return entry
+
+    def get_file(self, path):
+        """
+        Returns the CachedPDF of a file, reading it only if it isn't cached or
+        has changed, or None if there is no such file or it is too large to cache.
+        """
+        try:
+            file_stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        if not stat.S_ISREG(file_stat.st_mode) or file_stat.st_size > self.max_bytes:
+            return None
+
+        def load():
+            with open(path, 'rb') as f:
+                return f.read(), file_stat.st_mtime
+
+        return self.get(path, ('file', file_stat.st_mtime_ns, file_stat.st_size), load)
+
+    def _store(self, key, entry):
+        size = len(entry.data)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous.data)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = entry
+            self.size += size
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted.data)
+                self.evictions += 1
+            metrics.set_gauge('pdf_cache_bytes', self.size)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+            }
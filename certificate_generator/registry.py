@@ -0,0 +1,142 @@
+import time
+from certificate_generator.certificates import generate_certificate_id
+from certificate_generator.db import SQLiteStore
+from certificate_generator.manifest import CERTIFICATE_FIELDS
+from certificate_generator.metrics import metrics
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS certificates (
+    certificate_id TEXT PRIMARY KEY,
+    person_name TEXT NOT NULL,
+    course_name TEXT NOT NULL,
+    course_description TEXT NOT NULL,
+    course_date TEXT NOT NULL,
+    instructor_pair TEXT,
+    filename TEXT NOT NULL,
+    issued_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS certificates_person_name ON certificates (person_name);
+CREATE INDEX IF NOT EXISTS certificates_course ON certificates (course_name, course_date);
+"""
+
+# Give up on a row after this many colliding IDs in a row (its ID prefix is nearly exhausted)
+MAX_ID_ATTEMPTS = 100
+
+# SQLite limits the number of parameters in one statement
+QUERY_SIZE = 500
+
+
+class CertificateRegistry(SQLiteStore):
+    """
+    Every certificate issued, indexed by ID, person name and course/date.
+
+    IDs are reserved here before their PDF is written, so a random suffix that
+    collides with an earlier certificate is caught instead of overwriting its file.
+    Batches reserve them as pending, and confirm them once the file is written:
+    pending certificates can't be looked up, so a certificate whose file was
+    never delivered (its job died, or writing it failed) doesn't verify.
+    """
+
+    SCHEMA = SCHEMA
+    COLUMNS = {
+        'certificates': {
+            'pending': 'INTEGER NOT NULL DEFAULT 0',
+        },
+    }
+
+    def issue_ids(self, numbered_rows, instructor_pair, filename=None, pending=False):
+        """
+        Generates and registers unique certificate IDs for (row_number, row) pairs.
+
+        Rows missing any certificate field are left out. All IDs are checked
+        against the registry with one query per attempt and inserted in one
+        transaction. Returns {row_number: certificate_id}. `filename` is the file
+        the certificates are written to, or a function returning the file of a
+        certificate ID (by default each is "<certificate_id>.pdf"). With
+        `pending`, the certificates only count as issued once they are confirmed.
+        """
+        unassigned = {}
+        for row_number, row in numbered_rows:
+            fields = tuple(row.get(field) for field in CERTIFICATE_FIELDS)
+            if all(fields):
+                unassigned[row_number] = fields
+        fields_by_row = dict(unassigned)
+        if not unassigned:
+            return {}
+
+        filename_of = filename if callable(filename) else lambda certificate_id: filename or f"{certificate_id}.pdf"
+
+        issued = {}
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                for attempt in range(MAX_ID_ATTEMPTS):
+                    candidates = {}
+                    for row_number, (person_name, course_name, course_description, course_date) in unassigned.items():
+                        with metrics.timed('generate_id'):
+                            candidates[row_number] = generate_certificate_id(person_name, course_name, course_date)
+
+                    taken = self._existing_ids(conn, candidates.values())
+                    taken.update(issued.values())
+                    for row_number, certificate_id in candidates.items():
+                        if certificate_id not in taken:
+                            taken.add(certificate_id)
+                            issued[row_number] = certificate_id
+                            del unassigned[row_number]
+                    if not unassigned:
+                        break
+                else:
+                    raise RuntimeError(f"Could not generate a unique certificate ID for rows {sorted(unassigned)}")
+
+                conn.executemany(
+                    'INSERT INTO certificates (certificate_id, person_name, course_name, course_description, course_date, '
+                    'instructor_pair, filename, issued_at, pending) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    [(certificate_id, *fields_by_row[row_number], instructor_pair, filename_of(certificate_id), now, int(pending))
+                     for row_number, certificate_id in issued.items()])
+        finally:
+            conn.close()
+        return issued
+
+    def _existing_ids(self, conn, certificate_ids):
+        certificate_ids = list(certificate_ids)
+        existing = set()
+        for i in range(0, len(certificate_ids), QUERY_SIZE):
+            batch = certificate_ids[i:i + QUERY_SIZE]
+            placeholders = ', '.join('?' * len(batch))
+            rows = conn.execute(f'SELECT certificate_id FROM certificates WHERE certificate_id IN ({placeholders})', batch)
+            existing.update(row['certificate_id'] for row in rows)
+        return existing
+
+    def rename_files(self, renames):
+        """Updates the files of certificates after they moved, given [(old filename, new filename)]."""
+        self._rename_values('certificates', 'filename', renames)
+
+    def confirm(self, certificate_ids):
+        """Marks pending IDs as issued, once their certificate has been written."""
+        self._executemany('UPDATE certificates SET pending = 0 WHERE certificate_id = ?', [(certificate_id,) for certificate_id in certificate_ids])
+
+    def revoke(self, certificate_ids):
+        """Removes IDs whose certificate couldn't be generated."""
+        self._executemany('DELETE FROM certificates WHERE certificate_id = ?', [(certificate_id,) for certificate_id in certificate_ids])
+
+    def revoke_file(self, filename):
+        """Removes the IDs of every certificate in `filename`, e.g. a combined PDF that is generated again."""
+        self._execute('DELETE FROM certificates WHERE filename = ?', (filename,))
+
+    def get(self, certificate_id):
+        rows = self._query('SELECT * FROM certificates WHERE certificate_id = ? AND pending = 0', (certificate_id,))
+        return dict(rows[0]) if rows else None
+
+    def find(self, person_name=None, course_name=None, course_date=None, limit=100):
+        """Certificates matching all the given fields, most recent first."""
+        conditions, params = ['pending = 0'], []
+        for column, value in (('person_name', person_name), ('course_name', course_name), ('course_date', course_date)):
+            if value is not None:
+                conditions.append(f'{column} = ?')
+                params.append(value)
+        sql = 'SELECT * FROM certificates WHERE ' + ' AND '.join(conditions)
+        rows = self._query(sql + ' ORDER BY issued_at DESC LIMIT ?', params + [limit])
+        return [dict(row) for row in rows]
+
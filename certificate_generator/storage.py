@@ -0,0 +1,132 @@
+import os
+import re
+import shutil
+import hashlib
+import threading
+from datetime import date
+
+# The day folders of shard_filename
+_DAY_PATH = re.compile(r'(\d{4})/(\d{2})/(\d{2})')
+
+
+def shard_filename(name, day=None):
+    """
+    Path of a generated file relative to the storage folder.
+
+    Files are grouped by the day they were generated (default: today), then by
+    the first byte of the SHA-1 of their name, e.g. 2024/03/15/9f/<name>. A day
+    never has more than 256 subfolders, and old days can be removed as a whole.
+    """
+    day = day or date.today()
+    shard = hashlib.sha1(name.encode()).hexdigest()[:2]
+    return f"{day:%Y/%m/%d}/{shard}/{name}"
+
+
+def certificate_filename(certificate_id, day=None):
+    return shard_filename(f"{certificate_id}.pdf", day)
+
+
+def write_file(path, data):
+    """
+    Writes `data` to `path`, creating its folder if needed.
+
+    The data goes to a temporary file next to `path` that then replaces it, so
+    readers (downloads, other workers) never see a partly written file.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Unique per writer, for workers and threads writing the same file at once
+    temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temporary_path, 'wb') as f:
+            f.write(data)
+        os.replace(temporary_path, path)
+    except BaseException:
+        try:
+            os.remove(temporary_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+class CertificateStorage:
+    """
+    The generated PDFs under one folder, laid out by shard_filename.
+
+    Filenames handed around by the rest of the application (job results, the
+    registry and manifest, URLs) are paths relative to the folder.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, filename):
+        """Absolute path of a stored file; ValueError if `filename` points outside the folder."""
+        path = os.path.normpath(os.path.join(self.root, filename))
+        if os.path.isabs(filename) or not path.startswith(os.path.join(os.path.normpath(self.root), '')):
+            raise ValueError(f"Invalid filename {filename!r}")
+        return path
+
+    def files(self):
+        """Filenames of all the stored files."""
+        return [os.path.relpath(os.path.join(dirpath, name), self.root)
+                for dirpath, _, filenames in os.walk(self.root) for name in filenames]
+
+    def migrate(self):
+        """
+        Moves the PDFs of a flat folder (the layout before sharding) into their shard.
+
+        Each file goes to the day it was last modified. Returns [(old filename,
+        new filename)] of the files moved, so references to them can be updated.
+        """
+        moved = []
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if not entry.is_file() or not entry.name.endswith('.pdf'):
+                    continue
+                filename = shard_filename(entry.name, date.fromtimestamp(entry.stat().st_mtime))
+                path = self.path(filename)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(entry.path, path)
+                moved.append((entry.name, filename))
+        return moved
+
+    def days(self):
+        """Returns {day: folder} of the days that have files."""
+        days = {}
+        for year in _subfolders(self.root):
+            for month in _subfolders(os.path.join(self.root, year)):
+                for day in _subfolders(os.path.join(self.root, year, month)):
+                    match = _DAY_PATH.fullmatch(f"{year}/{month}/{day}")
+                    if match:
+                        try:
+                            days[date(*map(int, match.groups()))] = os.path.join(self.root, year, month, day)
+                        except ValueError:
+                            pass
+        return days
+
+    def sweep(self, before):
+        """
+        Removes every file generated before the date `before`, a day folder at
+        a time, along with the month and year folders left empty.
+        Returns the number of files removed.
+        """
+        removed = 0
+        for day, folder in sorted(self.days().items()):
+            if day >= before:
+                break
+            removed += sum(len(filenames) for _, _, filenames in os.walk(folder))
+            shutil.rmtree(folder)
+            for parent in (os.path.dirname(folder), os.path.dirname(os.path.dirname(folder))):
+                try:
+                    os.rmdir(parent)
+                except OSError:
+                    break # Not empty
+        return removed
+
+
+def _subfolders(path):
+    try:
+        with os.scandir(path) as entries:
+            return sorted(entry.name for entry in entries if entry.is_dir())
+    except FileNotFoundError:
+        return []
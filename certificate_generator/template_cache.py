@@ -0,0 +1,152 @@
+import os
+import json
+import hashlib
+import threading
+from fpdf.image_datastructures import ImageCache
+from fpdf.image_parsing import preload_image
+from certificate_generator.fonts import configured_fonts
+from certificate_generator.image_optimizer import optimize_image
+from certificate_generator.layout import LayoutPlan
+
+ROOT_PATH = os.path.dirname(os.path.abspath(__file__))
+CONFIG_FILENAME = 'config.json'
+
+
+def _mtime(path):
+    """Returns the modification time of a file, or None if it does not exist."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _fingerprint(config, file_paths):
+    """Digest of everything in a template that affects the rendered certificates."""
+    digest = hashlib.sha256(json.dumps(config, sort_keys=True).encode())
+    for path in file_paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class CertificateTemplate:
+    """Parsed config, compiled layout, fonts and pre-processed background image for one instructor pair."""
+
+    def __init__(self, config, config_mtime, background_image_path, image_mtime, embedded_image_path=None, font_files=None):
+        self.config = config
+        self.config_mtime = config_mtime
+        self.background_image_path = background_image_path
+        self.image_mtime = image_mtime
+        # Image actually embedded in the PDFs: the source, or its optimized copy
+        self.embedded_image_path = embedded_image_path or background_image_path
+        self._image_name = None
+        self._image_info = None
+        self._iccp = None
+        self.layout = LayoutPlan(config, font_files)
+        self.font_mtimes = {path: _mtime(path) for path in self.layout.embedded_fonts.values()}
+        image_paths = [background_image_path] if image_mtime is not None else []
+        self.fingerprint = _fingerprint(config, image_paths + sorted(self.font_mtimes))
+
+        if image_mtime is not None:
+            # Decode the JPEG once; every PDF reuses the parsed image data
+            image_cache = ImageCache()
+            self._image_name, _, self._image_info = preload_image(image_cache, self.embedded_image_path)
+            if self._image_info.get('iccp_i') is not None:
+                self._iccp = next(iter(image_cache.icc_profiles))
+
+    def is_current(self, config_mtime, image_mtime):
+        return (self.config_mtime == config_mtime and self.image_mtime == image_mtime
+                and all(_mtime(path) == mtime for path, mtime in self.font_mtimes.items()))
+
+    def draw_background(self, pdf):
+        """Draws the background image over the whole current page of `pdf`."""
+        if self._image_info is None:
+            return
+
+        images = pdf.image_cache.images
+        if self._image_name not in images:
+            info = type(self._image_info)(self._image_info)
+            info['i'] = len(images) + 1
+            info['usages'] = 0
+            if self._iccp is not None:
+                icc_profiles = pdf.image_cache.icc_profiles
+                info['iccp_i'] = icc_profiles.setdefault(self._iccp, len(icc_profiles))
+            images[self._image_name] = info
+
+        pdf.image(self._image_name, x=0, y=0, w=210, h=297)
+
+
+class TemplateCache:
+    """
+    Process-wide cache of certificate templates, keyed by instructor pair.
+
+    Each instructor pair is an entry of the "templates" object of config.json,
+    whose keys override the top-level ones (e.g. its background_image or layout).
+    An entry is rebuilt whenever the modification time of config.json, of
+    its background image or of its font files changes.
+    """
+
+    def __init__(self, root_path=ROOT_PATH, config_filename=CONFIG_FILENAME):
+        self.root_path = root_path
+        self.config_path = os.path.join(root_path, config_filename)
+        self.hits = 0
+        self.misses = 0
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    def get(self, instructor_pair):
+        """Returns the CertificateTemplate for an instructor pair, loading it if needed."""
+        config_mtime = _mtime(self.config_path)
+
+        with self._lock:
+            template = self._templates.get(instructor_pair)
+            if template is not None and template.is_current(config_mtime, _mtime(template.background_image_path)):
+                self.hits += 1
+                return template
+
+            self.misses += 1
+            template = self._load(instructor_pair)
+            self._templates[instructor_pair] = template
+            return template
+
+    def _load(self, instructor_pair):
+        # Stat before reading so a concurrent edit forces a reload on the next call
+        config_mtime = _mtime(self.config_path)
+        with open(self.config_path) as f:
+            config = json.load(f)
+        templates = config.pop('templates', {})
+        config.update(templates.get(instructor_pair, {}))
+
+        background_image_name = config.get('background_image', 'static/template.jpg')
+        background_image_path = os.path.join(self.root_path, background_image_name)
+        image_mtime = _mtime(background_image_path)
+
+        embedded_image_path = None
+        optimization = config.get('background_optimization', {})
+        if image_mtime is not None and optimization.get('enabled'):
+            embedded_image_path = optimize_image(
+                background_image_path,
+                os.path.join(self.root_path, optimization.get('cache_dir', 'optimized_backgrounds')),
+                optimization.get('dpi', 150),
+                optimization.get('quality', 85))
+
+        return CertificateTemplate(config, config_mtime, background_image_path, image_mtime, embedded_image_path,
+                                   configured_fonts(config, self.root_path))
+
+    def labels(self):
+        """Returns {instructor pair: label} for the templates defined in config.json."""
+        with open(self.config_path) as f:
+            templates = json.load(f).get('templates', {})
+        return {name: template.get('label', name) for name, template in templates.items()}
+
+    def clear(self):
+        with self._lock:
+            self._templates.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'templates': len(self._templates)}
+
+
+template_cache = TemplateCache()
@@ -0,0 +1,176 @@
+import json
+import hashlib
+from collections import deque
+from functools import lru_cache
+from itertools import islice
+from certificate_generator.batch import RowResult
+from certificate_generator.certificates import parse_date
+from certificate_generator.ingest import REQUIRED_HEADERS
+from certificate_generator.layout import bulleted
+from certificate_generator.metrics import metrics
+from certificate_generator.template_cache import template_cache
+
+# Rows checked together; also the unit iter_validated reads ahead by
+BLOCK_SIZE = 256
+
+# Layout fields -> the CSV column their text comes from
+FIELD_COLUMNS = {
+    'person_name': 'Person Name',
+    'course_name': 'Course Name',
+    'course_description': 'Course Description',
+    'bulleted_description': 'Course Description',
+    'course_date': 'Course Date',
+}
+
+
+@lru_cache(maxsize=4096)
+def normalize_course_date(value):
+    """
+    Returns a Course Date as a 'YYYY-MM-DD:YYYY-MM-DD' range, or None if it isn't valid.
+
+    A single date stands for a one-day course. Besides ISO dates, the formats
+    generate_certificate_id understands are accepted. The end can't be before the start.
+    """
+    parts = value.split(':')
+    if len(parts) > 2:
+        return None
+    dates = [parse_date(part.strip()) for part in parts]
+    if None in dates or dates[-1] < dates[0]:
+        return None
+    return f"{dates[0].isoformat()}:{dates[-1].isoformat()}"
+
+
+def _row_error(row_number, person_name, message):
+    # Same format as the errors of render_row
+    return f"Row {row_number} (Person: {person_name or 'N/A'}) - {message}"
+
+
+class RowValidator:
+    """
+    Checks CSV rows before any certificate is rendered.
+
+    Rows are checked a block at a time, one column at a time: required
+    fields, the Course Date format, text too long for the wrapped slots of
+    the instructor pair's layout, and duplicates of earlier rows (the same
+    certificate fields, with dates compared once normalized). Distinct values
+    are only checked once, and duplicates are found across all the blocks
+    passed to one validator.
+    """
+
+    def __init__(self, instructor_pair):
+        self.layout = template_cache.get(instructor_pair).layout
+        # Digest of a row's normalized certificate fields -> first row with them
+        self._seen = {}
+
+    def check(self, numbered_rows):
+        """Returns {row_number: error message} for the invalid rows among the (row_number, row) pairs."""
+        numbered_rows = list(numbered_rows)
+        row_numbers = [row_number for row_number, _ in numbered_rows]
+        columns = {column: [(row.get(column) or '').strip() for _, row in numbered_rows] for column in REQUIRED_HEADERS}
+        names = columns['Person Name']
+        errors = {}
+
+        for i, values in enumerate(zip(*columns.values())):
+            if not all(values):
+                errors[row_numbers[i]] = _row_error(row_numbers[i], names[i], "Missing data")
+
+        date_column = columns['Course Date']
+        dates = {value: normalize_course_date(value) for value in set(date_column)}
+        for i, value in enumerate(date_column):
+            if value and dates[value] is None and row_numbers[i] not in errors:
+                errors[row_numbers[i]] = _row_error(row_numbers[i], names[i],
+                                                    f"Invalid course date '{value}', expected YYYY-MM-DD:YYYY-MM-DD")
+
+        for slot, max_lines in self.layout.max_lines.items():
+            slot_columns = [columns[FIELD_COLUMNS[field]] for field in slot.fields if field in FIELD_COLUMNS]
+            if not slot_columns or len(slot_columns) != len(slot.fields):
+                continue # Refers to the certificate ID, which isn't known yet
+            texts = [self._slot_text(slot, values) for values in zip(*slot_columns)]
+            line_counts = {text: self.layout.line_count(slot, text) for text in set(texts)}
+            for i, text in enumerate(texts):
+                if line_counts[text] > max_lines and row_numbers[i] not in errors:
+                    column = FIELD_COLUMNS[slot.fields[0]]
+                    errors[row_numbers[i]] = _row_error(row_numbers[i], names[i],
+                                                        f"{column} is too long ({line_counts[text]} lines, at most {max_lines} fit)")
+
+        for i, row_number in enumerate(row_numbers):
+            if row_number in errors:
+                continue
+            key = self._key(names[i], columns['Course Name'][i], columns['Course Description'][i], dates[date_column[i]])
+            first = self._seen.setdefault(key, row_number)
+            if first != row_number:
+                errors[row_number] = _row_error(row_number, names[i], f"Duplicate of row {first}")
+        return errors
+
+    @staticmethod
+    def _key(*values):
+        # A fixed-size digest rather than the values themselves, so the memory
+        # kept per row doesn't depend on the length of its text
+        return hashlib.sha1(json.dumps(values).encode()).digest()
+
+    @staticmethod
+    def _slot_text(slot, values):
+        fields = dict(zip(slot.fields, values))
+        if 'bulleted_description' in fields:
+            fields['bulleted_description'] = bulleted(fields['bulleted_description'])
+        return slot.text.format(**fields)
+
+
+class ValidationReport:
+    """Outcome of validate_rows: the number of rows and {row_number: error message} of the invalid ones."""
+
+    def __init__(self, total_rows, errors):
+        self.total_rows = total_rows
+        self.errors = errors
+
+    def check(self, numbered_rows):
+        """Same as RowValidator.check, answered from the report."""
+        return {row_number: self.errors[row_number] for row_number, _ in numbered_rows if row_number in self.errors}
+
+
+def validate_rows(rows, instructor_pair, start=1):
+    """Checks all `rows` (numbered from `start`) in one pass and returns a ValidationReport."""
+    validator = RowValidator(instructor_pair)
+    numbered_rows = enumerate(rows, start=start)
+    total_rows = 0
+    errors = {}
+    with metrics.timed('validate'):
+        while True:
+            block = list(islice(numbered_rows, BLOCK_SIZE))
+            if not block:
+                break
+            total_rows += len(block)
+            errors.update(validator.check(block))
+    return ValidationReport(total_rows, errors)
+
+
+def iter_validated(numbered_rows, check, render):
+    """
+    Yields a RowResult per (row_number, row), in row order, without rendering invalid rows.
+
+    `check` (RowValidator.check or ValidationReport.check) is called on blocks
+    of BLOCK_SIZE rows; the rows it rejects fail with its error message. The
+    others are passed as (row_number, row) pairs to `render`, which must
+    return their RowResults in order (e.g. batch.iter_numbered_batch).
+    """
+    numbered_rows = iter(numbered_rows)
+    invalid = deque()
+
+    def rows_to_render():
+        while True:
+            block = list(islice(numbered_rows, BLOCK_SIZE))
+            if not block:
+                return
+            errors = check(block)
+            for row_number, row in block:
+                if row_number in errors:
+                    invalid.append(RowResult(row_number, None, errors[row_number]))
+                    metrics.increment('rows_failed')
+                else:
+                    yield row_number, row
+
+    for result in render(rows_to_render()):
+        while invalid and invalid[0].row_number < result.row_number:
+            yield invalid.popleft()
+        yield result
+    yield from invalid
@@ -0,0 +1,186 @@
+import os
+import struct
+import hashlib
+import zlib
+import time
+
+# Only files are ever stored: the PDFs are mostly JPEG data that deflate can't shrink.
+READ_SIZE = 64 * 1024
+
+# Flags: bit 3 - CRC and sizes follow the data in a data descriptor,
+# bit 11 - file names are UTF-8.
+FLAGS = 0x0808
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP64_COUNT_LIMIT = 0xFFFF
+
+
+def _dos_datetime(mtime):
+    t = time.localtime(mtime)
+    if t.tm_year < 1980:
+        return 0, (1 << 5) | 1
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+class _Entry:
+    __slots__ = ('arcname', 'path', 'size', 'dos_time', 'dos_date', 'offset')
+
+    def __init__(self, arcname, path, size, mtime):
+        self.arcname = arcname.encode('utf-8')
+        self.path = path
+        self.size = size
+        self.dos_time, self.dos_date = _dos_datetime(mtime)
+        self.offset = 0
+
+
+class ZipStream:
+    """
+    A ZIP archive of existing files that is generated on the fly.
+
+    The byte layout is computed up front from the file sizes, so the total
+    size is known before anything is read and any byte range of the archive
+    can be produced without generating what comes before it. Only the CRC-32
+    of each file has to be computed, which happens while its data is
+    streamed (or by reading the file when a range skips over it). Memory use
+    is a few hundred bytes per entry, whatever the size of the files.
+    """
+
+    def __init__(self, files, force_zip64=False):
+        """`files` is an iterable of (name in archive, path on disk) pairs."""
+        self._entries = []
+        self._crcs = {}
+        for arcname, path in files:
+            stat = os.stat(path)
+            self._entries.append(_Entry(arcname, path, stat.st_size, stat.st_mtime))
+
+        self.zip64 = force_zip64 or len(self._entries) >= ZIP64_COUNT_LIMIT
+        if not self.zip64 and self._layout() >= ZIP64_LIMIT:
+            self.zip64 = True
+        self.size = self._layout()
+
+    def _local_header_size(self, entry):
+        return 30 + len(entry.arcname) + (20 if self.zip64 else 0)
+
+    def _descriptor_size(self):
+        return 24 if self.zip64 else 16
+
+    def _central_header_size(self, entry):
+        return 46 + len(entry.arcname) + (28 if self.zip64 else 0)
+
+    def _layout(self):
+        """Assigns entry offsets and returns the total archive size."""
+        offset = 0
+        for entry in self._entries:
+            entry.offset = offset
+            offset += self._local_header_size(entry) + entry.size + self._descriptor_size()
+        self._central_directory_offset = offset
+        self._central_directory_size = sum(self._central_header_size(entry) for entry in self._entries)
+        end_size = 22 + (56 + 20 if self.zip64 else 0)
+        return offset + self._central_directory_size + end_size
+
+    @property
+    def etag(self):
+        """Identifies this exact archive content, for caching and If-Range."""
+        digest = hashlib.sha1()
+        for entry in self._entries:
+            digest.update(entry.arcname + struct.pack('<QHH', entry.size, entry.dos_time, entry.dos_date))
+        return digest.hexdigest()
+
+    def _crc(self, index):
+        crc = self._crcs.get(index)
+        if crc is None:
+            crc = 0
+            with open(self._entries[index].path, 'rb') as f:
+                for block in iter(lambda: f.read(READ_SIZE), b''):
+                    crc = zlib.crc32(block, crc)
+            self._crcs[index] = crc
+        return crc
+
+    def _local_header(self, entry):
+        version = 45 if self.zip64 else 20
+        size_field = ZIP64_LIMIT if self.zip64 else 0
+        header = struct.pack('<IHHHHHIIIHH', 0x04034b50, version, FLAGS, 0, entry.dos_time, entry.dos_date,
+                             0, size_field, size_field, len(entry.arcname), 20 if self.zip64 else 0)
+        header += entry.arcname
+        if self.zip64:
+            header += struct.pack('<HHQQ', 0x0001, 16, 0, 0)
+        return header
+
+    def _descriptor(self, index):
+        entry = self._entries[index]
+        if self.zip64:
+            return struct.pack('<IIQQ', 0x08074b50, self._crc(index), entry.size, entry.size)
+        return struct.pack('<IIII', 0x08074b50, self._crc(index), entry.size, entry.size)
+
+    def _central_header(self, index):
+        entry = self._entries[index]
+        version = 45 if self.zip64 else 20
+        if self.zip64:
+            size = offset = ZIP64_LIMIT
+        else:
+            size, offset = entry.size, entry.offset
+        header = struct.pack('<IHHHHHHIIIHHHHHII', 0x02014b50, version, version, FLAGS, 0,
+                             entry.dos_time, entry.dos_date, self._crc(index), size, size,
+                             len(entry.arcname), 28 if self.zip64 else 0, 0, 0, 0, 0o100644 << 16, offset)
+        header += entry.arcname
+        if self.zip64:
+            header += struct.pack('<HHQQQ', 0x0001, 24, entry.size, entry.size, entry.offset)
+        return header
+
+    def _end_records(self):
+        count = len(self._entries)
+        records = b''
+        if self.zip64:
+            zip64_end_offset = self._central_directory_offset + self._central_directory_size
+            records += struct.pack('<IQHHIIQQQQ', 0x06064b50, 44, 45, 45, 0, 0, count, count,
+                                   self._central_directory_size, self._central_directory_offset)
+            records += struct.pack('<IIQI', 0x07064b50, 0, zip64_end_offset, 1)
+            return records + struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, 0xFFFF, 0xFFFF,
+                                         ZIP64_LIMIT, ZIP64_LIMIT, 0)
+        return struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, count, count,
+                           self._central_directory_size, self._central_directory_offset, 0)
+
+    def _file_data(self, index, start, stop):
+        """Yields bytes [start, stop) of an entry's file, computing its CRC if all of it is read."""
+        entry = self._entries[index]
+        compute_crc = start == 0 and stop == entry.size and index not in self._crcs
+        crc = 0
+        with open(entry.path, 'rb') as f:
+            f.seek(start)
+            remaining = stop - start
+            while remaining > 0:
+                block = f.read(min(READ_SIZE, remaining))
+                if not block:
+                    raise IOError(f"{entry.path} changed while it was being archived")
+                if compute_crc:
+                    crc = zlib.crc32(block, crc)
+                remaining -= len(block)
+                yield block
+        if compute_crc:
+            self._crcs[index] = crc
+
+    def _segments(self):
+        """Yields (length, producer) for each consecutive part of the archive; producer(start, stop) yields bytes."""
+        def from_bytes(make_bytes):
+            return lambda start, stop: iter((make_bytes()[start:stop],))
+
+        for index, entry in enumerate(self._entries):
+            yield self._local_header_size(entry), from_bytes(lambda entry=entry: self._local_header(entry))
+            yield entry.size, lambda start, stop, index=index: self._file_data(index, start, stop)
+            yield self._descriptor_size(), from_bytes(lambda index=index: self._descriptor(index))
+        for index, entry in enumerate(self._entries):
+            yield self._central_header_size(entry), from_bytes(lambda index=index: self._central_header(index))
+        yield self.size - self._central_directory_offset - self._central_directory_size, from_bytes(self._end_records)
+
+    def iter_bytes(self, start=0, stop=None):
+        """Yields the bytes of the archive in [start, stop) as a sequence of chunks."""
+        stop = self.size if stop is None else stop
+        offset = 0
+        for length, producer in self._segments():
+            segment_end = offset + length
+            if segment_end > start and offset < stop and length:
+                yield from producer(max(start, offset) - offset, min(stop, segment_end) - offset)
+            offset = segment_end
+            if offset >= stop:
+                return
@@ -3,6 +3,10 @@ import os
 import csv
 import shutil
 import re
+import zipfile
+import time
+import threading
+from unittest import mock
 from io import BytesIO
 import PyPDF2
 
@@ -11,6 +15,9 @@ import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from certificate_generator.app import app, create_certificate, generate_certificate_id
+from certificate_generator.storage import CertificateStorage
+from certificate_generator.registry import CertificateRegistry
+from certificate_generator.jobs import JobStore, new_job_id, run_job
 
 # Helper CSV Data
 VALID_CSV_DATA_CONTENT = (
@@ -46,6 +53,7 @@ class TestCertificateGenerator(unittest.TestCase):
         self.test_dir = os.path.dirname(__file__)
         self.original_upload_folder = app.config['UPLOAD_FOLDER']
         self.original_generated_pdfs_folder = app.config['GENERATED_PDFS_FOLDER']
+        self.original_database = app.config['DATABASE']
 
         self.test_uploads_folder = os.path.join(self.test_dir, 'test_uploads')
         self.test_generated_pdfs_folder = os.path.join(self.test_dir, 'test_generated_pdfs')
@@ -53,6 +61,8 @@ class TestCertificateGenerator(unittest.TestCase):
         # Override app config
         app.config['UPLOAD_FOLDER'] = self.test_uploads_folder
         app.config['GENERATED_PDFS_FOLDER'] = self.test_generated_pdfs_folder
+        app.config['DATABASE'] = os.path.join(self.test_uploads_folder, 'test.sqlite3')
+        app.config['JOBS_RUN_INLINE'] = True # Run jobs inside the upload request
         
         # Create test directories
         os.makedirs(self.test_uploads_folder, exist_ok=True)
@@ -68,8 +78,14 @@ class TestCertificateGenerator(unittest.TestCase):
         # Restore original config
         app.config['UPLOAD_FOLDER'] = self.original_upload_folder
         app.config['GENERATED_PDFS_FOLDER'] = self.original_generated_pdfs_folder
+        app.config['DATABASE'] = self.original_database
+        app.config['JOBS_RUN_INLINE'] = False
 
 
+    def generated_files(self):
+        """Paths of the generated PDFs relative to their folder, sorted by file name."""
+        return sorted(CertificateStorage(self.test_generated_pdfs_folder).files(), key=os.path.basename)
+
     def test_index_page(self):
         response = self.client.get('/')
         self.assertEqual(response.status_code, 200)
@@ -103,7 +119,7 @@ class TestCertificateGenerator(unittest.TestCase):
         self.assertIn(b"Successfully generated all certificates!", response.data) 
         self.assertIn(b"Processed 3 rows.", response.data)
 
-        generated_files = os.listdir(self.test_generated_pdfs_folder)
+        generated_files = self.generated_files()
         self.assertEqual(len(generated_files), 3)
 
         # Check if filenames match the expected pattern
@@ -115,9 +131,458 @@ class TestCertificateGenerator(unittest.TestCase):
         bob_pattern = re.compile(r"BJ-Advanced-200223-\d{6}\.pdf")
         carol_pattern = re.compile(r"CW-IntrotoM-100323-\d{6}\.pdf")
 
-        self.assertTrue(any(alice_pattern.match(f) for f in generated_files))
-        self.assertTrue(any(bob_pattern.match(f) for f in generated_files))
-        self.assertTrue(any(carol_pattern.match(f) for f in generated_files))
+        self.assertTrue(any(alice_pattern.match(os.path.basename(f)) for f in generated_files))
+        self.assertTrue(any(bob_pattern.match(os.path.basename(f)) for f in generated_files))
+        self.assertTrue(any(carol_pattern.match(os.path.basename(f)) for f in generated_files))
+
+    def test_upload_returns_job_id_for_json_clients(self):
+        data = {
+            'csv_file': (BytesIO(VALID_CSV_DATA_CONTENT.encode('utf-8')), 'valid_data.csv'),
+            'instructor_pair': 'DTK_AA'
+        }
+        response = self.client.post('/upload', data=data, content_type='multipart/form-data',
+                                    headers={'Accept': 'application/json'})
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()['job_id']
+
+        status = self.client.get(f'/jobs/{job_id}').get_json()
+        self.assertEqual(status['status'], 'finished')
+        self.assertEqual(status['total_rows'], 3)
+        self.assertEqual(status['rows_done'], 3)
+        self.assertEqual(status['generated'], 3)
+        self.assertEqual(status['failed'], 0)
+        self.assertEqual(status['results_url'], f'/jobs/{job_id}/results')
+
+        results = self.client.get(status['results_url'])
+        self.assertIn(b"Successfully generated all certificates!", results.data)
+
+    def test_invalid_rows_are_reported_as_job_results(self):
+        data = {
+            'csv_file': (BytesIO((CSV_WITH_EMPTY_ROW_CONTENT + "Eve Davis,Cybersecurity Basics,Intro to security,2023-05-01:2023-05-03\n").encode('utf-8')), 'invalid.csv'),
+            'instructor_pair': 'DTK_AA'
+        }
+        response = self.client.post('/upload', data=data, content_type='multipart/form-data',
+                                    headers={'Accept': 'application/json'})
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()['job_id']
+
+        status = self.client.get(f'/jobs/{job_id}').get_json()
+        self.assertEqual((status['total_rows'], status['generated'], status['failed']), (4, 2, 2))
+        self.assertEqual([result.error for result in JobStore(app.config['DATABASE']).get_results(job_id) if result.error], [
+            "Row 2 (Person: N/A) - Missing data",
+            "Row 4 (Person: Eve Davis) - Duplicate of row 1",
+        ])
+        self.assertEqual(len(self.generated_files()), 2)
+
+    def test_concurrent_uploads_with_the_same_filename(self):
+        app.config['JOBS_MAX_RUNNING_PER_PAIR'] = None
+        self.addCleanup(app.config.update, JOBS_MAX_RUNNING_PER_PAIR=2)
+        rosters = [[f"Person {upload} {row} Example" for row in range(3)] for upload in range(6)]
+        responses = [None] * len(rosters)
+
+        def upload(index):
+            content = "Person Name,Course Name,Course Description,Course Date\n" + "".join(
+                f"{name},Python Programming,Learn Python basics,2023-01-15\n" for name in rosters[index])
+            data = {'csv_file': (BytesIO(content.encode('utf-8')), 'roster.csv'), 'instructor_pair': 'DTK_AA'}
+            responses[index] = app.test_client().post('/upload', data=data, content_type='multipart/form-data',
+                                                      headers={'Accept': 'application/json'})
+
+        threads = [threading.Thread(target=upload, args=(index,)) for index in range(len(rosters))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        store = JobStore(app.config['DATABASE'])
+        registry = CertificateRegistry(app.config['DATABASE'])
+        for names, response in zip(rosters, responses):
+            self.assertEqual(response.status_code, 202)
+            job = store.get_job(response.get_json()['job_id'])
+            self.assertEqual((job['status'], job['rows_done'], job['failed']), ('finished', 3, 0))
+            filenames = [result.filename for result in store.get_results(job['id'])]
+            issued = [registry.get(os.path.splitext(os.path.basename(filename))[0]) for filename in filenames]
+            self.assertEqual([certificate['person_name'] for certificate in issued], names)
+            self.assertEqual([certificate['filename'] for certificate in issued], filenames)
+        self.assertEqual(len(self.generated_files()), 18)
+        self.assertFalse([name for name in self.generated_files() if not name.endswith('.pdf')])
+
+    def test_upload_turned_away_while_pair_is_busy(self):
+        app.config['JOBS_MAX_RUNNING_PER_PAIR'] = 1
+        self.addCleanup(app.config.update, JOBS_MAX_RUNNING_PER_PAIR=2)
+        store = JobStore(app.config['DATABASE'])
+        job_id = new_job_id()
+        store.create_job(job_id, 'DTK_AA', None, self.test_generated_pdfs_folder, 0)
+        store.claim_job(job_id)
+
+        def upload(instructor_pair, headers=None):
+            data = {'csv_file': (BytesIO(VALID_CSV_DATA_CONTENT.encode('utf-8')), 'valid_data.csv'), 'instructor_pair': instructor_pair}
+            return self.client.post('/upload', data=data, content_type='multipart/form-data', headers=headers)
+
+        response = upload('DTK_AA', {'Accept': 'application/json'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '30')
+        self.assertIn('try again', response.get_json()['error'])
+        response = upload('DTK_AA')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn(b'Too many certificate batches', response.data)
+        self.assertEqual(self.generated_files(), [])
+
+        self.assertEqual(upload('DTK_RBB', {'Accept': 'application/json'}).status_code, 202)
+        store.finish_job(job_id)
+        self.assertEqual(upload('DTK_AA', {'Accept': 'application/json'}).status_code, 202)
+
+    def test_concurrent_uploads_respect_running_limit(self):
+        app.config['JOBS_MAX_RUNNING_PER_PAIR'] = 1
+        self.addCleanup(app.config.update, JOBS_MAX_RUNNING_PER_PAIR=2)
+        store = JobStore(app.config['DATABASE'])
+        uploads = 6
+        barrier = threading.Barrier(uploads)
+        running = []
+        responses = [None] * uploads
+
+        def run_job_slowly(*args, **kwargs):
+            running.append(store.active_jobs('DTK_AA')[1])
+            time.sleep(0.2) # Keep the job running while the other uploads come in
+            return run_job(*args, **kwargs)
+
+        def upload(index):
+            content = VALID_CSV_DATA_CONTENT.replace('Alice Smith', f'Alice Smith {index}')
+            data = {'csv_file': (BytesIO(content.encode('utf-8')), 'roster.csv'), 'instructor_pair': 'DTK_AA'}
+            barrier.wait()
+            responses[index] = app.test_client().post('/upload', data=data, content_type='multipart/form-data',
+                                                      headers={'Accept': 'application/json'})
+
+        with mock.patch('certificate_generator.app.run_job', run_job_slowly):
+            threads = [threading.Thread(target=upload, args=(index,)) for index in range(uploads)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        statuses = sorted(response.status_code for response in responses)
+        self.assertEqual(set(statuses), {202, 429})
+        self.assertEqual(statuses.count(202), len(running))
+        self.assertEqual(set(running), {1})
+        self.assertEqual(store.active_jobs('DTK_AA'), (0, 0))
+        self.assertEqual(len(self.generated_files()), 3 * len(running))
+
+    def test_verify_issued_certificate(self):
+        data = {
+            'csv_file': (BytesIO(VALID_CSV_DATA_CONTENT.encode('utf-8')), 'valid_data.csv'),
+            'instructor_pair': 'DTK_AA'
+        }
+        self.client.post('/upload', data=data, content_type='multipart/form-data')
+        certificate_id = os.path.splitext(os.path.basename(self.generated_files()[0]))[0]
+
+        response = self.client.get(f'/verify/{certificate_id}')
+        self.assertEqual(response.status_code, 200)
+        certificate = response.get_json()
+        self.assertTrue(certificate['valid'])
+        self.assertEqual(certificate['person_name'], 'Alice Smith')
+        self.assertEqual(certificate['instructor_pair'], 'DTK_AA')
+
+        response = self.client.get('/verify/XX-Unknown-010101-000000')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.get_json()['valid'])
+
+    def test_render_streams_certificate_without_files(self):
+        response = self.client.post('/render', data={
+            'person_name': 'Jane Doe',
+            'course_name': 'Advanced Python',
+            'course_description': 'Deep dive into Python.',
+            'course_date': '2023-11-15:2023-11-17',
+            'instructor_pair': 'DTK_RBB',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/pdf')
+        self.assertEqual(self.generated_files(), [])
+
+        text = PyPDF2.PdfReader(BytesIO(response.data)).pages[0].extract_text()
+        self.assertIn("Jane Doe", text)
+        certificate_id = re.search(r"Certificate ID: (\S+)", text).group(1)
+        self.assertTrue(certificate_id.startswith("JD-Advanced-151123-"))
+        self.assertIn(f'filename="{certificate_id}.pdf"', response.headers['Content-Disposition'])
+        self.assertTrue(self.client.get(f'/verify/{certificate_id}').get_json()['valid'])
+
+        # Registered certificates can be rendered again by ID
+        response = self.client.post('/render', json={'certificate_id': certificate_id, 'download': True})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['Content-Disposition'].startswith('attachment'))
+        self.assertIn(f"Certificate ID: {certificate_id}", PyPDF2.PdfReader(BytesIO(response.data)).pages[0].extract_text())
+
+    def test_render_non_latin1_certificate_id(self):
+        row = {'Person Name': 'Łukasz Nowak', 'Course Name': 'Data Analytics',
+               'Course Description': 'Pandas', 'Course Date': '2024-01-01'}
+        certificate_id = CertificateRegistry(app.config['DATABASE']).issue_ids([(1, row)], 'DTK_AA')[1]
+        self.assertTrue(certificate_id.startswith('ŁN-'))
+
+        with mock.patch('certificate_generator.app.render_registered_certificate', return_value=b'%PDF-1.4'):
+            response = self.client.get('/render', query_string={'certificate_id': certificate_id})
+        self.assertEqual(response.status_code, 200)
+        disposition = response.headers['Content-Disposition']
+        disposition.encode('latin-1') # WSGI servers can only send Latin-1 header values
+        self.assertEqual(disposition, f"inline; filename=\"{certificate_id[1:]}.pdf\"; "
+                                      f"filename*=UTF-8''%C5%81{certificate_id[1:]}.pdf")
+
+    def test_render_invalid_parameters(self):
+        fields = {
+            'person_name': 'Jane Doe',
+            'course_name': 'Advanced Python',
+            'course_description': 'Deep dive into Python.',
+            'course_date': '2023-11-15:2023-11-17',
+            'instructor_pair': 'DTK_RBB',
+        }
+        response = self.client.post('/render', data={'person_name': 'Jane Doe'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('course_name', response.get_json()['error'])
+
+        # Issuing a certificate takes a POST
+        response = self.client.get('/render', query_string=fields)
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post('/render', json=dict(fields, person_name=123))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('person_name', response.get_json()['error'])
+        self.assertEqual(self.client.post('/render', json=['Jane Doe']).status_code, 400)
+
+        response = self.client.post('/render', json=dict(fields, instructor_pair='XX_YY'))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('XX_YY', response.get_json()['error'])
+
+        response = self.client.post('/render', json=dict(fields, course_date='2023-11-17:2023-11-15'))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Invalid course date", response.get_json()['error'])
+        self.assertEqual(self.generated_files(), [])
+
+        response = self.client.get('/render', query_string={'certificate_id': 'XX-Unknown-010101-000000'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_deleted_certificate_is_served_by_rendering_again(self):
+        data = {
+            'csv_file': (BytesIO(VALID_CSV_DATA_CONTENT.encode('utf-8')), 'valid_data.csv'),
+            'instructor_pair': 'DTK_AA'
+        }
+        self.client.post('/upload', data=data, content_type='multipart/form-data')
+        filename = self.generated_files()[0]
+        os.remove(os.path.join(self.test_generated_pdfs_folder, filename))
+
+        response = self.client.get(f'/generated_pdfs/{filename}')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Alice Smith", PyPDF2.PdfReader(BytesIO(response.data)).pages[0].extract_text())
+        self.assertFalse(os.path.exists(os.path.join(self.test_generated_pdfs_folder, filename)))
+        self.assertEqual(self.client.get('/generated_pdfs/XX-Unknown-010101-000000.pdf').status_code, 404)
+
+    def test_storage_migrate_command(self):
+        data = {
+            'csv_file': (BytesIO(VALID_CSV_DATA_CONTENT.encode('utf-8')), 'valid_data.csv'),
+            'instructor_pair': 'DTK_AA'
+        }
+        response = self.client.post('/upload', data=data, content_type='multipart/form-data',
+                                    headers={'Accept': 'application/json'})
+        job_id = response.get_json()['job_id']
+        # Put the PDFs and their references back as they were before sharding
+        database = app.config['DATABASE']
+        renames = [(filename, os.path.basename(filename)) for filename in self.generated_files()]
+        for sharded, flat in renames:
+            os.replace(os.path.join(self.test_generated_pdfs_folder, sharded), os.path.join(self.test_generated_pdfs_folder, flat))
+        CertificateRegistry(database).rename_files(renames)
+        JobStore(database).rename_files(renames)
+        flat = sorted(flat for _, flat in renames)
+
+        result = app.test_cli_runner().invoke(args=['storage', 'migrate'])
+        self.assertIn('Moved 3 files', result.output)
+        self.assertEqual(sorted(map(os.path.basename, self.generated_files())), flat)
+        self.assertNotIn(flat[0], self.generated_files())
+        for result in JobStore(database).get_results(job_id):
+            self.assertIn(result.filename, self.generated_files())
+
+        # Links from before the migration are redirected
+        response = self.client.get(f'/generated_pdfs/{flat[0]}')
+        self.assertEqual(response.status_code, 301)
+        self.assertTrue(response.headers['Location'].endswith(f'/generated_pdfs/{self.generated_files()[0]}'))
+
+    def test_serve_pdf_conditional_requests(self):
+        data = {
+            'csv_file': (BytesIO(VALID_CSV_DATA_CONTENT.encode('utf-8')), 'valid_data.csv'),
+            'instructor_pair': 'DTK_AA'
+        }
+        self.client.post('/upload', data=data, content_type='multipart/form-data')
+        filename = self.generated_files()[0]
+        with open(os.path.join(self.test_generated_pdfs_folder, filename), 'rb') as f:
+            pdf_bytes = f.read()
+
+        response = self.client.get(f'/generated_pdfs/{filename}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, pdf_bytes)
+        etag, is_weak = response.get_etag()
+        self.assertFalse(is_weak)
+        self.assertIsNotNone(response.last_modified)
+
+        response = self.client.get(f'/generated_pdfs/{filename}', headers={'If-None-Match': f'"{etag}"'})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+        # Cached PDFs are served in byte ranges
+        response = self.client.get(f'/generated_pdfs/{filename}', headers={'Range': 'bytes=100-199'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.headers['Accept-Ranges'], 'bytes')
+        self.assertEqual(response.headers['Content-Range'], f'bytes 100-199/{len(pdf_bytes)}')
+        self.assertEqual(response.data, pdf_bytes[100:200])
+        self.assertEqual(self.client.get('/generated_pdfs/missing.pdf').status_code, 404)
+        self.assertEqual(self.client.get('/generated_pdfs/../app.py').status_code, 404)
+
+    def test_metrics_endpoint(self):
+        data = {
+            'csv_file': (BytesIO(CSV_WITH_EMPTY_ROW_CONTENT.encode('utf-8')), 'metrics.csv'),
+            'instructor_pair': 'DTK_AA'
+        }
+        self.client.post('/upload', data=data, content_type='multipart/form-data')
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        text = response.get_data(as_text=True)
+        for stage in ('save_upload', 'csv_parse', 'generate_id', 'image_embed', 'pdf_output'):
+            self.assertIn(f'certificate_generator_stage_seconds_count{{stage="{stage}"}}', text)
+        self.assertRegex(text, r'certificate_generator_rows_failed_total [1-9]')
+        self.assertRegex(text, r'certificate_generator_bytes_written_total [1-9]')
+
+    def test_upload_streamed_without_saving(self):
+        app.config['SAVE_UPLOADS'] = False
+        try:
+            data = {
+                'csv_file': (BytesIO(CSV_WITH_EMPTY_ROW_CONTENT.encode('utf-8')), 'streamed.csv'),
+                'instructor_pair': 'DTK_RBB'
+            }
+            response = self.client.post('/upload', data=data, content_type='multipart/form-data', follow_redirects=True)
+        finally:
+            app.config['SAVE_UPLOADS'] = True
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Successfully generated 2 PDF(s), but failed for 1 entries. See details below.', response.data)
+        self.assertIn(b"Processed 3 rows.", response.data)
+        self.assertEqual(len(self.generated_files()), 2)
+        self.assertFalse(any(name.endswith('.csv') for name in os.listdir(self.test_uploads_folder)))
+
+    def test_download_batch_zip(self):
+        data = {
+            'csv_file': (BytesIO(VALID_CSV_DATA_CONTENT.encode('utf-8')), 'valid_data.csv'),
+            'instructor_pair': 'DTK_RBB'
+        }
+        response = self.client.post('/upload', data=data, content_type='multipart/form-data',
+                                    headers={'Accept': 'application/json'})
+        job_id = response.get_json()['job_id']
+        zip_url = f'/batches/{job_id}/download.zip'
+        self.assertIn(zip_url.encode(), self.client.get(f'/jobs/{job_id}/results').data)
+
+        response = self.client.get(zip_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Accept-Ranges'], 'bytes')
+        with zipfile.ZipFile(BytesIO(response.data)) as archive:
+            self.assertEqual(sorted(archive.namelist()), sorted(map(os.path.basename, self.generated_files())))
+            self.assertIsNone(archive.testzip())
+
+        # Resume from the middle of the archive
+        full = response.data
+        etag = response.headers['ETag']
+        response = self.client.get(zip_url, headers={'Range': 'bytes=1000-', 'If-Range': etag})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.headers['Content-Range'], f'bytes 1000-{len(full) - 1}/{len(full)}')
+        self.assertEqual(response.data, full[1000:])
+
+        # A stale If-Range gets the whole archive
+        response = self.client.get(zip_url, headers={'Range': 'bytes=1000-', 'If-Range': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), len(full))
+
+        response = self.client.get(zip_url, headers={'Range': f'bytes={len(full) + 10}-'})
+        self.assertEqual(response.status_code, 416)
+
+        # Several ranges, or other units, get the whole archive too
+        for header in ('bytes=0-99,1000-1099', 'items=0-1'):
+            response = self.client.get(zip_url, headers={'Range': header})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data, full)
+
+        store = JobStore(app.config['DATABASE'])
+        store.finish_job(job_id, 'failed', 'Disk full')
+        response = self.client.get(zip_url)
+        self.assertEqual(response.status_code, 409)
+        self.assertIn(b'The batch failed', response.data)
+
+        self.assertEqual(self.client.get('/batches/doesnotexist/download.zip').status_code, 404)
+
+    def test_unknown_job(self):
+        self.assertEqual(self.client.get('/jobs/doesnotexist').status_code, 404)
+        self.assertEqual(self.client.get('/jobs/doesnotexist/results').status_code, 404)
+
+    def test_upload_combined_output(self):
+        data = {
+            'csv_file': (BytesIO(CSV_WITH_EMPTY_ROW_CONTENT.encode('utf-8')), 'print_run.csv'),
+            'instructor_pair': 'DTK_RBB',
+            'output_mode': 'combined'
+        }
+        response = self.client.post('/upload', data=data, content_type='multipart/form-data', follow_redirects=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"Successfully generated 1 PDF(s), but failed for 1 entries. See details below.", response.data)
+        self.assertIn(b"Row 2 (Person: N/A) - Missing data", response.data)
+
+        generated_files = self.generated_files()
+        self.assertEqual(len(generated_files), 1)
+        self.assertTrue(os.path.basename(generated_files[0]).startswith('certificates-'))
+
+        with open(os.path.join(self.test_generated_pdfs_folder, generated_files[0]), "rb") as f:
+            reader = PyPDF2.PdfReader(f)
+            self.assertEqual(len(reader.pages), 2)
+            self.assertIn("Eve Davis", reader.pages[0].extract_text())
+            self.assertIn("Frank Green", reader.pages[1].extract_text())
+            # Both pages draw the same image object
+            images = [page['/Resources']['/XObject'].get_object() for page in reader.pages]
+            self.assertEqual(images[0], images[1])
+
+    def test_incremental_reupload_keeps_unchanged_certificates(self):
+        def upload(content):
+            data = {
+                'csv_file': (BytesIO(content.encode('utf-8')), 'roster.csv'),
+                'instructor_pair': 'DTK_RBB',
+                'incremental': '1'
+            }
+            response = self.client.post('/upload', data=data, content_type='multipart/form-data',
+                                        headers={'Accept': 'application/json'})
+            return self.client.get(f"/jobs/{response.get_json()['job_id']}").get_json()
+
+        self.assertEqual(upload(VALID_CSV_DATA_CONTENT)['generated'], 3)
+        first_files = set(self.generated_files())
+
+        corrected = VALID_CSV_DATA_CONTENT.replace("Bob Johnson", "Robert Johnson")
+        self.assertEqual(upload(corrected)['generated'], 3)
+        second_files = set(self.generated_files())
+
+        # Only the corrected row produced a new certificate
+        new_files = second_files - first_files
+        self.assertEqual(len(new_files), 1)
+        self.assertTrue(os.path.basename(new_files.pop()).startswith('RJ-Advanced-200223-'))
+
+    def test_upload_invalid_output_mode(self):
+        data = {
+            'csv_file': (BytesIO(VALID_CSV_DATA_CONTENT.encode('utf-8')), 'valid_data.csv'),
+            'instructor_pair': 'DTK_RBB',
+            'output_mode': 'poster'
+        }
+        response = self.client.post('/upload', data=data, content_type='multipart/form-data', follow_redirects=True)
+        self.assertIn(b"Invalid output mode.", response.data)
+        self.assertEqual(len(self.generated_files()), 0)
+
+    def test_incremental_upload_rejected_for_combined_output(self):
+        data = {
+            'csv_file': (BytesIO(VALID_CSV_DATA_CONTENT.encode('utf-8')), 'valid_data.csv'),
+            'instructor_pair': 'DTK_RBB',
+            'output_mode': 'combined',
+            'incremental': '1'
+        }
+        response = self.client.post('/upload', data=data, content_type='multipart/form-data', follow_redirects=True)
+        self.assertIn(b"only works with one PDF per certificate", response.data)
+        self.assertEqual(len(self.generated_files()), 0)
 
     def test_upload_csv_missing_headers(self):
         data = {
@@ -129,7 +594,7 @@ class TestCertificateGenerator(unittest.TestCase):
         self.assertEqual(response.status_code, 200) 
         self.assertIn(b"CSV file is missing required columns: Course Name", response.data)
         
-        generated_files = os.listdir(self.test_generated_pdfs_folder)
+        generated_files = self.generated_files()
         self.assertEqual(len(generated_files), 0)
 
     def test_upload_empty_csv_file(self):
@@ -140,7 +605,7 @@ class TestCertificateGenerator(unittest.TestCase):
         response = self.client.post('/upload', data=data, content_type='multipart/form-data', follow_redirects=True)
         self.assertEqual(response.status_code, 200)
         self.assertIn(b"CSV file is empty or could not be parsed.", response.data)
-        generated_files = os.listdir(self.test_generated_pdfs_folder)
+        generated_files = self.generated_files()
         self.assertEqual(len(generated_files), 0)
 
     def test_upload_csv_with_empty_row(self):
@@ -153,14 +618,14 @@ class TestCertificateGenerator(unittest.TestCase):
         self.assertIn(b'Successfully generated 2 PDF(s), but failed for 1 entries. See details below.', response.data)
         self.assertIn(b"Row 2 (Person: N/A) - Missing data", response.data)
         
-        generated_files = os.listdir(self.test_generated_pdfs_folder)
+        generated_files = self.generated_files()
         self.assertEqual(len(generated_files), 2)
 
         eve_pattern = re.compile(r"ED-Cybersec-010523-\d{6}\.pdf")
         frank_pattern = re.compile(r"FG-CloudCom-100623-\d{6}\.pdf")
 
-        self.assertTrue(any(eve_pattern.match(f) for f in generated_files))
-        self.assertTrue(any(frank_pattern.match(f) for f in generated_files))
+        self.assertTrue(any(eve_pattern.match(os.path.basename(f)) for f in generated_files))
+        self.assertTrue(any(frank_pattern.match(os.path.basename(f)) for f in generated_files))
 
     def test_generate_certificate_id_with_date_range_and_sanitization(self):
         """Test the new certificate ID generation logic."""
@@ -0,0 +1,89 @@
+import unittest
+import os
+import shutil
+import tempfile
+
+# Add project root to sys.path to allow importing certificate_generator modules
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from certificate_generator.batch import iter_batch, iter_combined, render_batch
+from certificate_generator.storage import CertificateStorage
+
+
+def make_rows(count):
+    return [
+        {
+            'Person Name': f"Person {i} Example",
+            'Course Name': f"Course {i}",
+            'Course Description': "Line one\nLine two",
+            'Course Date': "2024-03-15:2024-03-17",
+        }
+        for i in range(count)
+    ]
+
+
+class TestBatchRenderer(unittest.TestCase):
+    def setUp(self):
+        self.output_folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_folder)
+
+    def test_results_in_row_order_with_process_pool(self):
+        rows = make_rows(7)
+        rows[3]['Course Date'] = ''
+
+        results = render_batch(rows, 'DTK_RBB', self.output_folder, workers=2, chunk_size=2)
+
+        self.assertEqual([result.row_number for result in results], list(range(1, 8)))
+        self.assertEqual(results[3].error, "Row 4 (Person: Person 3 Example) - Missing data")
+        for i, result in enumerate(results):
+            if i == 3:
+                continue
+            self.assertIsNone(result.error)
+            self.assertTrue(os.path.basename(result.filename).startswith(f"P{i}E-Course{i}-150324-"))
+
+        self.assertEqual(sorted(CertificateStorage(self.output_folder).files()), sorted(r.filename for r in results if r.filename))
+
+    def test_single_chunk_renders_in_process(self):
+        results = render_batch(make_rows(2), 'DTK_AA', self.output_folder, workers=4, chunk_size=16)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(len(CertificateStorage(self.output_folder).files()), 2)
+
+    def test_missing_column(self):
+        rows = [{'Person Name': 'Alice Smith', 'Course Name': 'Python', 'Course Description': 'Basics'}]
+        results = render_batch(rows, 'DTK_AA', self.output_folder, workers=1)
+        self.assertEqual(results[0].error, "Row 1 (Person: Alice Smith) - Missing column 'Course Date'")
+
+    def test_consumes_lazy_iterator(self):
+        rows = iter(make_rows(5))
+        results = list(iter_batch(rows, 'DTK_AA', self.output_folder, workers=2, chunk_size=1))
+        self.assertEqual([result.row_number for result in results], [1, 2, 3, 4, 5])
+
+    def test_combined_output(self):
+        rows = make_rows(4)
+        rows[1]['Person Name'] = ''
+
+        results = list(iter_combined(rows, 'DTK_RBB', self.output_folder, 'book.pdf'))
+
+        self.assertEqual([result.filename for result in results], ['book.pdf', None, 'book.pdf', 'book.pdf'])
+        self.assertEqual(results[1].error, "Row 2 (Person: N/A) - Missing data")
+        self.assertEqual(os.listdir(self.output_folder), ['book.pdf'])
+        # The background is embedded once, so three pages cost little more than one
+        single = render_batch(make_rows(1), 'DTK_RBB', self.output_folder, workers=1)[0].filename
+        self.assertTrue(os.path.getsize(os.path.join(self.output_folder, 'book.pdf'))
+                        < 1.2 * os.path.getsize(os.path.join(self.output_folder, single)))
+
+    def test_combined_output_without_certificates(self):
+        rows = [{'Person Name': '', 'Course Name': '', 'Course Description': '', 'Course Date': ''}]
+        results = list(iter_combined(rows, 'DTK_RBB', self.output_folder, 'book.pdf'))
+        self.assertIsNotNone(results[0].error)
+        self.assertEqual(os.listdir(self.output_folder), [])
+
+    def test_empty_batch(self):
+        self.assertEqual(render_batch([], 'DTK_AA', self.output_folder), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+import os
+import json
+import subprocess
+
+# Add the benchmarks directory to sys.path to allow importing the benchmark script
+import sys
+BENCHMARKS_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+sys.path.insert(0, BENCHMARKS_PATH)
+
+from bench import synthetic_rows, percentile, compare
+
+
+def results(**metrics):
+    result = {'stage': 'upload', 'rows': 100, 'throughput_per_s': 80.0, 'p50_ms': 12.0, 'p99_ms': 15.0,
+              'peak_rss_kb': 60000, 'bytes_written': 34000000}
+    result.update(metrics)
+    return {'results': [result]}
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_synthetic_rows_follow_sample_shape(self):
+        rows = synthetic_rows(25)
+        self.assertEqual(len(rows), 25)
+        self.assertIn('\n', rows[0]['Course Name'])
+        self.assertIn('\n', rows[0]['Course Description'])
+        self.assertGreater(len({row['Person Name'] for row in rows}), 10)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.50), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([7], 0.99), 7)
+
+    def test_compare_flags_regressions_beyond_threshold(self):
+        baseline = results()
+        self.assertEqual(compare(baseline, results(throughput_per_s=75.0, p99_ms=16.0)), [])
+
+        regressions = compare(baseline, results(throughput_per_s=60.0, peak_rss_kb=90000))
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(regressions[0].startswith('upload (100 rows): throughput_per_s 80.0 -> 60.0'))
+        self.assertIn('peak_rss_kb', regressions[1])
+
+    def test_parallel_uploads_load_test(self):
+        # Raises (and exits non-zero) if any upload's certificates are missing, incomplete or mixed up
+        result = subprocess.run([sys.executable, os.path.join(BENCHMARKS_PATH, 'bench.py'), '_measure', 'parallel_upload', '24', '--workers', '1'],
+                                capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        measurement = json.loads(result.stdout.strip().splitlines()[-1])
+        self.assertEqual(measurement['rows'], 24)
+        self.assertGreater(measurement['throughput_per_s'], 0)
+        self.assertGreater(measurement['bytes_written'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+import os
+import csv
+import shutil
+import subprocess
+import tempfile
+from contextlib import redirect_stderr
+from io import StringIO
+
+# Add project root to sys.path to allow importing certificate_generator modules
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from certificate_generator.cli import main, read_manifest
+from certificate_generator.registry import CertificateRegistry
+from certificate_generator.storage import CertificateStorage
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+class TestBatchCommand(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.csv_path = os.path.join(self.test_dir, 'roster.csv')
+        self.output_dir = os.path.join(self.test_dir, 'pdfs')
+        self.database = os.path.join(self.test_dir, 'test.sqlite3')
+        self.manifest_path = os.path.join(self.test_dir, 'roster-manifest.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def write_csv(self, rows):
+        with open(self.csv_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['Person Name', 'Course Name', 'Course Description', 'Course Date'])
+            writer.writerows(rows)
+
+    def run_batch(self, *options):
+        stderr = StringIO()
+        with redirect_stderr(stderr):
+            status = main(['batch', self.csv_path, '--instructor-pair', 'DTK_AA', '--workers', '1',
+                           '--output-dir', self.output_dir, '--database', self.database, *options])
+        return status, stderr.getvalue()
+
+    def test_writes_certificates_and_manifest(self):
+        self.write_csv([
+            ['John Doe', 'Data Analytics', 'Line one', '2024-03-15'],
+            ['', '', '', ''],
+            ['Jane Roe', 'Data Analytics', 'Line one', '2024-03-15:2024-03-17'],
+        ])
+        status, output = self.run_batch()
+        self.assertEqual(status, 0)
+        self.assertIn("3/3 rows, 1 failed", output)
+
+        entries = read_manifest(self.manifest_path)
+        self.assertEqual([entry['Row'] for entry in entries], ['1', '2', '3'])
+        self.assertEqual(entries[0]['Person Name'], 'John Doe')
+        self.assertEqual(entries[1]['File'], '')
+        self.assertIn("Missing data", entries[1]['Error'])
+        self.assertEqual(sorted(CertificateStorage(self.output_dir).files()), sorted([entries[0]['File'], entries[2]['File']]))
+
+        registry = CertificateRegistry(self.database)
+        certificate = registry.get(entries[2]['Certificate ID'])
+        self.assertEqual(certificate['filename'], entries[2]['File'])
+
+    def test_resumes_after_last_complete_manifest_entry(self):
+        self.write_csv([[f"Person {i} Example", 'Data Analytics', 'Line one', '2024-03-15'] for i in range(4)])
+        self.run_batch()
+        entries = read_manifest(self.manifest_path)
+
+        # Simulate a run killed while writing the third entry
+        with open(self.manifest_path, encoding='utf-8') as f:
+            lines = f.readlines()
+        with open(self.manifest_path, 'w', encoding='utf-8') as f:
+            f.writelines(lines[:3])
+            f.write(lines[3][:10])
+
+        status, output = self.run_batch()
+        self.assertEqual(status, 0)
+        self.assertIn("Resuming after row 2", output)
+        resumed = read_manifest(self.manifest_path)
+        self.assertEqual([entry['Row'] for entry in resumed], ['1', '2', '3', '4'])
+        self.assertEqual(resumed[:2], entries[:2])
+        self.assertNotEqual(resumed[2]['Certificate ID'], entries[2]['Certificate ID'])
+
+        status, output = self.run_batch()
+        self.assertIn("All 4 rows are already in", output)
+        self.assertEqual(read_manifest(self.manifest_path), resumed)
+
+    def test_restart_ignores_manifest(self):
+        self.write_csv([['John Doe', 'Data Analytics', 'Line one', '2024-03-15']])
+        self.run_batch()
+        first = read_manifest(self.manifest_path)
+        self.run_batch('--restart')
+        second = read_manifest(self.manifest_path)
+        self.assertEqual(len(second), 1)
+        self.assertNotEqual(first[0]['Certificate ID'], second[0]['Certificate ID'])
+
+    def test_missing_headers_is_an_error(self):
+        with open(self.csv_path, 'w', encoding='utf-8') as f:
+            f.write("Name,Course\nJohn,Data\n")
+        status, output = self.run_batch()
+        self.assertEqual(status, 1)
+        self.assertIn("Error:", output)
+        self.assertFalse(os.path.exists(self.output_dir))
+
+    def test_unknown_instructor_pair_is_an_error(self):
+        status, output = self.run_batch('--instructor-pair', 'DTK_A')
+        self.assertEqual(status, 1)
+        self.assertIn("unknown instructor pair 'DTK_A'", output)
+        self.assertFalse(os.path.exists(self.output_dir))
+
+    def test_does_not_import_flask(self):
+        result = subprocess.run(
+            [sys.executable, '-c', "import sys, certificate_generator.cli; print('flask' in sys.modules)"],
+            cwd=PROJECT_ROOT, capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), 'False')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+import os
+import io
+import json
+import logging
+import PyPDF2
+from fpdf import FPDF
+
+# Add project root to sys.path to allow importing certificate_generator modules
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from certificate_generator.fonts import FontCache, configured_fonts
+from certificate_generator.layout import LayoutPlan
+from certificate_generator.template_cache import ROOT_PATH
+
+FONT_FOLDER = '/usr/share/fonts/truetype/dejavu'
+REGULAR = os.path.join(FONT_FOLDER, 'DejaVuSerif.ttf')
+BOLD = os.path.join(FONT_FOLDER, 'DejaVuSerif-Bold.ttf')
+
+VALUES = {
+    'person_name': 'Zoë Łukasiewicz',
+    'course_name': 'Data Analytics',
+    'course_description': 'First line.',
+    'bulleted_description': '* First line.',
+    'course_date': '2024-01-01',
+    'certificate_id': 'ZŁ-DataAnal-010124-123456',
+}
+
+
+class NoBackground:
+    def draw_background(self, pdf):
+        pass
+
+
+def unicode_config():
+    with open(os.path.join(ROOT_PATH, 'config.json')) as f:
+        config = json.load(f)
+    config['font_name'] = 'DejaVu'
+    config['fonts'] = {'DejaVu': {'': REGULAR, 'B': BOLD, 'I': REGULAR, 'BI': BOLD}}
+    return config
+
+
+class TestConfiguredFonts(unittest.TestCase):
+    def test_paths_and_styles(self):
+        fonts = configured_fonts({'fonts': {'DejaVu': {'': 'fonts/a.ttf', 'ib': '/abs/b.ttf'}}}, '/root')
+        self.assertEqual(fonts, {('dejavu', ''): '/root/fonts/a.ttf', ('dejavu', 'BI'): '/abs/b.ttf'})
+        self.assertEqual(configured_fonts({}, '/root'), {})
+
+    def test_unknown_style_is_rejected(self):
+        with self.assertRaises(ValueError):
+            configured_fonts({'fonts': {'DejaVu': {'U': 'a.ttf'}}}, '/root')
+
+    def test_unconfigured_font_is_rejected(self):
+        config = unicode_config()
+        del config['fonts']['DejaVu']['BI']
+        with self.assertRaises(ValueError):
+            LayoutPlan(config, configured_fonts(config, ROOT_PATH))
+
+
+@unittest.skipUnless(os.path.exists(REGULAR) and os.path.exists(BOLD), "DejaVu fonts are not installed")
+class TestFontCache(unittest.TestCase):
+    def setUp(self):
+        self.font_cache = FontCache()
+
+    def test_font_is_parsed_once(self):
+        for _ in range(3):
+            pdf = FPDF()
+            self.font_cache.add_to(pdf, 'DejaVu', '', REGULAR)
+            self.font_cache.add_to(pdf, 'DejaVu', 'I', REGULAR)
+            self.font_cache.add_to(pdf, 'DejaVu', 'B', BOLD)
+            self.assertEqual(sorted(pdf.fonts), ['dejavu', 'dejavuB', 'dejavuI'])
+            self.assertEqual([font.i for font in pdf.fonts.values()], [1, 2, 3])
+        self.assertEqual(self.font_cache.parses, 2)
+
+    def test_each_document_embeds_a_subset(self):
+        outputs = []
+        for text in ('Zoë', 'Łukasiewicz ÀÉÎÕÜ'):
+            pdf = FPDF()
+            self.font_cache.add_to(pdf, 'DejaVu', '', REGULAR)
+            pdf.add_page()
+            pdf.set_font('DejaVu', '', 14)
+            pdf.cell(0, 10, text)
+            outputs.append(bytes(pdf.output()))
+
+        for text, output in zip(('Zoë', 'Łukasiewicz ÀÉÎÕÜ'), outputs):
+            self.assertIn(text, PyPDF2.PdfReader(io.BytesIO(output)).pages[0].extract_text())
+            self.assertLess(len(output), os.path.getsize(REGULAR) // 10)
+        self.assertLess(len(outputs[0]), len(outputs[1]))
+
+    def test_subsetting_does_not_log_at_info(self):
+        pdf = FPDF()
+        self.font_cache.add_to(pdf, 'DejaVu', '', REGULAR)
+        pdf.add_page()
+        pdf.set_font('DejaVu', '', 14)
+        pdf.cell(0, 10, 'Zoë')
+        pdf.output()
+        # Even with the root logger at INFO, as the app sets it
+        self.assertFalse(logging.getLogger('fontTools.subset').isEnabledFor(logging.INFO))
+
+    def test_unicode_layout(self):
+        config = unicode_config()
+        plan = LayoutPlan(config, configured_fonts(config, ROOT_PATH))
+        self.assertEqual(plan.static_elements, [])
+
+        pdf = FPDF()
+        pdf.add_page()
+        plan.draw(pdf, NoBackground(), VALUES)
+        text = PyPDF2.PdfReader(io.BytesIO(bytes(pdf.output()))).pages[0].extract_text()
+        self.assertIn('Zoë Łukasiewicz', text)
+        self.assertIn('Certificate of Completion', text)
+        self.assertGreater(plan.line_count(plan.slots[0], 'Łódź ' * 40), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
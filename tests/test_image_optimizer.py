@@ -0,0 +1,55 @@
+import unittest
+import os
+import shutil
+import tempfile
+from PIL import Image
+
+# Add project root to sys.path to allow importing certificate_generator modules
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from certificate_generator.image_optimizer import optimize_image, target_size
+
+
+class TestImageOptimizer(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.test_dir, 'cache')
+        self.source_path = os.path.join(self.test_dir, 'background.jpg')
+        # A4 at 200 DPI
+        Image.new('RGB', (1654, 2339), (200, 180, 120)).save(self.source_path, quality=100)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_target_size(self):
+        self.assertEqual(target_size((3537, 5000), 150), (1240, 1754))
+        # Never upscale
+        self.assertEqual(target_size((600, 800), 150), (600, 800))
+
+    def test_downsamples_to_dpi(self):
+        optimized_path = optimize_image(self.source_path, self.cache_dir, 50, 70)
+
+        with Image.open(optimized_path) as img:
+            self.assertEqual(img.format, 'JPEG')
+            self.assertEqual(img.size, (413, 585))
+        self.assertTrue(os.path.getsize(optimized_path) < os.path.getsize(self.source_path))
+
+    def test_result_is_reused(self):
+        first = optimize_image(self.source_path, self.cache_dir, 50, 70)
+        mtime = os.stat(first).st_mtime_ns
+
+        self.assertEqual(optimize_image(self.source_path, self.cache_dir, 50, 70), first)
+        self.assertEqual(os.stat(first).st_mtime_ns, mtime)
+        self.assertEqual(os.listdir(self.cache_dir), [os.path.basename(first)])
+
+    def test_settings_and_content_change_key(self):
+        first = optimize_image(self.source_path, self.cache_dir, 50, 70)
+        self.assertNotEqual(optimize_image(self.source_path, self.cache_dir, 50, 60), first)
+
+        Image.new('RGB', (1654, 2339), (10, 20, 30)).save(self.source_path)
+        self.assertNotEqual(optimize_image(self.source_path, self.cache_dir, 50, 70), first)
+
+
+if __name__ == '__main__':
+    unittest.main()
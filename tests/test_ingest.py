@@ -0,0 +1,76 @@
+import unittest
+import os
+import tempfile
+from io import BytesIO
+
+# Add project root to sys.path to allow importing certificate_generator modules
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from certificate_generator.ingest import read_csv_rows, open_csv_rows, MissingHeadersError
+
+CSV_CONTENT = (
+    "Person Name,Course Name,Course Description,Course Date\r\n"
+    'Alice Smith,"Intro to ML\r\nwith newlines",Learn ML,2023-03-10:2023-03-12\r\n'
+    "Bob Johnson,Web Development,Front-end,2023-02-20:2023-02-22\r\n"
+)
+
+
+class CountingStream(BytesIO):
+    """BytesIO that records how many bytes have been read from it."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read1(self, size=-1):
+        data = super().read1(size)
+        self.bytes_read += len(data)
+        return data
+
+    def readinto(self, buffer):
+        count = super().readinto(buffer)
+        self.bytes_read += count
+        return count
+
+
+class TestIngest(unittest.TestCase):
+    def test_reads_rows_from_binary_stream_with_bom(self):
+        rows = list(read_csv_rows(BytesIO(b'\xef\xbb\xbf' + CSV_CONTENT.encode('utf-8'))))
+
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['Person Name'], 'Alice Smith')
+        self.assertEqual(rows[0]['Course Name'], 'Intro to ML\r\nwith newlines')
+        self.assertEqual(rows[1]['Course Date'], '2023-02-20:2023-02-22')
+
+    def test_missing_headers_raised_before_rows(self):
+        with self.assertRaises(MissingHeadersError) as cm:
+            read_csv_rows(BytesIO(b"Person Name,Course Description\nAlice,Basics\n"))
+        self.assertEqual(cm.exception.missing_headers, ['Course Name', 'Course Date'])
+        self.assertEqual(str(cm.exception), "CSV file is missing required columns: Course Name, Course Date")
+
+    def test_empty_file_is_missing_all_headers(self):
+        with self.assertRaises(MissingHeadersError):
+            read_csv_rows(BytesIO(b""))
+
+    def test_rows_are_read_lazily(self):
+        row = "Alice Smith,Python Programming,Learn Python basics,2023-01-15:2023-01-17\n"
+        stream = CountingStream(("Person Name,Course Name,Course Description,Course Date\n" + row * 50000).encode('utf-8'))
+
+        rows = read_csv_rows(stream)
+        next(rows)
+        self.assertTrue(stream.bytes_read < len(stream.getvalue()) // 10)
+
+    def test_open_csv_rows(self):
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w', newline='') as f:
+            f.write(CSV_CONTENT)
+        try:
+            with open_csv_rows(path) as rows:
+                self.assertEqual([row['Person Name'] for row in rows], ['Alice Smith', 'Bob Johnson'])
+        finally:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
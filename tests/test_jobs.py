@@ -0,0 +1,191 @@
+import unittest
+import os
+import time
+import shutil
+import tempfile
+from unittest import mock
+
+# Add project root to sys.path to allow importing certificate_generator modules
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from certificate_generator.batch import RowResult
+from certificate_generator.jobs import JobStore, JobRunner, job_progress, run_job, new_job_id, combined_filename
+from certificate_generator.registry import CertificateRegistry
+from certificate_generator.storage import CertificateStorage
+from certificate_generator.validation import iter_validated
+
+CSV_CONTENT = (
+    "Person Name,Course Name,Course Description,Course Date\n"
+    "Alice Smith,Python Programming,Learn Python basics,2023-01-15:2023-01-17\n"
+    "Bob Johnson,Web Development,Front-end and back-end,2023-02-20:2023-02-22\n"
+    ",,,\n"
+    "Dan Brown,Cloud Computing,AWS and Azure,2023-06-10:2023-06-12\n"
+)
+
+
+class TestJobs(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.output_folder = os.path.join(self.test_dir, 'pdfs')
+        os.makedirs(self.output_folder)
+        self.csv_path = os.path.join(self.test_dir, 'roster.csv')
+        with open(self.csv_path, 'w') as f:
+            f.write(CSV_CONTENT)
+        self.database_path = os.path.join(self.test_dir, 'jobs.sqlite3')
+        self.store = JobStore(self.database_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def create_job(self):
+        job_id = new_job_id()
+        self.store.create_job(job_id, 'DTK_AA', self.csv_path, self.output_folder, 4)
+        return job_id
+
+    def test_run_job(self):
+        job_id = self.create_job()
+        run_job(self.store, self.store.claim_job(), workers=1, chunk_size=2)
+
+        job = self.store.get_job(job_id)
+        self.assertEqual(job['status'], 'finished')
+        self.assertEqual((job['rows_done'], job['failed']), (4, 1))
+
+        results = self.store.get_results(job_id)
+        self.assertEqual([result.row_number for result in results], [1, 2, 3, 4])
+        self.assertEqual(results[2].error, "Row 3 (Person: N/A) - Missing data")
+        self.assertEqual(sorted(CertificateStorage(self.output_folder).files()),
+                         sorted(result.filename for result in results if result.filename))
+
+    def test_resume_from_last_recorded_row(self):
+        job_id = self.create_job()
+        self.store.claim_job()
+        self.store.record_results(job_id, [RowResult(1, 'AS-Earlier.pdf', None), RowResult(2, 'BJ-Earlier.pdf', None)])
+
+        # The worker died: nothing is runnable until its lease expires
+        self.assertIsNone(self.store.claim_job(lease_seconds=60))
+        job = self.store.claim_job(lease_seconds=0)
+        self.assertEqual((job['id'], job['rows_done']), (job_id, 2))
+
+        run_job(self.store, job, workers=1)
+
+        results = self.store.get_results(job_id)
+        self.assertEqual([result.filename for result in results[:2]], ['AS-Earlier.pdf', 'BJ-Earlier.pdf'])
+        self.assertIsNotNone(results[2].error)
+        self.assertTrue(os.path.basename(results[3].filename).startswith('DB-CloudCom-100623-'))
+        # Only the remaining row was rendered again
+        self.assertEqual(len(CertificateStorage(self.output_folder).files()), 1)
+
+    def test_resumed_job_finds_duplicates_of_earlier_rows(self):
+        with open(self.csv_path, 'a') as f:
+            f.write("Alice Smith,Python Programming,Learn Python basics,2023-01-15:2023-01-17\n")
+        job_id = self.create_job()
+        self.store.claim_job()
+        self.store.record_results(job_id, [RowResult(1, 'AS-Earlier.pdf', None), RowResult(2, 'BJ-Earlier.pdf', None)])
+
+        run_job(self.store, self.store.claim_job(lease_seconds=0), workers=1)
+
+        results = self.store.get_results(job_id)
+        self.assertEqual(results[4].error, "Row 5 (Person: Alice Smith) - Duplicate of row 1")
+        self.assertEqual(len(CertificateStorage(self.output_folder).files()), 1)
+
+    def test_saved_csv_is_validated_before_rendering(self):
+        with open(self.csv_path, 'a') as f:
+            f.write("Alice Smith,Python Programming,Learn Python basics,2023-01-15:2023-01-17\n")
+        job_id = self.create_job()
+        with mock.patch('certificate_generator.jobs.iter_validated', wraps=iter_validated) as validated:
+            run_job(self.store, self.store.claim_job(), workers=1)
+
+        # Rendering is driven by a report of the whole file, made up front
+        report = validated.call_args[0][1].__self__
+        self.assertEqual((report.total_rows, sorted(report.errors)), (5, [3, 5]))
+        self.assertEqual(self.store.get_job(job_id)['failed'], 2)
+
+    def test_combined_job_restarts_from_first_row(self):
+        job_id = new_job_id()
+        self.store.create_job(job_id, 'DTK_AA', self.csv_path, self.output_folder, 4, output_mode='combined')
+        self.store.claim_job()
+        self.store.record_results(job_id, [RowResult(1, f'certificates-{job_id}.pdf', None)])
+
+        registry = CertificateRegistry(self.database_path)
+        earlier = registry.issue_ids([(1, {'Person Name': 'Alice Smith', 'Course Name': 'Python Programming',
+                                           'Course Description': 'Learn Python basics', 'Course Date': '2023-01-15'})],
+                                     'DTK_AA', combined_filename(self.store.get_job(job_id)))[1]
+
+        run_job(self.store, self.store.claim_job(lease_seconds=0), workers=1)
+
+        job = self.store.get_job(job_id)
+        self.assertEqual((job['status'], job['rows_done'], job['failed']), ('finished', 4, 1))
+        # The pages of the interrupted run were never delivered; only the new ones verify
+        self.assertIsNone(registry.get(earlier))
+        self.assertEqual(len(registry.find()), 3)
+        self.assertEqual(CertificateStorage(self.output_folder).files(), [combined_filename(job)])
+        self.assertTrue(combined_filename(job).endswith(f'/certificates-{job_id}.pdf'))
+
+    def test_abandoned_streamed_job_is_failed(self):
+        job_id = new_job_id()
+        self.store.create_job(job_id, 'DTK_AA', None, self.output_folder, 0)
+        self.store.claim_job(job_id)
+
+        self.assertIsNone(self.store.claim_job(lease_seconds=0))
+        job = self.store.get_job(job_id)
+        self.assertEqual(job['status'], 'failed')
+        self.assertIn('upload the file again', job['message'])
+
+    def test_streamed_job_is_only_claimed_by_its_request(self):
+        job_id = new_job_id()
+        self.store.create_job(job_id, 'DTK_AA', None, self.output_folder, 0)
+
+        self.assertIsNone(self.store.claim_job())
+        self.assertEqual(self.store.claim_job(job_id)['id'], job_id)
+
+    def test_missing_input_fails_job(self):
+        job_id = self.create_job()
+        os.remove(self.csv_path)
+        run_job(self.store, self.store.claim_job(), workers=1)
+
+        job = self.store.get_job(job_id)
+        self.assertEqual(job['status'], 'failed')
+        self.assertIn('roster.csv', job['message'])
+
+    def test_progress_eta(self):
+        job_id = self.create_job()
+        job = self.store.claim_job()
+        self.store.record_results(job_id, [RowResult(1, 'A.pdf', None)])
+        job = self.store.get_job(job_id)
+
+        progress = job_progress(job, now=job['started_at'] + 2)
+        self.assertEqual(progress['rows_done'], 1)
+        self.assertEqual(progress['eta_seconds'], 6)
+
+    def test_running_jobs_per_pair_are_limited(self):
+        first, second = self.create_job(), self.create_job()
+        other = new_job_id()
+        self.store.create_job(other, 'DTK_RBB', self.csv_path, self.output_folder, 4)
+        self.assertEqual(self.store.active_jobs('DTK_AA'), (2, 0))
+
+        self.assertEqual(self.store.claim_job(max_running_per_pair=1)['id'], first)
+        # The other DTK_AA job waits, DTK_RBB's goes ahead
+        self.assertEqual(self.store.claim_job(max_running_per_pair=1)['id'], other)
+        self.assertIsNone(self.store.claim_job(max_running_per_pair=1))
+        self.assertEqual(self.store.active_jobs('DTK_AA'), (1, 1))
+        self.assertIsNone(self.store.claim_job(second, max_running_per_pair=1))
+        self.assertEqual(self.store.claim_job(second)['id'], second)
+
+        self.store.finish_job(first)
+        self.assertEqual(self.store.active_jobs('DTK_AA'), (0, 1))
+
+    def test_runner_picks_up_queued_job(self):
+        job_id = self.create_job()
+        runner = JobRunner(self.database_path, workers=1, poll_interval=0.1)
+        runner.ensure_started()
+
+        deadline = time.time() + 30
+        while self.store.get_job(job_id)['status'] != 'finished' and time.time() < deadline:
+            time.sleep(0.05)
+        runner.stop()
+        self.assertEqual(self.store.get_job(job_id)['status'], 'finished')
+
+
+if __name__ == '__main__':
+    unittest.main()
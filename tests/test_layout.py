@@ -0,0 +1,127 @@
+import unittest
+import os
+import io
+import re
+import json
+import PyPDF2
+from unittest import mock
+from fpdf import FPDF
+
+# Add project root to sys.path to allow importing certificate_generator modules
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from certificate_generator.layout import LayoutPlan, LINE_HEIGHT, _FONT_LINE
+from certificate_generator.template_cache import ROOT_PATH
+
+
+class NoBackground:
+    def draw_background(self, pdf):
+        pass
+
+
+def load_config():
+    with open(os.path.join(ROOT_PATH, 'config.json')) as f:
+        return json.load(f)
+
+
+def values(**overrides):
+    result = {
+        'person_name': 'Jane Doe',
+        'course_name': 'A Very Long Course Name That Should Wrap To a New Line',
+        'course_description': 'First line.\nSecond line.',
+        'bulleted_description': '* First line.\n* Second line.',
+        'course_date': '2024-01-01:2024-01-03',
+        'certificate_id': 'JD-AVeryLon-010124-123456',
+    }
+    result.update(overrides)
+    return result
+
+
+def page_texts(pdf):
+    reader = PyPDF2.PdfReader(io.BytesIO(bytes(pdf.output())))
+    return [page.extract_text() for page in reader.pages]
+
+
+class TestLayoutPlan(unittest.TestCase):
+    def test_default_layout_static_layer_and_slots(self):
+        plan = LayoutPlan(load_config())
+        self.assertEqual([element.text for element in plan.static_elements],
+                         ['Certificate of Completion', 'This certificate is awarded to:',
+                          'for successfully completing the course content:', 'Certified by Aditya Consultants'])
+        self.assertEqual([element.fields for element in plan.slots],
+                         [('course_name',), ('person_name',), ('bulleted_description',), ('course_date',), ('certificate_id',)])
+
+    def test_static_layer_font_selections_are_found(self):
+        plan = LayoutPlan(load_config())
+        font_lines = [line for line in plan._static_content if _FONT_LINE.fullmatch(line)]
+        self.assertEqual(len(font_lines), len(plan._static_fonts))
+
+        # A change in how fpdf selects fonts must not go unnoticed
+        with mock.patch('certificate_generator.layout._FONT_LINE', re.compile(rb'BT /Font(\d+) (\d+) Tf ET')):
+            with self.assertRaises(RuntimeError):
+                LayoutPlan(load_config())
+
+    def test_pages_contain_static_and_slot_text(self):
+        plan = LayoutPlan(load_config())
+        pdf = FPDF()
+        for person_name in ('Jane Doe', 'John Smith'):
+            pdf.add_page()
+            plan.draw(pdf, NoBackground(), values(person_name=person_name))
+
+        texts = page_texts(pdf)
+        self.assertEqual(len(texts), 2)
+        for text, person_name in zip(texts, ('Jane Doe', 'John Smith')):
+            self.assertIn('Certificate of Completion', text)
+            self.assertIn('Certified by Aditya Consultants', text)
+            self.assertIn(person_name, text)
+            self.assertIn('* Second line.', text)
+            self.assertIn('That Should Wrap To a New Line', text)
+
+    def test_wrapped_slot_matches_multi_cell(self):
+        config = load_config()
+        config['layout'] = [{'text': '{course_name}', 'y': 80, 'style': 'B', 'size': 16, 'wrap': True}]
+        plan = LayoutPlan(config)
+
+        expected = FPDF()
+        expected.add_page()
+        expected.set_fill_color(*config['background_color'])
+        expected.rect(0, 0, 210, 297, 'F')
+        expected.set_y(80)
+        expected.set_font(config['font_name'], 'B', 16)
+        expected.set_text_color(0, 0, 0)
+        expected.multi_cell(0, LINE_HEIGHT, values()['course_name'], align='C')
+
+        for _ in range(2): # The second page reuses the cached line breaks
+            pdf = FPDF()
+            pdf.add_page()
+            plan.draw(pdf, NoBackground(), values())
+            self.assertEqual(bytes(pdf.pages[1].contents), bytes(expected.pages[1].contents))
+        self.assertEqual(len(plan._lines), 1)
+
+    def test_layout_from_config(self):
+        config = load_config()
+        config['layout'] = [
+            {'text': 'Awarded to {person_name} on {course_date}', 'y': 100, 'size': 18, 'color': [0, 0, 128]},
+            {'text': 'Literal {{braces}}', 'y': 200, 'size': 10},
+        ]
+        plan = LayoutPlan(config)
+        self.assertEqual(len(plan.static_elements), 1)
+
+        pdf = FPDF()
+        pdf.add_page()
+        plan.draw(pdf, NoBackground(), values())
+        text = page_texts(pdf)[0]
+        self.assertIn('Awarded to Jane Doe on 2024-01-01:2024-01-03', text)
+        self.assertIn('Literal {braces}', text)
+        self.assertNotIn('Certificate of Completion', text)
+
+    def test_unknown_field_is_rejected(self):
+        config = load_config()
+        config['layout'] = [{'text': 'Hello {nickname}', 'y': 100, 'size': 12}]
+        with self.assertRaises(ValueError):
+            LayoutPlan(config)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import unittest
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+# Add project root to sys.path to allow importing certificate_generator modules
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from certificate_generator.batch import iter_numbered_batch
+from certificate_generator.manifest import Manifest, iter_incremental, row_fingerprint
+from certificate_generator.storage import CertificateStorage
+from certificate_generator.template_cache import template_cache
+
+
+def make_rows(count):
+    return [
+        {
+            'Person Name': f"Person {i} Example",
+            'Course Name': "Data Analytics",
+            'Course Description': "Line one\nLine two",
+            'Course Date': "2024-03-15:2024-03-17",
+        }
+        for i in range(count)
+    ]
+
+
+class TestIncrementalGeneration(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.output_folder = os.path.join(self.test_dir, 'pdfs')
+        os.makedirs(self.output_folder)
+        self.manifest = Manifest(os.path.join(self.test_dir, 'test.sqlite3'))
+        self.rendered = []
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def render(self, numbered_rows):
+        for result in iter_numbered_batch(numbered_rows, 'DTK_AA', self.output_folder, workers=1):
+            self.rendered.append(result.row_number)
+            yield result
+
+    def run_incremental(self, rows):
+        self.rendered = []
+        return list(iter_incremental(enumerate(rows, start=1), 'DTK_AA', self.output_folder, self.manifest, self.render))
+
+    def test_only_changed_rows_are_rendered(self):
+        rows = make_rows(6)
+        first = self.run_incremental(rows)
+        self.assertEqual(self.rendered, [1, 2, 3, 4, 5, 6])
+
+        rows[2]['Course Date'] = "2024-03-16:2024-03-18"
+        rows.append(make_rows(7)[6])
+        second = self.run_incremental(rows)
+
+        self.assertEqual(self.rendered, [3, 7])
+        self.assertEqual([result.row_number for result in second], [1, 2, 3, 4, 5, 6, 7])
+        for i in (0, 1, 3, 4, 5):
+            self.assertEqual(second[i].filename, first[i].filename)
+        self.assertNotEqual(second[2].filename, first[2].filename)
+        self.assertEqual(len(CertificateStorage(self.output_folder).files()), 8)
+
+    def test_manifest_stores_certificate_ids(self):
+        results = self.run_incremental(make_rows(2))
+        fingerprints = [row_fingerprint(row, 'DTK_AA', template_cache.get('DTK_AA').fingerprint) for row in make_rows(2)]
+
+        issued = self.manifest.lookup(fingerprints)
+        for fingerprint, result in zip(fingerprints, results):
+            certificate_id, filename = issued[fingerprint]
+            self.assertEqual(filename, result.filename)
+            self.assertEqual(certificate_id, os.path.splitext(os.path.basename(result.filename))[0])
+            self.assertNotIn('/', certificate_id)
+
+    def test_deleted_certificate_is_rendered_again(self):
+        first = self.run_incremental(make_rows(3))
+        os.remove(os.path.join(self.output_folder, first[1].filename))
+
+        second = self.run_incremental(make_rows(3))
+        self.assertEqual(self.rendered, [2])
+        self.assertEqual(second[0].filename, first[0].filename)
+
+    def test_skipped_rows_are_not_held_back(self):
+        rows = make_rows(20)
+        self.run_incremental(rows)
+        rows[0]['Course Date'] = "2024-03-16:2024-03-18"
+        read = []
+
+        def numbered_rows():
+            for row_number, row in enumerate(rows, start=1):
+                read.append(row_number)
+                yield row_number, row
+
+        with mock.patch('certificate_generator.manifest.LOOKUP_SIZE', 4), \
+                mock.patch('certificate_generator.manifest.MAX_SKIPPED_WAITING', 8):
+            self.rendered = []
+            results = iter_incremental(numbered_rows(), 'DTK_AA', self.output_folder, self.manifest, self.render)
+            # Row 1 is rendered once 8 skipped rows wait behind it, rather than after the last row
+            self.assertEqual(next(results).row_number, 1)
+            self.assertEqual(len(read), 12)
+            # No result waits for more than the skipped rows held back plus a lookup block
+            lags = [len(read) - result.row_number for result in results]
+        self.assertEqual(len(lags), 19)
+        self.assertLess(max(lags), 8 + 4)
+        self.assertEqual(self.rendered, [1])
+
+    def test_rows_with_missing_data_still_fail(self):
+        rows = make_rows(3)
+        rows[1]['Person Name'] = ''
+        self.run_incremental(rows)
+        results = self.run_incremental(rows)
+
+        self.assertEqual(self.rendered, [2])
+        self.assertEqual(results[1].error, "Row 2 (Person: N/A) - Missing data")
+
+    def test_instructor_pair_and_template_are_part_of_fingerprint(self):
+        row = make_rows(1)[0]
+        fingerprint = row_fingerprint(row, 'DTK_AA', 'template-1')
+        self.assertEqual(row_fingerprint(dict(row), 'DTK_AA', 'template-1'), fingerprint)
+        self.assertNotEqual(row_fingerprint(row, 'DTK_RBB', 'template-1'), fingerprint)
+        self.assertNotEqual(row_fingerprint(row, 'DTK_AA', 'template-2'), fingerprint)
+
+    def test_lookup(self):
+        self.manifest.record([('abc', 'AS-Python-150123-000001', 'AS-Python-150123-000001.pdf')])
+        self.assertEqual(self.manifest.lookup(['abc', 'def']), {'abc': ('AS-Python-150123-000001', 'AS-Python-150123-000001.pdf')})
+        self.assertEqual(self.manifest.lookup([]), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
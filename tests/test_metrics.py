@@ -0,0 +1,56 @@
+import unittest
+import os
+
+# Add project root to sys.path to allow importing certificate_generator modules
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from certificate_generator.metrics import Metrics, format_trace
+
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram_and_counters_in_prometheus_format(self):
+        metrics = Metrics()
+        metrics.observe('pdf_output', 0.003)
+        metrics.observe('pdf_output', 0.2)
+        metrics.increment('rows_generated', 2)
+        metrics.increment('bytes_written', 1000)
+
+        text = metrics.render_prometheus()
+        self.assertIn('certificate_generator_stage_seconds_bucket{stage="pdf_output",le="0.0025"} 0', text)
+        self.assertIn('certificate_generator_stage_seconds_bucket{stage="pdf_output",le="0.005"} 1', text)
+        self.assertIn('certificate_generator_stage_seconds_bucket{stage="pdf_output",le="+Inf"} 2', text)
+        self.assertIn('certificate_generator_stage_seconds_count{stage="pdf_output"} 2', text)
+        self.assertIn('certificate_generator_rows_generated_total 2', text)
+        self.assertIn('certificate_generator_bytes_written_total 1000', text)
+
+    def test_disabled_metrics_record_nothing(self):
+        metrics = Metrics(enabled=False)
+        with metrics.timed('page'):
+            pass
+        metrics.increment('rows_failed')
+        self.assertIs(metrics.timed('page'), metrics.timed('image_embed'))
+        self.assertNotIn('stage="page"', metrics.render_prometheus())
+        self.assertIn('certificate_generator_rows_failed_total 0', metrics.render_prometheus())
+
+    def test_worker_metrics_are_merged(self):
+        worker, parent = Metrics(), Metrics()
+        with worker.timed('page'):
+            pass
+        worker.increment('bytes_written', 500)
+        snapshot = worker.collect()
+        self.assertNotIn('stage="page"', worker.render_prometheus())
+
+        parent.start_trace()
+        parent.merge(snapshot)
+        parent.merge(snapshot)
+        trace = parent.end_trace()
+
+        self.assertIn('certificate_generator_stage_seconds_count{stage="page"} 2', parent.render_prometheus())
+        self.assertIn('certificate_generator_bytes_written_total 1000', parent.render_prometheus())
+        self.assertEqual(list(trace), ['page'])
+        self.assertTrue(format_trace(trace).startswith('page='))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+import os
+import shutil
+import tempfile
+
+# Add project root to sys.path to allow importing certificate_generator modules
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from certificate_generator.pdf_cache import PDFCache
+
+
+class TestPDFCache(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.cache = PDFCache(max_bytes=250)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def write(self, name, data):
+        path = os.path.join(self.folder, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def bump_mtime(self, path):
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    def test_hits_and_misses(self):
+        path = self.write('a.pdf', b'a' * 100)
+        first = self.cache.get_file(path)
+        second = self.cache.get_file(path)
+
+        self.assertIs(first, second)
+        self.assertEqual(first.data, b'a' * 100)
+        self.assertEqual(first.last_modified, os.stat(path).st_mtime)
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['hit_rate'], stats['bytes']), (1, 1, 0.5, 100))
+
+    def test_regenerated_file_is_reloaded(self):
+        path = self.write('a.pdf', b'a' * 100)
+        first = self.cache.get_file(path)
+        self.write('a.pdf', b'b' * 100)
+        self.bump_mtime(path)
+
+        second = self.cache.get_file(path)
+        self.assertEqual(second.data, b'b' * 100)
+        self.assertNotEqual(first.etag, second.etag)
+        self.assertEqual(self.cache.stats()['bytes'], 100)
+
+    def test_least_recently_used_are_evicted(self):
+        paths = [self.write(f'{name}.pdf', name.encode() * 100) for name in 'abc']
+        self.cache.get_file(paths[0])
+        self.cache.get_file(paths[1])
+        self.cache.get_file(paths[0])
+        self.cache.get_file(paths[2])  # Evicts b, the least recently used
+
+        stats = self.cache.stats()
+        self.assertEqual((stats['entries'], stats['bytes'], stats['evictions']), (2, 200, 1))
+        self.cache.get_file(paths[0])
+        self.assertEqual(self.cache.stats()['hits'], 2)
+        self.cache.get_file(paths[1])
+        self.assertEqual(self.cache.stats()['misses'], 4)
+
+    def test_missing_and_oversized_files_are_not_cached(self):
+        self.assertIsNone(self.cache.get_file(os.path.join(self.folder, 'missing.pdf')))
+        self.assertIsNone(self.cache.get_file(self.write('big.pdf', b'x' * 300)))
+        self.assertEqual(self.cache.stats()['entries'], 0)
+
+    def test_changed_validator_reloads(self):
+        loads = []
+        load = lambda: loads.append(1) or (b'rendered', 0.0)
+        self.cache.get('key', 'v1', load)
+        self.cache.get('key', 'v1', load)
+        self.cache.get('key', 'v2', load)
+        self.assertEqual(len(loads), 2)
+        self.assertEqual(self.cache.stats()['entries'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+# Add project root to sys.path to allow importing certificate_generator modules
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from certificate_generator.batch import render_batch, iter_combined
+from certificate_generator.registry import CertificateRegistry
+
+ROWS = [
+    {'Person Name': 'Alice Smith', 'Course Name': 'Python Programming',
+     'Course Description': 'Learn Python basics', 'Course Date': '2023-01-15:2023-01-17'},
+    {'Person Name': '', 'Course Name': '', 'Course Description': '', 'Course Date': ''},
+    {'Person Name': 'Bob Johnson', 'Course Name': 'Web Development',
+     'Course Description': 'Front-end and back-end', 'Course Date': '2023-02-20:2023-02-22'},
+]
+
+
+class TestCertificateRegistry(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.output_folder = os.path.join(self.test_dir, 'pdfs')
+        os.makedirs(self.output_folder)
+        self.registry = CertificateRegistry(os.path.join(self.test_dir, 'test.sqlite3'))
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_issue_ids_skips_incomplete_rows(self):
+        issued = self.registry.issue_ids(list(enumerate(ROWS, start=1)), 'DTK_AA')
+        self.assertEqual(sorted(issued), [1, 3])
+
+        certificate = self.registry.get(issued[3])
+        self.assertEqual(certificate['person_name'], 'Bob Johnson')
+        self.assertEqual(certificate['course_description'], 'Front-end and back-end')
+        self.assertEqual(certificate['filename'], f"{issued[3]}.pdf")
+
+    def test_colliding_ids_are_generated_again(self):
+        rows = [(1, ROWS[0]), (2, ROWS[0])]
+        # The first attempt gives both rows the same ID, then the registry holds it
+        suffixes = iter([1, 1, 2, 1, 3])
+        with mock.patch('random.randint', side_effect=lambda a, b: next(suffixes)):
+            first = self.registry.issue_ids(rows, 'DTK_AA')
+            second = self.registry.issue_ids(rows[:1], 'DTK_AA')
+
+        self.assertEqual(first, {1: 'AS-PythonPr-150123-000001', 2: 'AS-PythonPr-150123-000002'})
+        self.assertEqual(second, {1: 'AS-PythonPr-150123-000003'})
+
+    def test_batch_registers_generated_certificates(self):
+        results = render_batch(ROWS, 'DTK_AA', self.output_folder, workers=1, registry=self.registry)
+
+        certificate_ids = [os.path.splitext(os.path.basename(result.filename))[0] for result in results if result.filename]
+        self.assertEqual(len(certificate_ids), 2)
+        for certificate_id in certificate_ids:
+            self.assertIsNotNone(self.registry.get(certificate_id))
+        self.assertEqual([c['certificate_id'] for c in self.registry.find(person_name='Alice Smith')], certificate_ids[:1])
+
+    def test_failed_certificates_are_revoked(self):
+        with mock.patch('certificate_generator.batch.create_certificate', side_effect=IOError('Disk full')):
+            results = render_batch(ROWS[:1], 'DTK_AA', self.output_folder, workers=1, registry=self.registry)
+
+        self.assertEqual(results[0].error, 'Row 1 (Person: Alice Smith) - Disk full')
+        self.assertEqual(self.registry.find(), [])
+
+    def test_pending_ids_are_hidden_until_confirmed(self):
+        issued = self.registry.issue_ids([(1, ROWS[0])], 'DTK_AA', pending=True)
+        self.assertIsNone(self.registry.get(issued[1]))
+        self.assertEqual(self.registry.find(), [])
+
+        self.registry.confirm([issued[1]])
+        self.assertEqual(self.registry.get(issued[1])['person_name'], 'Alice Smith')
+
+    def test_combined_certificates_are_revoked_when_the_file_cannot_be_written(self):
+        with mock.patch('certificate_generator.batch.CertificateBook.save', side_effect=IOError('Disk full')):
+            with self.assertRaises(IOError):
+                list(iter_combined(ROWS, 'DTK_AA', self.output_folder, 'all.pdf', registry=self.registry))
+
+        self.assertEqual(self.registry.find(), [])
+        self.assertEqual(self.registry._query('SELECT COUNT(*) FROM certificates')[0][0], 0)
+
+    def test_combined_certificates_are_issued_once_written(self):
+        results = list(iter_combined(ROWS, 'DTK_AA', self.output_folder, 'all.pdf', registry=self.registry))
+        self.assertEqual([result.filename for result in results], ['all.pdf', None, 'all.pdf'])
+        self.assertEqual(sorted(c['person_name'] for c in self.registry.find()), ['Alice Smith', 'Bob Johnson'])
+
+
+if __name__ == '__main__':
+    unittest.main()
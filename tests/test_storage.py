@@ -0,0 +1,73 @@
+import unittest
+import os
+import shutil
+import tempfile
+from datetime import date
+
+# Add project root to sys.path to allow importing certificate_generator modules
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from certificate_generator.storage import CertificateStorage, certificate_filename, shard_filename, write_file
+
+
+class TestCertificateStorage(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.storage = CertificateStorage(self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_filenames_are_sharded_by_day_and_hash(self):
+        filename = certificate_filename('AS-PythonPr-150123-000001', date(2024, 3, 5))
+        self.assertRegex(filename, r'^2024/03/05/[0-9a-f]{2}/AS-PythonPr-150123-000001\.pdf$')
+        self.assertEqual(filename, shard_filename('AS-PythonPr-150123-000001.pdf', date(2024, 3, 5)))
+        self.assertTrue(certificate_filename('X').startswith(f"{date.today():%Y/%m/%d}/"))
+
+    def test_paths_stay_inside_the_folder(self):
+        self.assertEqual(self.storage.path('2024/03/05/ab/X.pdf'), os.path.join(self.root, '2024/03/05/ab/X.pdf'))
+        for filename in ('../X.pdf', '2024/../../X.pdf', '/etc/passwd'):
+            with self.assertRaises(ValueError):
+                self.storage.path(filename)
+
+    def test_write_file_replaces_in_one_step(self):
+        path = self.storage.path(certificate_filename('X'))
+        write_file(path, b'first')
+        write_file(path, b'second')
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b'second')
+        self.assertEqual(self.storage.files(), [certificate_filename('X')])
+
+        with self.assertRaises(TypeError):
+            write_file(path, 'not bytes')
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b'second')
+        self.assertEqual(self.storage.files(), [certificate_filename('X')])
+
+    def test_migrate_flat_folder(self):
+        for name in ('A.pdf', 'B.pdf', 'notes.txt'):
+            with open(os.path.join(self.root, name), 'wb') as f:
+                f.write(b'%PDF')
+        os.utime(os.path.join(self.root, 'A.pdf'), (0, 86400 * 365))
+
+        moved = dict(self.storage.migrate())
+
+        self.assertEqual(sorted(moved), ['A.pdf', 'B.pdf'])
+        self.assertEqual(moved['A.pdf'], shard_filename('A.pdf', date.fromtimestamp(86400 * 365)))
+        self.assertEqual(sorted(self.storage.files()), sorted(list(moved.values()) + ['notes.txt']))
+        self.assertEqual(self.storage.migrate(), [])
+
+    def test_sweep_removes_old_days(self):
+        for day in (date(2023, 12, 31), date(2024, 1, 1), date(2024, 1, 2)):
+            write_file(self.storage.path(certificate_filename('A', day)), b'%PDF')
+            write_file(self.storage.path(certificate_filename('B', day)), b'%PDF')
+
+        self.assertEqual(self.storage.sweep(date(2024, 1, 2)), 4)
+        self.assertEqual(sorted(self.storage.days()), [date(2024, 1, 2)])
+        self.assertFalse(os.path.exists(os.path.join(self.root, '2023')))
+        self.assertEqual(self.storage.sweep(date(2024, 1, 2)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import unittest
+import os
+import json
+import shutil
+import tempfile
+from fpdf import FPDF
+
+# Add project root to sys.path to allow importing certificate_generator modules
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from certificate_generator.template_cache import TemplateCache, ROOT_PATH
+
+
+class TestTemplateCache(unittest.TestCase):
+    def setUp(self):
+        # Work on a copy of the templates so we can modify them freely
+        self.root_path = tempfile.mkdtemp()
+        with open(os.path.join(ROOT_PATH, 'config.json')) as f:
+            config = json.load(f)
+        config['background_optimization'] = {'enabled': False}
+        with open(os.path.join(self.root_path, 'config.json'), 'w') as f:
+            json.dump(config, f)
+        shutil.copytree(os.path.join(ROOT_PATH, 'static'), os.path.join(self.root_path, 'static'))
+        self.cache = TemplateCache(self.root_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.root_path)
+
+    def bump_mtime(self, path):
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    def test_hits_and_misses(self):
+        first = self.cache.get('DTK_RBB')
+        second = self.cache.get('DTK_RBB')
+        self.cache.get('DTK_AA')
+
+        self.assertIs(first, second)
+        self.assertEqual(self.cache.stats(), {'hits': 1, 'misses': 2, 'templates': 2})
+
+    def test_unknown_pair_uses_default_background(self):
+        template = self.cache.get('UNKNOWN')
+        self.assertEqual(template.background_image_path, os.path.join(self.root_path, 'static/template.jpg'))
+
+    def test_templates_defined_in_config(self):
+        config_path = os.path.join(self.root_path, 'config.json')
+        with open(config_path) as f:
+            config = json.load(f)
+        config['templates']['GUEST'] = {'label': 'Guest speakers', 'background_image': 'static/DTK_AA.jpg',
+                                        'header_text': 'Certificate of Attendance'}
+        with open(config_path, 'w') as f:
+            json.dump(config, f)
+
+        template = self.cache.get('GUEST')
+        self.assertEqual(template.background_image_path, os.path.join(self.root_path, 'static/DTK_AA.jpg'))
+        self.assertEqual(template.layout.static_elements[0].text, 'Certificate of Attendance')
+        self.assertEqual(self.cache.get('DTK_AA').layout.static_elements[0].text, 'Certificate of Completion')
+        self.assertEqual(self.cache.labels()['GUEST'], 'Guest speakers')
+
+    def test_config_change_invalidates(self):
+        first = self.cache.get('DTK_RBB')
+
+        config_path = os.path.join(self.root_path, 'config.json')
+        with open(config_path) as f:
+            config = json.load(f)
+        config['header_text'] = 'Updated Header'
+        with open(config_path, 'w') as f:
+            json.dump(config, f)
+        self.bump_mtime(config_path)
+
+        second = self.cache.get('DTK_RBB')
+        self.assertIsNot(first, second)
+        self.assertEqual(second.config['header_text'], 'Updated Header')
+        self.assertEqual(self.cache.misses, 2)
+
+    def test_image_change_invalidates(self):
+        first = self.cache.get('DTK_AA')
+        self.bump_mtime(os.path.join(self.root_path, 'static/DTK_AA.jpg'))
+
+        self.assertIsNot(first, self.cache.get('DTK_AA'))
+        self.assertEqual(self.cache.misses, 2)
+
+    def test_optimized_background(self):
+        config_path = os.path.join(self.root_path, 'config.json')
+        with open(config_path) as f:
+            config = json.load(f)
+        config['background_optimization'] = {'enabled': True, 'dpi': 30, 'quality': 60, 'cache_dir': 'optimized'}
+        with open(config_path, 'w') as f:
+            json.dump(config, f)
+
+        template = self.cache.get('DTK_RBB')
+        self.assertEqual(os.path.dirname(template.embedded_image_path), os.path.join(self.root_path, 'optimized'))
+        self.assertTrue(os.path.getsize(template.embedded_image_path) < os.path.getsize(template.background_image_path))
+
+    @unittest.skipUnless(os.path.exists('/usr/share/fonts/truetype/dejavu/DejaVuSerif.ttf'), "DejaVu fonts are not installed")
+    def test_font_change_invalidates(self):
+        os.makedirs(os.path.join(self.root_path, 'fonts'))
+        font_path = os.path.join(self.root_path, 'fonts/serif.ttf')
+        shutil.copy('/usr/share/fonts/truetype/dejavu/DejaVuSerif.ttf', font_path)
+        config_path = os.path.join(self.root_path, 'config.json')
+        with open(config_path) as f:
+            config = json.load(f)
+        config['layout'] = [{'text': '{person_name}', 'y': 100, 'size': 14, 'font': 'Serif'}]
+        config['fonts'] = {'Serif': {'': 'fonts/serif.ttf'}}
+        with open(config_path, 'w') as f:
+            json.dump(config, f)
+
+        first = self.cache.get('DTK_AA')
+        self.assertEqual(first.layout.embedded_fonts, {('serif', ''): font_path})
+        self.assertIs(self.cache.get('DTK_AA'), first)
+
+        self.bump_mtime(font_path)
+        second = self.cache.get('DTK_AA')
+        self.assertIsNot(second, first)
+        self.assertEqual(second.fingerprint, first.fingerprint)
+
+    def test_missing_background_image(self):
+        os.remove(os.path.join(self.root_path, 'static/DTK_AA.jpg'))
+        template = self.cache.get('DTK_AA')
+
+        pdf = FPDF()
+        pdf.add_page()
+        template.draw_background(pdf)
+        self.assertEqual(len(pdf.image_cache.images), 0)
+
+    def test_background_shared_between_pages(self):
+        template = self.cache.get('DTK_RBB')
+
+        pdf = FPDF()
+        for _ in range(3):
+            pdf.add_page()
+            template.draw_background(pdf)
+
+        self.assertEqual(len(pdf.image_cache.images), 1)
+        info = next(iter(pdf.image_cache.images.values()))
+        self.assertEqual(info['usages'], 3)
+        self.assertTrue(len(pdf.output()) > 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
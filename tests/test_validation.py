@@ -0,0 +1,94 @@
+import unittest
+import os
+import shutil
+import tempfile
+
+# Add project root to sys.path to allow importing certificate_generator modules
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from certificate_generator.batch import iter_numbered_batch
+from certificate_generator.validation import RowValidator, validate_rows, iter_validated, normalize_course_date
+from certificate_generator.storage import CertificateStorage
+
+
+def make_row(person_name="Alice Smith", course_name="Python Programming", course_description="Learn Python basics",
+             course_date="2023-01-15:2023-01-17"):
+    return {
+        'Person Name': person_name,
+        'Course Name': course_name,
+        'Course Description': course_description,
+        'Course Date': course_date,
+    }
+
+
+class TestValidation(unittest.TestCase):
+    def test_normalize_course_date(self):
+        self.assertEqual(normalize_course_date("2023-01-15:2023-01-17"), "2023-01-15:2023-01-17")
+        self.assertEqual(normalize_course_date("2023-01-15"), "2023-01-15:2023-01-15")
+        self.assertEqual(normalize_course_date("15-01-2023:01/17/2023"), "2023-01-15:2023-01-17")
+        self.assertIsNone(normalize_course_date("2023-01-17:2023-01-15"))
+        self.assertIsNone(normalize_course_date("2023-13-01:2023-13-02"))
+        self.assertIsNone(normalize_course_date("soon"))
+
+    def test_report_lists_every_invalid_row(self):
+        rows = [
+            make_row(),
+            make_row(person_name=""),
+            make_row(person_name="Bob Jones", course_date="2023/01/15"),
+            make_row(person_name="Carol White", course_description="\n".join(f"Topic {i}" for i in range(12))),
+            make_row(person_name="Dan Brown", course_name="Data Analytics " * 30),
+            make_row(course_date="15-01-2023:17-01-2023"),
+            make_row(person_name="Eve Davis"),
+        ]
+        report = validate_rows(rows, 'DTK_AA')
+
+        self.assertEqual(report.total_rows, 7)
+        self.assertEqual(report.errors, {
+            2: "Row 2 (Person: N/A) - Missing data",
+            3: "Row 3 (Person: Bob Jones) - Invalid course date '2023/01/15', expected YYYY-MM-DD:YYYY-MM-DD",
+            4: "Row 4 (Person: Carol White) - Course Description is too long (12 lines, at most 8 fit)",
+            5: "Row 5 (Person: Dan Brown) - Course Name is too long (6 lines, at most 3 fit)",
+            6: "Row 6 (Person: Alice Smith) - Duplicate of row 1",
+        })
+
+    def test_duplicates_are_found_across_blocks(self):
+        validator = RowValidator('DTK_AA')
+        self.assertEqual(validator.check([(1, make_row())]), {})
+        self.assertEqual(validator.check([(2, make_row(person_name="Bob Jones")), (3, make_row())]),
+                         {3: "Row 3 (Person: Alice Smith) - Duplicate of row 1"})
+
+    def test_seen_rows_are_kept_as_digests(self):
+        validator = RowValidator('DTK_AA')
+        self.assertEqual(validator.check([(1, make_row(course_description="Learn Python basics " * 8)),
+                                          (2, make_row(person_name="Bob Jones"))]), {})
+        self.assertEqual([len(key) for key in validator._seen], [20, 20])
+
+
+class TestIterValidated(unittest.TestCase):
+    def setUp(self):
+        self.output_folder = tempfile.mkdtemp()
+        self.rendered = []
+
+    def tearDown(self):
+        shutil.rmtree(self.output_folder)
+
+    def render(self, numbered_rows):
+        for result in iter_numbered_batch(numbered_rows, 'DTK_AA', self.output_folder, workers=1):
+            self.rendered.append(result.row_number)
+            yield result
+
+    def test_invalid_rows_fail_without_rendering(self):
+        rows = [make_row(), make_row(course_name=""), make_row(person_name="Bob Jones"), make_row()]
+        results = list(iter_validated(enumerate(rows, start=1), RowValidator('DTK_AA').check, self.render))
+
+        self.assertEqual(self.rendered, [1, 3])
+        self.assertEqual([result.row_number for result in results], [1, 2, 3, 4])
+        self.assertIsNotNone(results[0].filename)
+        self.assertEqual(results[1].error, "Row 2 (Person: Alice Smith) - Missing data")
+        self.assertEqual(results[3].error, "Row 4 (Person: Alice Smith) - Duplicate of row 1")
+        self.assertEqual(len(CertificateStorage(self.output_folder).files()), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
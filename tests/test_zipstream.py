@@ -0,0 +1,74 @@
+import unittest
+import os
+import shutil
+import tempfile
+import zipfile
+from io import BytesIO
+
+# Add project root to sys.path to allow importing certificate_generator modules
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from certificate_generator.zipstream import ZipStream
+
+
+class TestZipStream(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.files = []
+        for i, size in enumerate([0, 1000, 150000, 70000]):
+            path = os.path.join(self.test_dir, f"cert{i}.pdf")
+            with open(path, 'wb') as f:
+                f.write(os.urandom(size))
+            self.files.append((f"cert{i}.pdf", path))
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def check_archive(self, data):
+        with zipfile.ZipFile(BytesIO(data)) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(archive.namelist(), [name for name, _ in self.files])
+            for name, path in self.files:
+                info = archive.getinfo(name)
+                self.assertEqual(info.compress_type, zipfile.ZIP_STORED)
+                with open(path, 'rb') as f:
+                    self.assertEqual(archive.read(name), f.read())
+
+    def test_archive_is_valid(self):
+        stream = ZipStream(self.files)
+        data = b''.join(stream.iter_bytes())
+        self.assertEqual(len(data), stream.size)
+        self.assertFalse(stream.zip64)
+        self.check_archive(data)
+
+    def test_zip64_archive_is_valid(self):
+        stream = ZipStream(self.files, force_zip64=True)
+        data = b''.join(stream.iter_bytes())
+        self.assertEqual(len(data), stream.size)
+        self.check_archive(data)
+
+    def test_byte_ranges(self):
+        data = b''.join(ZipStream(self.files).iter_bytes())
+        size = len(data)
+        for start, stop in [(0, 10), (5, 40000), (1100, 1200), (size - 100, size), (30, size), (size, size)]:
+            # A fresh stream, as for a resumed download that skips files before `start`
+            stream = ZipStream(self.files)
+            self.assertEqual(b''.join(stream.iter_bytes(start, stop)), data[start:stop])
+
+    def test_etag_tracks_content(self):
+        etag = ZipStream(self.files).etag
+        self.assertEqual(ZipStream(self.files).etag, etag)
+
+        with open(self.files[1][1], 'ab') as f:
+            f.write(b'more')
+        self.assertNotEqual(ZipStream(self.files).etag, etag)
+
+    def test_empty_archive(self):
+        self.files = []
+        data = b''.join(ZipStream([]).iter_bytes())
+        self.check_archive(data)
+
+
+if __name__ == '__main__':
+    unittest.main()